@@ -12,59 +12,97 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from vyos.utils.process import rc_cmd
+import socket
+from typing import Iterator
 
-def get_server_statistics(accel_statistics, pattern, sep=':') -> dict:
-    import re
+# accel-ppp CLI, the 'tcp' interface of its cli module
+accel_cli_host = '127.0.0.1'
+accel_cli_timeout = 30
 
-    stat_dict = {'sessions': {}}
 
-    cpu = re.search(r'cpu(.*)', accel_statistics).group(0)
-    # Find all lines with pattern, for example 'sstp:'
-    data = re.search(rf'{pattern}(.*)', accel_statistics, re.DOTALL).group(0)
-    session_starting = re.search(r'starting(.*)', data).group(0)
-    session_active = re.search(r'active(.*)', data).group(0)
-
-    for entry in {cpu, session_starting, session_active}:
-        if sep in entry:
-            key, value = entry.split(sep)
-            if key in ['starting', 'active', 'finishing']:
-                stat_dict['sessions'][key] = value.strip()
-                continue
+def get_server_statistics(accel_statistics, pattern, sep=':') -> dict:
+    """Return CPU load and session counts of the protocol section named by
+    pattern (e.g. 'sstp:') of the output of 'show stat'"""
+    stat_dict = {'sessions': {}}
+    section = None
+    for line in accel_statistics.splitlines():
+        if not line.strip() or sep not in line:
+            continue
+        key, value = line.split(sep, 1)
+        value = value.strip()
+        if not line[0].isspace():
+            # top level entry or start of a section
+            section = f'{key}{sep}'
             if key == 'cpu':
-                stat_dict['cpu_load_percentage'] = int(re.sub(r'%', '', value.strip()))
-                continue
-            stat_dict[key] = value.strip()
+                stat_dict['cpu_load_percentage'] = int(value.rstrip('%'))
+        elif section == pattern and key.strip() in ['starting', 'active']:
+            stat_dict['sessions'][key.strip()] = value
     return stat_dict
 
 
+def accel_cli_lines(port: int, command: str) -> Iterator[str]:
+    """Run a command on the accel-ppp CLI and iterate over its output lines
+
+    The CLI has no end of response marker: the command is followed by
+    'exit', so accel-ppp closes the connection once the output is sent.
+    Raises OSError if accel-ppp does not listen on the port.
+    """
+    with socket.create_connection((accel_cli_host, port),
+                                  timeout=accel_cli_timeout) as sock:
+        sock.sendall(f'{command}\nexit\n'.encode())
+        with sock.makefile('r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+
 def accel_cmd(port: int, command: str) -> str:
-    _, output = rc_cmd(f'/usr/bin/accel-cmd -p{port} {command}')
-    return output
+    return '\n'.join(accel_cli_lines(port, command))
 
 
-def accel_out_parse(accel_output: list[str]) -> list[dict[str, str]]:
-    """ Parse accel-cmd show sessions output """
-    data_list: list[dict[str, str]] = list()
-    field_names: list[str] = list()
+def accel_sessions_command(columns: list, match: tuple = None, order: str = None) -> str:
+    """Return the 'show sessions' command for the given columns/filter/order"""
+    command = f'show sessions {",".join(columns)}'
+    if order:
+        command += f' order {order}'
+    if match:
+        column, regexp = match
+        command += f' match {column} {regexp}'
+    return command
 
-    field_names_unstripped: list[str] = accel_output.pop(0).split('|')
-    for field_name in field_names_unstripped:
-        field_names.append(field_name.strip())
 
-    while accel_output:
-        if '|' not in accel_output[0]:
-            accel_output.pop(0)
-            continue
+def _parse_sessions(lines: Iterator[str]) -> Iterator[tuple]:
+    # header, a separator line without '|', then one session per line
+    for line in lines:
+        if '|' in line:
+            yield tuple(field.strip() for field in line.split('|'))
+
+
+def accel_iter_sessions(port: int, columns: list, match: tuple = None,
+                        order: str = None) -> Iterator[tuple]:
+    """Iterate over the sessions as tuples of the values of columns
+
+    Selection, filtering and sorting are done by accel-ppp.
+    match: (column, regexp) the sessions must match
+    order: column to sort the sessions by
+    """
+    records = _parse_sessions(accel_cli_lines(port,
+                                              accel_sessions_command(columns, match, order)))
+    # skip the header
+    next(records, None)
+    yield from records
 
-        current_item: list[str] = accel_output.pop(0).split('|')
-        item_dict: dict[str, str] = {}
 
-        for field_index in range(len(current_item)):
-            field_name: str = field_names[field_index]
-            field_value: str = current_item[field_index].strip()
-            item_dict[field_name] = field_value
+def accel_get_sessions(port: int, columns: list, match: tuple = None,
+                       order: str = None) -> list[dict[str, str]]:
+    """Return the sessions as a list of {column: value}, see accel_iter_sessions()"""
+    return [dict(zip(columns, record))
+            for record in accel_iter_sessions(port, columns, match, order)]
 
-        data_list.append(item_dict)
 
-    return data_list
+def accel_out_parse(accel_output) -> list[dict[str, str]]:
+    """ Parse accel-cmd show sessions output, a list or iterator of lines """
+    records = _parse_sessions(iter(accel_output))
+    field_names = next(records, None)
+    if field_names is None:
+        return []
+    return [dict(zip(field_names, record)) for record in records]
@@ -34,6 +34,10 @@ class ComposeConfigError(Exception):
 class ComposeConfig:
     """Apply function to config tree: for iteration over functions or files.
     """
+    # ConfigTree methods modifying the tree
+    tree_writers = ('create_node', 'set', 'delete', 'delete_value', 'rename',
+                    'copy', 'set_tag', 'set_leaf')
+
     def __init__(self, config_obj: ConfigObj, checkpoint_file=None):
         if isinstance(config_obj, ConfigTree):
             self.config_tree = config_obj
@@ -42,6 +46,29 @@ def __init__(self, config_obj: ConfigObj, checkpoint_file=None):
 
         self.checkpoint = self.config_tree
         self.checkpoint_file = checkpoint_file
+        # whether the last applied function modified the config tree
+        self.modified = False
+
+    def _watch_writes(self, tree: ConfigTree):
+        """Shadow the modifying methods of the tree to record the first
+        modification; with a checkpoint file, the checkpoint is copied
+        right before it, so functions not modifying the tree cost no copy.
+        """
+        def writer(method):
+            def wrapper(*args, **kwargs):
+                if not self.modified:
+                    self.modified = True
+                    if self.checkpoint_file is not None:
+                        self.checkpoint = ct_deep_copy(tree)
+                return method(*args, **kwargs)
+            return wrapper
+
+        for name in self.tree_writers:
+            setattr(tree, name, writer(getattr(tree, name)))
+
+    def _unwatch_writes(self, tree: ConfigTree):
+        for name in self.tree_writers:
+            delattr(tree, name)
 
     def apply_func(self, func: Callable):
         """Apply the function to the config tree.
@@ -49,15 +76,18 @@ def apply_func(self, func: Callable):
         if not callable(func):
             raise ComposeConfigError(f'{func.__name__} is not callable')
 
-        if self.checkpoint_file is not None:
-            self.checkpoint = ct_deep_copy(self.config_tree)
+        tree = self.config_tree
+        self.modified = False
+        self._watch_writes(tree)
 
         try:
-            func(self.config_tree)
+            func(tree)
         except Exception as e:
-            if self.checkpoint_file is not None:
+            if self.checkpoint_file is not None and self.modified:
                 self.config_tree = self.checkpoint
             raise ComposeConfigError(e) from e
+        finally:
+            self._unwatch_writes(tree)
 
     def apply_file(self, func_file: str, func_name: str):
         """Apply named function from file.
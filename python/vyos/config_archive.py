@@ -0,0 +1,374 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Content-addressed store of config file revisions
+
+A revision is split into its top-level sections, and large sections further
+into chunks at second level block boundaries. Chunks are stored once,
+compressed and named by their SHA-256 digest; a revision is a small manifest
+listing the chunks of each section. Consecutive revisions mostly share their
+chunks, so storing a revision only writes the changed parts, and two
+revisions can be compared section by section without reading the unchanged
+ones.
+
+Layout below the store directory:
+  HEAD                  sequence numbers of the newest and oldest revision
+  revisions/<seq>.json  manifest: {'hash': .., 'sections': [[name, [chunk, ..]], ..]}
+  objects/<xx>/<digest> zlib compressed chunk
+  refs.json             reference count of each chunk
+
+Revision 0 is the newest revision, as in the commit log.
+
+The commit index is a small SQLite database recording, per revision, the
+commit log entry and the config paths changed by it, so the history of a
+path can be queried without reading any revision.
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+from contextlib import closing
+from hashlib import sha256
+from typing import Optional
+
+# chunks are closed at block boundaries up to this depth ...
+SPLIT_DEPTH = 2
+# ... once they reached this size
+MIN_CHUNK_SIZE = 4096
+
+
+class ConfigArchiveError(Exception):
+    pass
+
+
+def _digest(text: str) -> str:
+    return sha256(text.encode()).hexdigest()
+
+
+def split_sections(config: str) -> list:
+    """Split config file text into [(section name, [chunk text, ..]), ..]
+
+    Comments and blank lines preceding a top-level node belong to its
+    section; trailing lines (version footer) form a section named ''.
+    Joining all chunks in order yields the original text.
+    """
+    sections = []
+    name = None
+    chunks = []
+    chunk = []
+    size = 0
+    depth = 0
+
+    for line in config.splitlines(keepends=True):
+        stripped = line.strip()
+        if depth == 0 and name is None and stripped and not stripped.startswith(('/*', '//', '*')):
+            name = stripped.rstrip('{').strip()
+
+        chunk.append(line)
+        size += len(line)
+        if stripped.endswith('{'):
+            depth += 1
+        elif stripped == '}':
+            depth -= 1
+
+        if name is None:
+            continue
+        if depth <= 0:
+            chunks.append(''.join(chunk))
+            sections.append((name, chunks))
+            name, chunks, chunk, size, depth = None, [], [], 0, 0
+        elif depth <= SPLIT_DEPTH and size >= MIN_CHUNK_SIZE:
+            chunks.append(''.join(chunk))
+            chunk, size = [], 0
+
+    if chunk:
+        sections.append(('' if name is None else name, chunks + [''.join(chunk)]))
+
+    return sections
+
+
+class RevisionStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._objects = os.path.join(path, 'objects')
+        self._revisions = os.path.join(path, 'revisions')
+        self._head = os.path.join(path, 'HEAD')
+        self._refs = os.path.join(path, 'refs.json')
+
+    def initialize(self, group: Optional[str] = None):
+        """Create the store directories; with group set, these are group
+        writable and new files inherit the group"""
+        from shutil import chown
+
+        for d in (self.path, self._objects, self._revisions):
+            os.makedirs(d, exist_ok=True)
+            if group is not None:
+                chown(d, group=group)
+                os.chmod(d, 0o2775)
+
+    # index helpers
+    #
+    def _write(self, path: str, data: bytes):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_head(self) -> tuple:
+        """Return (newest, oldest) sequence number; (0, 1) if empty"""
+        try:
+            with open(self._head) as f:
+                head, tail = f.read().split()
+            return int(head), int(tail)
+        except (FileNotFoundError, ValueError):
+            return 0, 1
+
+    def _write_head(self, head: int, tail: int):
+        self._write(self._head, f'{head} {tail}\n'.encode())
+
+    def _read_refs(self) -> dict:
+        try:
+            with open(self._refs) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _manifest_path(self, seq: int) -> str:
+        return os.path.join(self._revisions, f'{seq}.json')
+
+    def _seq(self, rev: int) -> int:
+        head, tail = self._read_head()
+        seq = head - rev
+        if rev < 0 or seq < tail:
+            raise ConfigArchiveError(f'revision {rev} not available')
+        return seq
+
+    def _manifest(self, rev: int) -> dict:
+        with open(self._manifest_path(self._seq(rev))) as f:
+            return json.load(f)
+
+    def _read_object(self, digest: str) -> str:
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read()).decode()
+
+    # public interface
+    #
+    def __len__(self) -> int:
+        head, tail = self._read_head()
+        return head - tail + 1
+
+    def sequence(self, rev: int) -> int:
+        """Return the sequence number of revision rev; unlike the revision
+        number, it does not change as newer revisions are added"""
+        return self._seq(rev)
+
+    def head_hash(self) -> Optional[str]:
+        """Return the digest of the newest revision, None if empty"""
+        if not len(self):
+            return None
+        return self._manifest(0)['hash']
+
+    def add(self, config: str, max_revisions: int = 0) -> bool:
+        """Store config as new revision 0, keeping at most max_revisions
+        revisions (0: keep all); return False if config is unchanged"""
+        digest = _digest(config)
+        if digest == self.head_hash():
+            return False
+
+        refs = self._read_refs()
+        sections = []
+        for name, chunks in split_sections(config):
+            digests = []
+            for chunk in chunks:
+                chunk_digest = _digest(chunk)
+                if chunk_digest not in refs:
+                    obj = self._object_path(chunk_digest)
+                    os.makedirs(os.path.dirname(obj), exist_ok=True)
+                    self._write(obj, zlib.compress(chunk.encode(), 6))
+                refs[chunk_digest] = refs.get(chunk_digest, 0) + 1
+                digests.append(chunk_digest)
+            sections.append([name, digests])
+
+        head, tail = self._read_head()
+        head += 1
+        manifest = {'hash': digest, 'sections': sections}
+        self._write(self._manifest_path(head), json.dumps(manifest).encode())
+        self._write(self._refs, json.dumps(refs).encode())
+        self._write_head(head, tail)
+
+        if max_revisions:
+            self.prune(max_revisions)
+        return True
+
+    def prune(self, max_revisions: int):
+        """Drop the oldest revisions beyond max_revisions, and the chunks no
+        longer referenced"""
+        head, tail = self._read_head()
+        new_tail = max(tail, head - max_revisions + 1)
+        if new_tail == tail:
+            return
+
+        refs = self._read_refs()
+        for seq in range(tail, new_tail):
+            path = self._manifest_path(seq)
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                continue
+            for _, digests in manifest['sections']:
+                for d in digests:
+                    refs[d] = refs.get(d, 1) - 1
+                    if refs[d] <= 0:
+                        del refs[d]
+                        try:
+                            os.unlink(self._object_path(d))
+                        except FileNotFoundError:
+                            pass
+
+        # head first: readers never see a tail without its manifest
+        self._write_head(head, new_tail)
+        self._write(self._refs, json.dumps(refs).encode())
+        for seq in range(tail, new_tail):
+            try:
+                os.unlink(self._manifest_path(seq))
+            except FileNotFoundError:
+                pass
+
+    def get(self, rev: int) -> str:
+        """Return the config file text of revision rev"""
+        manifest = self._manifest(rev)
+        return ''.join(self._read_object(d)
+                       for _, digests in manifest['sections'] for d in digests)
+
+    def sections(self, rev: int) -> dict:
+        """Return {section name: chunk digests} of revision rev"""
+        return {name: digests for name, digests in self._manifest(rev)['sections']}
+
+    def changed_sections(self, rev1: int, rev2: int) -> list:
+        """Return the names of the top-level sections which differ between
+        the revisions, without reading any chunk"""
+        s1 = self.sections(rev1)
+        s2 = self.sections(rev2)
+        return [name for name in sorted(set(s1) | set(s2))
+                if name and s1.get(name) != s2.get(name)]
+
+    def get_sections(self, rev: int, names: list) -> str:
+        """Return the config text of the named sections of revision rev"""
+        sections = self.sections(rev)
+        return ''.join(self._read_object(d) for name in names
+                       for d in sections.get(name, []))
+
+
+def changed_paths(add, sub) -> dict:
+    """Return {path string: 'add'|'delete'|'change'} of the terminal nodes
+    (leaf nodes and nodes without children) of the add and sub trees of a
+    DiffTree; a leaf in both changed its value"""
+    changes = {}
+
+    def walk(tree, path, op):
+        for name in tree.list_nodes(path, path_must_exist=False):
+            p = path + [name]
+            if not tree.is_leaf(p) and tree.list_nodes(p, path_must_exist=False):
+                walk(tree, p, op)
+                continue
+            key = ' '.join(p)
+            changes[key] = 'change' if key in changes else op
+
+    walk(add, [], 'add')
+    walk(sub, [], 'delete')
+    return changes
+
+
+class CommitIndex:
+    """Changed paths and commit log entry of each revision, keyed by the
+    revision sequence number of the RevisionStore"""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS commits (
+            seq INTEGER PRIMARY KEY,
+            timestamp TEXT, user TEXT, commit_via TEXT, commit_comment TEXT);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER NOT NULL, path TEXT NOT NULL, op TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS changes_path ON changes (path, seq);
+        CREATE INDEX IF NOT EXISTS changes_seq ON changes (seq);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=10)
+        db.executescript(self.schema)
+        return db
+
+    @staticmethod
+    def _match(path: list) -> tuple:
+        """SQL condition matching path and all paths below it"""
+        if not path:
+            return '1', ()
+        p = ' '.join(path)
+        # paths below p sort between 'p ' and 'p!'
+        return '(path = ? OR (path >= ? AND path < ?))', (p, f'{p} ', f'{p}!')
+
+    def add(self, seq: int, entry: dict, changes: dict):
+        """Record the log entry and {path: op} changes of revision seq"""
+        keys = ('timestamp', 'user', 'commit_via', 'commit_comment')
+        with closing(self._connect()) as db, db:
+            db.execute('DELETE FROM changes WHERE seq = ?', (seq,))
+            db.execute('INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?)',
+                       (seq, *(entry.get(k, '') for k in keys)))
+            db.executemany('INSERT INTO changes VALUES (?, ?, ?)',
+                           ((seq, p, op) for p, op in changes.items()))
+
+    def prune(self, tail: int):
+        """Drop the revisions with sequence number below tail"""
+        with closing(self._connect()) as db, db:
+            db.execute('DELETE FROM changes WHERE seq < ?', (tail,))
+            db.execute('DELETE FROM commits WHERE seq < ?', (tail,))
+
+    def revised(self, seq: int, path: list = []) -> Optional[bool]:
+        """Return if revision seq changed path or any path below it; None
+        if the revision is not indexed"""
+        cond, args = self._match(path)
+        with closing(self._connect()) as db:
+            if db.execute('SELECT 1 FROM commits WHERE seq = ?', (seq,)).fetchone() is None:
+                return None
+            row = db.execute(f'SELECT 1 FROM changes WHERE seq = ? AND {cond} LIMIT 1',
+                             (seq, *args)).fetchone()
+        return row is not None
+
+    def history(self, path: list = []) -> list:
+        """Return [(seq, entry, [(path, op), ..]), ..] of the revisions
+        which changed path or any path below it, newest first"""
+        cond, args = self._match(path)
+        res = {}
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                'SELECT c.seq, c.timestamp, c.user, c.commit_via, c.commit_comment, '
+                'ch.path, ch.op FROM changes ch JOIN commits c ON c.seq = ch.seq '
+                f'WHERE {cond} ORDER BY c.seq DESC, ch.path', args)
+            for seq, timestamp, user, via, comment, p, op in rows:
+                if seq not in res:
+                    entry = {'timestamp': timestamp, 'user': user,
+                             'commit_via': via, 'commit_comment': comment}
+                    res[seq] = (seq, entry, [])
+                res[seq][2].append((p, op))
+        return list(res.values())
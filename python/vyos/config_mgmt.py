@@ -23,14 +23,17 @@
 from typing import Tuple
 from filecmp import cmp
 from datetime import datetime
-from textwrap import dedent
-from pathlib import Path
+from hashlib import sha256
 from tabulate import tabulate
 from shutil import copy, chown
 from urllib.parse import urlsplit
 from urllib.parse import urlunsplit
 
 from vyos.config import Config
+from vyos.config_archive import RevisionStore
+from vyos.config_archive import CommitIndex
+from vyos.config_archive import ConfigArchiveError
+from vyos.config_archive import changed_paths
 from vyos.configtree import ConfigTree
 from vyos.configtree import ConfigTreeError
 from vyos.configsession import ConfigSession
@@ -63,11 +66,15 @@
 archive_dir = os.path.join(directories['config'], 'archive')
 archive_config_file = os.path.join(archive_dir, 'config.boot')
 commit_log_file = os.path.join(archive_dir, 'commits')
-logrotate_conf = os.path.join(archive_dir, 'lr.conf')
-logrotate_state = os.path.join(archive_dir, 'lr.state')
+revision_store_dir = os.path.join(archive_dir, 'store')
+commit_index_file = os.path.join(archive_dir, 'commits.db')
+# superseded by the revision store; imported on initialization
+legacy_logrotate_conf = os.path.join(archive_dir, 'lr.conf')
+legacy_logrotate_state = os.path.join(archive_dir, 'lr.state')
 rollback_config = os.path.join(archive_dir, 'config.boot-rollback')
 prerollback_config = os.path.join(archive_dir, 'config.boot-prerollback')
 tmp_log_entry = '/tmp/commit-rev-entry'
+log_fmt = re.compile(r'\|.*\|\n?$')
 
 logger = logging.getLogger('config_mgmt')
 logger.setLevel(logging.INFO)
@@ -100,11 +107,9 @@ def unsaved_commits(allow_missing_config=False) -> bool:
 
 
 def get_file_revision(rev: int):
-    revision = os.path.join(archive_dir, f'config.boot.{rev}.gz')
     try:
-        with gzip.open(revision) as f:
-            r = f.read().decode()
-    except FileNotFoundError:
+        r = RevisionStore(revision_store_dir).get(rev)
+    except (ConfigArchiveError, OSError):
         logger.warning(f'commit revision {rev} not available')
         return ''
     return r
@@ -115,11 +120,38 @@ def get_config_tree_revision(rev: int):
     return ConfigTree(c)
 
 
+def get_sections_tree(store: RevisionStore, rev: int, sections: list):
+    # a section may be missing in one of the revisions
+    return ConfigTree(store.get_sections(rev, sections) or '\n')
+
+
 def is_node_revised(path: list = [], rev1: int = 1, rev2: int = 0) -> bool:
+    from sqlite3 import Error as SQLiteError
     from vyos.configtree import DiffTree
 
-    left = get_config_tree_revision(rev1)
-    right = get_config_tree_revision(rev2)
+    store = RevisionStore(revision_store_dir)
+    # consecutive revisions: look up the paths recorded at commit time
+    if rev1 == rev2 + 1:
+        try:
+            seq = store.sequence(rev2)
+            revised = CommitIndex(commit_index_file).revised(seq, path)
+            if revised is not None:
+                return revised
+        except (ConfigArchiveError, SQLiteError):
+            pass
+
+    try:
+        changed = store.changed_sections(rev1, rev2)
+        # only the top-level section of path needs to be compared
+        if path and path[0] in changed:
+            changed = [path[0]]
+        elif path or not changed:
+            return False
+        left = get_sections_tree(store, rev1, changed)
+        right = get_sections_tree(store, rev2, changed)
+    except (ConfigArchiveError, OSError):
+        left = get_config_tree_revision(rev1)
+        right = get_config_tree_revision(rev2)
     diff_tree = DiffTree(left, right)
     if diff_tree.add.exists(path) or diff_tree.sub.exists(path):
         return True
@@ -178,6 +210,9 @@ def __init__(self, session_env=None, config=None):
         self.active_config = config._running_config
         self.working_config = config._session_config
 
+        self.store = RevisionStore(revision_store_dir)
+        self.index = CommitIndex(commit_index_file)
+
     # Console script functions
     #
     def commit_confirm(
@@ -325,11 +360,9 @@ def rollback(self, rev: int, no_prompt: bool = False) -> Tuple[str, int]:
         if rc != 0:
             raise ConfigMgmtError(out)
 
-        path = os.path.join(archive_dir, f'config.boot.{rev}.gz')
-        with gzip.open(path) as f:
-            config = f.read()
+        config = self._get_file_revision(rev)
         try:
-            with open(rollback_config, 'wb') as f:
+            with open(rollback_config, 'w') as f:
                 f.write(config)
             copy(rollback_config, config_file)
         except OSError as e:
@@ -388,10 +421,15 @@ def compare(
         if rev2 is not None:
             if not self._check_revision_number(rev2):
                 return f'Invalid revision number {rev2}', 1
-            # compare older to newer
-            ct2 = ct1
-            ct1 = self._get_config_tree_revision(rev2)
+            # compare older to newer; sections with the same content in both
+            # revisions can not contribute to the diff, so skip them
             msg = f'No changes between revisions {rev2} and {rev1} configurations.\n'
+            changed = self.store.changed_sections(rev2, rev1)
+            path = [] if commands else self.edit_path
+            if not changed or (path and path[0] not in changed):
+                return msg, 0
+            ct1 = get_sections_tree(self.store, rev2, changed)
+            ct2 = get_sections_tree(self.store, rev1, changed)
 
         out = ''
         path = [] if commands else self.edit_path
@@ -431,7 +469,7 @@ def wrap_compare(self, options) -> Tuple[str, int]:
     # Initialization and post-commit hooks for conf-mode
     #
     def initialize_revision(self):
-        """Initialize config archive, logrotate conf, and commit log."""
+        """Initialize config archive, revision store, and commit log."""
         mask = os.umask(0o002)
         os.makedirs(archive_dir, exist_ok=True)
         json_dir = os.path.dirname(config_json)
@@ -441,7 +479,10 @@ def initialize_revision(self):
         except OSError as e:
             logger.warning(f'cannot create {json_dir}: {e}')
 
-        self._add_logrotate_conf()
+        self.store.initialize(group='vyattacfg')
+        self._import_legacy_archive()
+        self.store.prune(self.max_revisions)
+        self._prune_index()
 
         if not os.path.exists(commit_log_file) or self._get_number_of_revisions() == 0:
             user = self._get_user()
@@ -506,6 +547,45 @@ def get_raw_log_data(self) -> list:
 
         return res_l
 
+    def get_raw_history_data(self, path: list = []) -> list:
+        """Return list of dicts of the revisions changing path:
+        keys: [revision, timestamp, user, commit_via, commit_comment, changes]
+        """
+        from sqlite3 import Error as SQLiteError
+
+        try:
+            head = self.store.sequence(0)
+            history = self.index.history(path)
+        except (ConfigArchiveError, SQLiteError) as e:
+            raise ConfigMgmtError(f'commit history not available: {e}') from e
+
+        res_l = []
+        for seq, entry, changes in history:
+            d = {'revision': head - seq, **entry}
+            d['changes'] = [{'path': p, 'op': op} for p, op in changes]
+            res_l.append(d)
+
+        return res_l
+
+    @staticmethod
+    def format_history_data(data: list) -> str:
+        """Return formatted history data as str."""
+        prefix = {'add': '+', 'delete': '-', 'change': '~'}
+        res_l = []
+        for l_val in data:
+            time_d = datetime.fromtimestamp(int(l_val['timestamp']))
+            time_str = time_d.strftime('%Y-%m-%d %H:%M:%S')
+
+            res_l.append(
+                [l_val['revision'], time_str, f"by {l_val['user']}",
+                 f"via {l_val['commit_via']}"]
+            )
+            for c in l_val['changes']:
+                res_l.append([None, f"{prefix[c['op']]} {c['path']}"])
+
+        ret = tabulate(res_l, tablefmt='plain')
+        return ret
+
     @staticmethod
     def format_log_data(data: list) -> str:
         """Return formatted log data as str."""
@@ -570,30 +650,38 @@ def _get_saved_config_tree(self):
     def _get_file_revision(self, rev: int):
         if rev not in range(0, self._get_number_of_revisions()):
             raise ConfigMgmtError('revision not available')
-        revision = os.path.join(archive_dir, f'config.boot.{rev}.gz')
-        with gzip.open(revision) as f:
-            r = f.read().decode()
+        try:
+            r = self.store.get(rev)
+        except (ConfigArchiveError, OSError) as e:
+            raise ConfigMgmtError('revision not available') from e
         return r
 
     def _get_config_tree_revision(self, rev: int):
         c = self._get_file_revision(rev)
         return ConfigTree(c)
 
-    def _add_logrotate_conf(self):
-        conf: str = dedent(f"""\
-        {archive_config_file} {{
-            su root vyattacfg
-            rotate {self.max_revisions}
-            start 0
-            compress
-            copy
-        }}
-        """)
-        conf_file = Path(logrotate_conf)
-        conf_file.write_text(conf)
-        conf_file.chmod(0o644)
+    def _import_legacy_archive(self):
+        """Move revisions archived as rotated config.boot.<rev>.gz files
+        into the revision store"""
+        if len(self.store):
+            return
+        legacy = []
+        rev = 0
+        while os.path.exists(path := os.path.join(archive_dir, f'config.boot.{rev}.gz')):
+            legacy.append(path)
+            rev += 1
+        for path in reversed(legacy):
+            with gzip.open(path) as f:
+                self.store.add(f.read().decode())
+        for path in legacy + [legacy_logrotate_conf, legacy_logrotate_state]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
 
     def _archive_active_config(self) -> bool:
+        """Save the active config to archive_config_file; returns True if it
+        is a new revision, to be logged and added to the revision store"""
         save_to_tmp = boot_configuration_complete() or not os.path.isfile(
             archive_config_file
         )
@@ -617,13 +705,12 @@ def _archive_active_config(self) -> bool:
             except OSError as e:
                 logger.warning(f'cannot create {config_json}: {e}')
 
-        try:
-            if cmp(cmp_saved, archive_config_file, shallow=False):
-                os.unlink(cmp_saved)
-                os.umask(mask)
-                return False
-        except FileNotFoundError:
-            pass
+        with open(cmp_saved) as f:
+            unchanged = self.store.head_hash() == sha256(f.read().encode()).hexdigest()
+        if unchanged and os.path.isfile(archive_config_file):
+            os.unlink(cmp_saved)
+            os.umask(mask)
+            return False
 
         rc, out = rc_cmd(f'sudo mv {cmp_saved} {archive_config_file}')
         os.umask(mask)
@@ -632,14 +719,55 @@ def _archive_active_config(self) -> bool:
             logger.critical(f'mv file to archive failed: {out}')
             return False
 
-        return True
+        # a missing archived config was restored, the store already has it
+        return not unchanged
 
-    @staticmethod
-    def _update_archive():
-        cmd = f'sudo logrotate -f -s {logrotate_state} {logrotate_conf}'
-        rc, out = rc_cmd(cmd)
-        if rc != 0:
-            logger.critical(f'logrotate failure: {out}')
+    def _update_archive(self):
+        """Add the archived config as revision 0 to the revision store"""
+        mask = os.umask(0o002)
+        try:
+            with open(archive_config_file) as f:
+                added = self.store.add(f.read(), max_revisions=self.max_revisions)
+        except OSError as e:
+            logger.critical(f'revision store update failed: {e}')
+            added = False
+
+        if added:
+            self._index_revision()
+        os.umask(mask)
+
+    def _index_revision(self):
+        """Record the paths changed by revision 0 in the commit index"""
+        from sqlite3 import Error as SQLiteError
+        from vyos.configtree import DiffTree
+
+        log_entries = self._get_log_entries()
+        entry = self._get_log_entry(log_entries[0]) if log_entries else {}
+        try:
+            changes = {}
+            if len(self.store) > 1:
+                # only sections which differ can contain changed paths
+                sections = self.store.changed_sections(1, 0)
+                if sections:
+                    diff = DiffTree(get_sections_tree(self.store, 1, sections),
+                                    get_sections_tree(self.store, 0, sections))
+                    changes = changed_paths(diff.add, diff.sub)
+            else:
+                diff = DiffTree(None, ConfigTree(self.store.get(0)))
+                changes = changed_paths(diff.add, diff.sub)
+            self.index.add(self.store.sequence(0), entry, changes)
+            self._prune_index()
+        except (ConfigArchiveError, ConfigTreeError, ValueError, SQLiteError, OSError) as e:
+            logger.warning(f'commit index update failed: {e}')
+
+    def _prune_index(self):
+        from sqlite3 import Error as SQLiteError
+
+        try:
+            if len(self.store):
+                self.index.prune(self.store.sequence(len(self.store) - 1))
+        except (ConfigArchiveError, SQLiteError) as e:
+            logger.warning(f'commit index update failed: {e}')
 
     @staticmethod
     def _get_log_entries() -> list:
@@ -721,7 +849,6 @@ def _new_log_entry(
 
     @staticmethod
     def _get_log_entry(line: str) -> dict:
-        log_fmt = re.compile(r'\|.*\|\n?$')
         keys = ['user', 'commit_via', 'commit_comment', 'timestamp']
         if not log_fmt.match(line):
             logger.critical(f'Invalid log format {line}')
@@ -0,0 +1,97 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Shared parts of the config-sync delta protocol
+
+In 'delta' mode the primary sends the set/delete commands leading from the
+sections last synchronized to a secondary to their current state, together
+with the digest of both. The secondary applies the commands only if the
+digest of its own sections matches the base digest, otherwise the primary
+falls back to a full 'load' of the sections.
+"""
+
+import json
+from hashlib import sha256
+
+from vyos.configtree import ConfigTree
+from vyos.configtree import DiffTree
+from vyos.configtree import mask_inclusive
+from vyos.utils.dict import dict_to_paths
+
+
+def mask_from_sections(sections: list) -> ConfigTree:
+    """Return the mask tree of a list of section paths"""
+    mask = ConfigTree('')
+    for section in sections:
+        mask.set(section)
+    return mask
+
+
+def mask_from_dict(mask: dict) -> ConfigTree:
+    """Return the mask tree of its dict representation"""
+    return mask_from_sections(dict_to_paths(mask))
+
+
+def masked_config(config_tree: ConfigTree, mask: ConfigTree) -> ConfigTree:
+    return mask_inclusive(config_tree, mask)
+
+
+def config_digest(config_tree: ConfigTree) -> str:
+    """Return a digest of the config, independent of node order"""
+    d = json.loads(config_tree.to_json())
+    return sha256(json.dumps(d, sort_keys=True).encode()).hexdigest()
+
+
+def delta_commands(left: ConfigTree, right: ConfigTree) -> list:
+    """Return the list of /configure commands changing left into right:
+    [{'op': 'delete'|'set', 'path': [..], 'value': ..}, ..]
+
+    Nodes missing in right are deleted as a whole; deletions precede
+    the set commands.
+    """
+    diff = DiffTree(left, right)
+    deletes = []
+    sets = []
+
+    def walk_sub(tree, path):
+        for name in tree.list_nodes(path, path_must_exist=False):
+            p = path + [name]
+            if not right.exists(p):
+                deletes.append({'op': 'delete', 'path': p})
+            elif tree.is_leaf(p):
+                for value in tree.return_values(p):
+                    if value not in right.return_values(p):
+                        deletes.append({'op': 'delete', 'path': p, 'value': value})
+            else:
+                walk_sub(tree, p)
+
+    def walk_add(tree, path):
+        for name in tree.list_nodes(path, path_must_exist=False):
+            p = path + [name]
+            if tree.is_leaf(p):
+                values = tree.return_values(p)
+                if not values:
+                    sets.append({'op': 'set', 'path': p})
+                for value in values:
+                    sets.append({'op': 'set', 'path': p, 'value': value})
+            elif tree.list_nodes(p, path_must_exist=False):
+                walk_add(tree, p)
+            else:
+                sets.append({'op': 'set', 'path': p})
+
+    walk_sub(diff.sub, [])
+    walk_add(diff.add, [])
+    return deletes + sets
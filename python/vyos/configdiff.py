@@ -115,22 +115,46 @@ def get_commit_scripts(config) -> list:
     D = get_config_diff(config)
     d = D._diff_dict
     s = set()
+    paths = {}
+    priorities = {}
     for p in chain(dict_to_key_paths(d['sub']), dict_to_key_paths(d['add'])):
         p_owner = owner(p, with_tag=True)
         if not p_owner:
             continue
+        if p_owner not in paths or len(p) < len(paths[p_owner]):
+            paths[p_owner] = p
         p_priority = priority(p)
         if not p_priority:
             # default priority in legacy commit-algorithm
             p_priority = 0
         p_priority = int(p_priority)
         s.add((p_priority, p_owner))
+        priorities[p_owner] = min(p_priority, priorities.get(p_owner, p_priority))
 
     res = [x[1] for x in sorted(s, key=lambda x: x[0])]
     setattr(config, 'commit_scripts', res)
+    setattr(config, 'commit_script_paths', paths)
+    setattr(config, 'commit_script_priorities', priorities)
 
     return res
 
+def get_commit_script_path(config, script) -> list:
+    """Return the shortest changed config path owned by a commit script
+
+    The script is given in the form returned by get_commit_scripts(), i.e.
+    including the tag value for tag node scripts. An empty list is returned
+    if the script does not own any changed path.
+    """
+    get_commit_scripts(config)
+    return getattr(config, 'commit_script_paths', {}).get(script, [])
+
+def get_commit_script_priorities(config) -> dict:
+    """Return the priority of each commit script, as used for the order
+    of get_commit_scripts()
+    """
+    get_commit_scripts(config)
+    return getattr(config, 'commit_script_priorities', {})
+
 class ConfigDiff(object):
     """
     The class of config changes as represented by comparison between the
@@ -16,8 +16,12 @@
 import os
 import re
 import sys
+import shlex
 import subprocess
 
+from functools import lru_cache
+from tempfile import NamedTemporaryFile
+
 from vyos.defaults import directories
 from vyos.utils.process import is_systemd_service_running
 from vyos.utils.dict import dict_to_paths
@@ -29,6 +33,8 @@
 COMMIT = '/opt/vyatta/sbin/my_commit'
 DISCARD = '/opt/vyatta/sbin/my_discard'
 SHOW_CONFIG = ['/bin/cli-shell-api', 'showConfig']
+SHOW_WORKING_CONFIG = ['/bin/cli-shell-api', '--show-working-only',
+                       '--show-ignore-edit', 'showConfig']
 LOAD_CONFIG = ['/bin/cli-shell-api', 'loadFile']
 MIGRATE_LOAD_CONFIG = ['/usr/libexec/vyos/vyos-load-config.py']
 SAVE_CONFIG = ['/usr/libexec/vyos/vyos-save-config.py']
@@ -70,6 +76,11 @@
 # Default "commit via" string
 APP = 'vyos-http-api'
 
+# Edit batches with fewer paths are applied path by path, as the batch backend
+# needs three cli-shell-api calls of its own
+BATCH_MIN_PATHS = 4
+VALIDATORS_DIR = '/usr/libexec/vyos/validators'
+
 
 # When started as a service rather than from a user shell,
 # the process lacks the VyOS-specific environment that comes
@@ -117,6 +128,108 @@ class ConfigSessionError(Exception):
     pass
 
 
+class _BatchFallback(Exception):
+    """Edit batch can not be applied in-process, use the per-path backend"""
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _validator_accepts(validator: str, value: str) -> bool:
+    cmd = shlex.split(validator)
+    if not os.path.isabs(cmd[0]):
+        cmd[0] = os.path.join(VALIDATORS_DIR, cmd[0])
+    try:
+        p = subprocess.run(cmd + [value], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    return p.returncode == 0
+
+
+def _value_valid(path: list, value: str) -> bool:
+    """Check value against the constraints of the node at path; a value is
+    valid if any of the constraints is satisfied
+
+    Raises ValueError if the reference cache has no constraint data for the
+    node, the value can then only be checked by the session backend
+    """
+    from vyos import xml_ref
+
+    constraints, _ = xml_ref.constraints(path)
+    if not constraints:
+        return True
+    for kind, arg in constraints:
+        if kind == 'regex':
+            try:
+                if re.fullmatch(arg, value):
+                    return True
+            except re.error:
+                # PCRE only syntax, leave it to the session backend
+                continue
+        elif _validator_accepts(arg, value):
+            return True
+    return False
+
+
+def _apply_edit(tree, op: str, path: list, tag_cache: dict):
+    """Apply a set/delete of path (including value) to ConfigTree tree,
+    validating it against the XML reference first
+
+    Raises _BatchFallback if the path is not valid - the per-path backend
+    then reports the exact error
+    """
+    from vyos import xml_ref
+    from vyos.configtree import ConfigTreeError
+
+    try:
+        cfg_path, value = xml_ref.split_path(path)
+        is_leaf = xml_ref.is_leaf(cfg_path)
+        if value is not None and (not is_leaf or xml_ref.is_valueless(cfg_path)):
+            raise ValueError(f'Path "{path}" does not take a value')
+        if value is None and xml_ref.is_tag(cfg_path):
+            raise ValueError(f'Path "{path}" requires a tag value')
+
+        if op == 'delete':
+            if value is None:
+                tree.delete(cfg_path)
+            else:
+                tree.delete_value(cfg_path, value)
+            return
+
+        # Tag node values are validated against the tag node constraints,
+        # they repeat a lot within a section so remember the result
+        tag_paths = []
+        for i in range(2, len(cfg_path) + 1):
+            prefix = tuple(cfg_path[:i])
+            if prefix not in tag_cache:
+                tag_value = xml_ref.is_tag_value(cfg_path[:i])
+                valid = not tag_value or _value_valid(cfg_path[:i-1], cfg_path[i-1])
+                tag_cache[prefix] = (tag_value, valid)
+            tag_value, valid = tag_cache[prefix]
+            if not valid:
+                raise ValueError(f'Invalid value "{cfg_path[i-1]}"')
+            if tag_value:
+                tag_paths.append(cfg_path[:i-1])
+
+        if value is not None:
+            if not _value_valid(cfg_path, value):
+                raise ValueError(f'Invalid value "{value}"')
+            if xml_ref.is_multi(cfg_path):
+                if not tree.exists(cfg_path) or value not in tree.return_values(cfg_path):
+                    tree.set(cfg_path, value=value, replace=False)
+            else:
+                tree.set(cfg_path, value=value)
+        elif is_leaf:
+            tree.set(cfg_path)
+        elif not tree.exists(cfg_path):
+            tree.create_node(cfg_path)
+
+        for tag_path in tag_paths:
+            tree.set_tag(tag_path)
+    except (ValueError, ConfigTreeError) as e:
+        raise _BatchFallback(e) from e
+
+
 class ConfigSession(object):
     """
     The write API of VyOS.
@@ -201,10 +314,71 @@ def set(self, path, value=None):
             value = [value]
         self.__run_command([SET] + path + value)
 
+    def __edit_in_process(self, edits):
+        """Apply all edits to the working config with a single loadFile
+
+        The working config is read once, all paths are validated against
+        the XML reference and applied to the in-memory tree, and the result
+        is written back as a whole. Returns False, with the working config
+        unmodified, if the batch has to be applied path by path instead.
+        """
+        from vyos.configtree import ConfigTree
+
+        try:
+            from vyos import xml_ref
+            xml_ref.load_reference()
+        except (ImportError, ValueError):
+            return False
+
+        original = self.__run_command(SHOW_WORKING_CONFIG)
+        tree = ConfigTree(original)
+        tag_cache = {}
+        try:
+            for op, path in edits:
+                _apply_edit(tree, op, path, tag_cache)
+        except _BatchFallback:
+            return False
+
+        # Nothing to write if all edits were no-ops
+        expected = tree.to_string()
+        if expected == ConfigTree(original).to_string():
+            return True
+
+        def load(config):
+            with NamedTemporaryFile('w', prefix='vyos-session-',
+                                    suffix='.config') as f:
+                f.write(config)
+                f.flush()
+                self.__run_command(LOAD_CONFIG + [f.name])
+
+        try:
+            load(expected)
+            current = self.__run_command(SHOW_WORKING_CONFIG)
+            if ConfigTree(current).to_string() == expected:
+                return True
+        except ConfigSessionError:
+            pass
+
+        # The session backend did not accept the tree as written; restore
+        # the original working config before retrying path by path
+        load(original)
+        return False
+
+    def __edit(self, edits):
+        """Apply a list of ('set'|'delete', path) edits, path including the
+        value, in order"""
+        edits = list(edits)
+        if len(edits) >= BATCH_MIN_PATHS and self.__edit_in_process(edits):
+            return
+        for op, path in edits:
+            if op == 'set':
+                self.set(path)
+            else:
+                self.delete(path)
+
     def set_section(self, path: list, d: dict):
         try:
-            for p in dict_to_paths(d):
-                self.set(path + p)
+            self.__edit(('set', path + p) for p in dict_to_paths(d))
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
@@ -217,29 +391,28 @@ def delete(self, path, value=None):
 
     def load_section(self, path: list, d: dict):
         try:
-            self.delete(path)
+            edits = [('delete', path)]
             if d:
-                for p in dict_to_paths(d):
-                    self.set(path + p)
+                edits.extend(('set', path + p) for p in dict_to_paths(d))
+            self.__edit(edits)
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
     def set_section_tree(self, d: dict):
         try:
             if d:
-                for p in dict_to_paths(d):
-                    self.set(p)
+                self.__edit(('set', p) for p in dict_to_paths(d))
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
     def load_section_tree(self, mask: dict, d: dict):
         try:
+            edits = []
             if mask:
-                for p in dict_to_paths(mask):
-                    self.delete(p)
+                edits.extend(('delete', p) for p in dict_to_paths(mask))
             if d:
-                for p in dict_to_paths(d):
-                    self.set(p)
+                edits.extend(('set', p) for p in dict_to_paths(d))
+            self.__edit(edits)
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
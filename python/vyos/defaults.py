@@ -41,6 +41,8 @@
 
 config_status = '/tmp/vyos-config-status'
 api_config_state = '/run/http-api-state'
+# touched by a commit post-hook on every commit
+config_revision = '/run/vyos-config-revision'
 
 cfg_group = 'vyattacfg'
 
@@ -63,11 +63,23 @@
 >>>     print(e)
 >>>     exit(1)
 ```
+
+Apply only the sections which changed:
+```
+>>> commands, changed = diff_configuration(parse_configuration(original_config),
+>>>                                        parse_configuration(modified_config))
+>>> apply_configuration(commands)
+```
 """
 
+import json
 import tempfile
 import re
 
+from subprocess import Popen
+from subprocess import PIPE
+from subprocess import DEVNULL
+
 from vyos import ConfigError
 from vyos.utils.process import cmd
 from vyos.utils.process import popen
@@ -96,6 +108,10 @@
 default_add_before = r'(ip prefix-list .*|route-map .*|line vty|end)'
 
 
+# Commit-scoped batching state, see begin_commit_batch()
+_commit_batch = None
+_commit_owner = None
+
 class FrrError(Exception):
     pass
 
@@ -245,6 +261,135 @@ def execute(command):
     return config
 
 
+class _JSONObjectStream:
+    """ Incrementally decode a JSON object from a file-like object
+
+    Only the nesting levels requested by the caller are walked token by token,
+    all other values are decoded one at a time using json.JSONDecoder so that
+    the memory footprint is bounded by the largest single value and not by the
+    size of the whole document.
+    """
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream, chunk_size=65536):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """ Return next non-whitespace character or None at the end of input """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def expect(self, characters):
+        char = self.peek()
+        if char is None or char not in characters:
+            raise ValueError(f'Invalid JSON: expected {characters!r}, got {char!r}')
+        self._pos += 1
+        return char
+
+    def value(self):
+        """ Decode the next complete JSON value """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number could continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if not self._fill():
+                value, self._pos = self._decoder.raw_decode(self._buffer, self._pos)
+                return value
+
+    def items(self, depth=1):
+        """ Iterate over the members of the top-level object, descending into
+        nested objects up to depth levels. Yields (keys, value) tuples where
+        keys is a tuple of the object keys leading to the value. List values
+        at the deepest level are split up and yielded element by element.
+        With depth 0 the whole object is yielded at once, for small outputs.
+        """
+        if self.peek() is None:
+            # Empty output, e.g. an empty routing table
+            return
+        if depth == 0:
+            yield (), self.value()
+            return
+        yield from self._object_items((), depth)
+
+    def _object_items(self, keys, depth):
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            char = self.peek()
+            if depth > 1 and char == '{':
+                yield from self._object_items(keys + (key,), depth - 1)
+            elif depth == 1 and char == '[':
+                self._pos += 1
+                if self.peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield keys + (key,), self.value()
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                yield keys + (key,), self.value()
+            if self.expect(',}') == '}':
+                return
+
+
+def execute_json(command, depth=1):
+    """ Run a vtysh show command producing JSON and iterate over its result
+    without reading the whole output into memory
+    command:  str containing the vtysh command, must end with "json"
+    depth:    number of object levels to descend into, e.g. 2 for commands
+              using "vrf all" which are keyed by VRF name first, 0 to
+              decode the whole output at once
+
+    return:   generator of (keys, value) tuples, see _JSONObjectStream.items()
+    """
+    if not isinstance(command, str):
+        raise ValueError(f'command needs to be a string: {repr(command)}')
+
+    proc = Popen([path_vtysh, '-c', command], stdout=PIPE, stderr=DEVNULL,
+                 text=True, encoding='utf-8')
+    try:
+        yield from _JSONObjectStream(proc.stdout).items(depth=depth)
+    finally:
+        # Consumer may stop early, e.g. when paginating
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+    if proc.returncode:
+        raise OSError(proc.returncode, f'vtysh command "{command}" failed')
+
+
 def configure(lines, daemon=False):
     """ run commands inside config mode vtysh
     lines:  list or str conaining commands to execute inside a configure session
@@ -403,6 +548,327 @@ def _find_elements(config, pattern, start_at=0):
     return [i for i, element in enumerate(config[start_at:], start=0) if re.match(pattern + '$', element)]
 
 
+# Top-level contexts which must never be removed as a whole, only their
+# content is cleared - e.g. "no interface eth0" fails for existing interfaces
+_persistent_sections = r'^(interface|vrf) \S+'
+# Sub-contexts which have no negated form inside their parent node
+_persistent_subsections = r'^address-family .*'
+# Commands which replace their previous value when applied, there is no need
+# to remove the old line first - which could otherwise cause disruptions like
+# dropping a BGP neighbor when only its remote-as changes
+_overridable_commands = [
+    r'neighbor \S+ remote-as ',
+    r'neighbor \S+ description ',
+    r'bgp router-id ',
+    r'ospf router-id ',
+    r'ospf6 router-id ',
+    r'router-id ',
+]
+
+def _section_exit(header, toplevel=False):
+    """ Return the command used to leave the FRR node entered by <header> """
+    if toplevel and header.startswith('vrf '):
+        return 'exit-vrf'
+    if header.startswith('address-family '):
+        return 'exit-address-family'
+    if header.startswith('vni '):
+        return 'exit-vni'
+    return 'exit'
+
+
+def _negate(line):
+    """ Return the vtysh command removing <line> from the configuration """
+    if line.startswith('no '):
+        return line[3:]
+    return f'no {line}'
+
+
+def _is_overridden(line, candidates):
+    for command in _overridable_commands:
+        match = re.match(command, line)
+        if match and any(c.startswith(match.group(0)) for c in candidates):
+            return True
+    return False
+
+
+def parse_configuration(config):
+    """ Parse an FRR configuration into its sections
+    config:  string or list of lines as returned by get_configuration()
+
+    return:  dict (insertion ordered) keyed by the top-level context line,
+             e.g. "router bgp 65000" or "ip prefix-list foo seq 5 permit any".
+             The value is a list of (context, line) tuples describing the body
+             of the section, where context is a tuple of the sub-context
+             headers (e.g. "address-family ipv4 unicast") the line lives in.
+             Sections without a body (single top-level lines) map to [].
+    """
+    if isinstance(config, str):
+        config = config.split('\n')
+
+    # Strip comments and separators, they carry no configuration
+    lines = [l.rstrip() for l in config if l.strip() and l.strip() != '!']
+
+    sections = {}
+    section = None
+    stack = []
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+
+        if indent == 0:
+            if stripped.startswith('exit') or stripped == 'end':
+                section = None
+                continue
+            section = []
+            stack = []
+            sections[stripped] = section
+            continue
+
+        if section is None:
+            # Indented line without parent - treat as standalone statement
+            sections[stripped] = []
+            continue
+
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        if stripped.startswith('exit'):
+            continue
+
+        context = tuple(header for _, header in stack)
+        section.append((context, stripped))
+
+        # Lookahead: a line followed by deeper indented lines opens a sub-context
+        if i + 1 < len(lines):
+            following = lines[i + 1]
+            if len(following) - len(following.lstrip()) > indent:
+                stack.append((indent, stripped))
+
+    return sections
+
+
+def diff_configuration(original, new):
+    """ Calculate the vtysh commands needed to transform the original into the
+    new configuration - only sections which differ are taken into account
+    original:  dict as returned by parse_configuration()
+    new:       dict as returned by parse_configuration()
+
+    return:    tuple (commands, changed) where commands is a list of lines
+               which can be fed into "vtysh -f" and changed is a list with
+               the keys of all modified sections
+    """
+    removals = []
+    additions = []
+    changed = []
+
+    for key in reversed(list(original)):
+        if key in new:
+            continue
+        changed.append(key)
+        body = original[key]
+        if not body:
+            removals.append(_negate(key))
+        elif re.match(_persistent_sections, key):
+            removals.extend(_section_commands(key, body, []))
+        else:
+            removals.append(_negate(key))
+
+    for key, body in new.items():
+        if key not in original:
+            changed.append(key)
+            additions.append(key)
+            if body:
+                additions.extend(_section_commands(key, [], body))
+            continue
+        if set(original[key]) == set(body):
+            continue
+        changed.append(key)
+        additions.extend(_section_commands(key, original[key], body))
+
+    return removals + additions, changed
+
+
+def _section_commands(header, original, new):
+    """ Render the vtysh commands transforming the body of a single section """
+    new_items = set(new)
+    original_items = set(original)
+    headers = {context + (line,) for context, line in original + new}
+    headers = {h for h in headers if any(c[:len(h)] == h for c, _ in original + new if c)}
+
+    # Sub-contexts removed as a whole, their content needs no extra removal
+    removed_headers = {context + (line,) for context, line in original
+                       if context + (line,) in headers and (context, line) not in new_items
+                       and not re.match(_persistent_subsections, line)}
+
+    ops = []
+    for context, line in reversed(original):
+        if (context, line) in new_items:
+            continue
+        if any(context[:len(h)] == h for h in removed_headers):
+            continue
+        if context + (line,) in headers and context + (line,) not in removed_headers:
+            continue
+        candidates = [l for c, l in new if c == context]
+        if _is_overridden(line, candidates):
+            continue
+        ops.append((context, _negate(line), False))
+
+    for context, line in new:
+        if (context, line) in original_items:
+            continue
+        ops.append((context, line, context + (line,) in headers))
+
+    if not ops:
+        return []
+
+    commands = [header]
+    current = ()
+    for context, line, enters in ops:
+        # Find common sub-context, leave and (re-)enter nodes as needed
+        common = 0
+        while common < min(len(current), len(context)) and current[common] == context[common]:
+            common += 1
+        for level in range(len(current), common, -1):
+            commands.append(' ' * level + _section_exit(current[level - 1]))
+        for level in range(common, len(context)):
+            commands.append(' ' * (level + 1) + context[level])
+        commands.append(' ' * (len(context) + 1) + line)
+        current = context + (line,) if enters else context
+
+    for level in range(len(current), 0, -1):
+        commands.append(' ' * level + _section_exit(current[level - 1]))
+    commands.append(_section_exit(header, toplevel=True))
+    return commands
+
+
+def apply_configuration(commands, daemon=None):
+    """ Apply a list of configuration commands using "vtysh -f"
+    commands:  list of commands (including context changes) as generated by
+               diff_configuration()
+    daemon:    Apply the configuration to the specified FRR daemon,
+               supplying daemon=None applies to all daemons
+    return:    vtysh output
+    """
+    if daemon and daemon not in _frr_daemons:
+        raise ValueError(f'The specified daemon type is not supported {repr(daemon)}')
+
+    f = tempfile.NamedTemporaryFile('w')
+    f.write('\n'.join(commands) + '\n')
+    f.flush()
+
+    cmd = f'{path_vtysh}'
+    if daemon:
+        cmd += f' -d {daemon}'
+    cmd += f' -f {f.name}'
+
+    for i, e in enumerate(commands):
+        LOG.debug(f'apply_configuration: command   {i:3} {e}')
+
+    output, code = popen(cmd, stderr=STDOUT)
+    f.close()
+    if code:
+        raise ConfigurationNotValid(f'Applying FRR configuration failed: {repr(output)}')
+
+    return output.replace('\r', '')
+
+
+def render_configuration(sections):
+    """ Render sections as returned by parse_configuration() back into an FRR
+    configuration string
+    """
+    config = []
+    for key, body in sections.items():
+        config.extend(_section_commands(key, [], body) or [key])
+        config.append('!')
+    return '\n'.join(config)
+
+
+def begin_commit_batch():
+    """ Start staging FRR configuration changes instead of committing them
+
+    While a batch is active FRRConfig.commit_configuration() only records the
+    desired configuration per daemon and FRRConfig.load_configuration() returns
+    the already staged configuration. All changes are applied with a single
+    commit per daemon and one save by commit_batch().
+    """
+    global _commit_batch
+    global _commit_owner
+
+    _commit_batch = {}
+    _commit_owner = None
+
+
+def set_commit_owner(owner):
+    """ Record the originator (e.g. a CLI path) of subsequently staged changes,
+    used to attribute errors raised by commit_batch()
+    """
+    global _commit_owner
+    _commit_owner = owner
+
+
+def commit_batch_pending():
+    """ Return True if there are staged but not yet committed changes """
+    return bool(_commit_batch)
+
+
+def commit_batch(incremental=True):
+    """ Commit all staged configuration changes, one commit per FRR daemon
+    followed by a single save of the configuration.
+
+    Changes are merged per section into the current running configuration of
+    each daemon, so sections modified outside of the batch are retained.
+
+    Raises ConfigError naming the originators of the failing sections
+    """
+    global _commit_batch
+    global _commit_owner
+
+    batch = _commit_batch
+    _commit_batch = None
+    _commit_owner = None
+    if not batch:
+        return
+
+    errors = []
+    for daemon, staged in batch.items():
+        _, changed = diff_configuration(parse_configuration(staged['original']),
+                                        parse_configuration(staged['config']))
+        if not changed:
+            continue
+
+        try:
+            running = get_configuration(daemon=daemon)
+            target = parse_configuration(running)
+            new = parse_configuration(staged['config'])
+            for key in changed:
+                if key in new:
+                    target[key] = new[key]
+                else:
+                    target.pop(key, None)
+
+            frr_cfg = FRRConfig(running)
+            frr_cfg.config = render_configuration(target).split('\n')
+            frr_cfg._commit(daemon, incremental=incremental)
+        except (FrrError, ConfigError, OSError) as e:
+            errors.append((daemon, str(e), changed, staged['owners']))
+
+    save_configuration()
+
+    if errors:
+        message = []
+        for daemon, error, changed, owners in errors:
+            # Attribute the error to the sections named in the FRR output, if
+            # no section can be identified blame all originators of the daemon
+            culprits = [key for key in changed if key in error] or changed
+            originators = []
+            for key in culprits:
+                for owner in owners.get(key, []):
+                    if owner not in originators:
+                        originators.append(owner)
+            message.append(f'FRR {daemon} configuration commit failed for: '
+                           f'{", ".join(originators)}\n{error}')
+        raise ConfigError('\n'.join(message))
+
+
 class FRRConfig:
     '''Main FRR Configuration manipulation object
     Using this object the user could load, manipulate and commit the configuration to FRR
@@ -434,6 +900,13 @@ def load_configuration(self, daemon=None):
         '''
         init_debugging()
 
+        if _commit_batch is not None and daemon in _commit_batch:
+            LOG.debug(f'load_configuration: Using staged configuration for {daemon}')
+            self.imported_config = '\n'.join(_commit_batch[daemon]['config'])
+            self.original_config = _commit_batch[daemon]['config'].copy()
+            self.config = self.original_config.copy()
+            return
+
         self.imported_config = get_configuration(daemon=daemon)
         if daemon:
             LOG.debug(f'load_configuration: Configuration loaded from FRR daemon {daemon}')
@@ -454,17 +927,82 @@ def test_configuration(self):
         LOG.debug('test_configation: Testing configuration')
         mark_configuration('\n'.join(self.config))
 
-    def commit_configuration(self, daemon=None):
+    def _commit_incremental(self, daemon=None):
+        '''
+        Apply only the sections which changed between the loaded and the
+        current configuration using vtysh. The running configuration of all
+        modified sections is verified afterwards.
+
+        return: True if FRR now runs the desired configuration, False if a
+                full frr-reload run is required
+        '''
+        new = parse_configuration(self.config)
+        commands, changed = diff_configuration(
+            parse_configuration(self.original_config), new)
+        if not changed:
+            LOG.debug('commit_configuration: No configuration changes')
+            return True
+
+        LOG.debug(f'commit_configuration: Changed sections {changed}')
+        try:
+            apply_configuration(commands, daemon=daemon)
+            running = parse_configuration(get_configuration(daemon=daemon))
+        except (ConfigurationNotValid, OSError) as e:
+            LOG.debug(f'commit_configuration: Incremental apply failed: {e}')
+            return False
+
+        for key in changed:
+            if set(running.get(key, [])) != set(new.get(key, [])) or \
+               ((key in running) != (key in new) and not re.match(_persistent_sections, key)):
+                LOG.debug(f'commit_configuration: Section "{key}" differs after apply')
+                return False
+        return True
+
+    def commit_configuration(self, daemon=None, incremental=True):
         '''
         Commit the current configuration to FRR daemon: str with name of the
         FRR daemon to commit to or None to use the consolidated config.
 
-        Configuration is automatically saved after apply
+        incremental: Only apply the changed sections via vtysh, frr-reload is
+                     used as fallback if this fails or FRR does not end up
+                     with the desired configuration
+
+        Configuration is automatically saved after apply. If a commit batch
+        is active (see begin_commit_batch()) the configuration is only staged.
         '''
+        if _commit_batch is not None:
+            self._stage(daemon)
+            return
+
+        self._commit(daemon, incremental=incremental)
+
+        # Save configuration to /run/frr/config/frr.conf
+        save_configuration()
+
+    def _stage(self, daemon=None):
+        '''Stage the current configuration in the active commit batch'''
+        _, changed = diff_configuration(parse_configuration(self.original_config),
+                                        parse_configuration(self.config))
+        LOG.debug(f'commit_configuration: Staging sections {changed} for {daemon}')
+
+        staged = _commit_batch.setdefault(daemon, {'original': self.original_config.copy(),
+                                                   'owners': {}})
+        staged['config'] = self.config.copy()
+        if _commit_owner:
+            for key in changed:
+                staged['owners'].setdefault(key, [])
+                if _commit_owner not in staged['owners'][key]:
+                    staged['owners'][key].append(_commit_owner)
+
+    def _commit(self, daemon=None, incremental=True):
+        '''Apply the current configuration to FRR without saving it'''
         LOG.debug('commit_configuration:  Commiting configuration')
         for i, e in enumerate(self.config):
             LOG.debug(f'commit_configuration: new_config {i:3} {e}')
 
+        if incremental and self._commit_incremental(daemon):
+            return
+
         # https://github.com/FRRouting/frr/issues/10132
         # https://github.com/FRRouting/frr/issues/10133
         count = 0
@@ -486,9 +1024,6 @@ def commit_configuration(self, daemon=None):
                 raise ConfigError(emsg)
             raise ConfigurationNotValid(f'Config commit retry counter ({count_max}) exceeded for {daemon} daemon!')
 
-        # Save configuration to /run/frr/config/frr.conf
-        save_configuration()
-
 
     def modify_section(self, start_pattern, replacement='!', stop_pattern=r'\S+', remove_stop_mark=False, count=0):
         if isinstance(replacement, str):
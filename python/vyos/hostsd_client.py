@@ -126,6 +126,9 @@ def set_host_name(self, host_name, domain_name):
         }
         self._communicate(msg)
 
-    def apply(self):
+    def apply(self, deferred=False):
         msg = {'op': 'apply'}
+        if deferred:
+            # vyos-hostsd replies right away and applies once updates settle
+            msg['deferred'] = True
         return self._communicate(msg)
@@ -15,6 +15,16 @@
 
 # Package to communicate with Strongswan VICI
 
+import json
+import socket
+import time
+
+# unix socket of vyos-ipsec-state, the event driven SA state cache
+ipsec_state_socket = '/run/vyos-ipsec-state.sock'
+ipsec_state_timeout = 5
+# sessions used in parallel by vici_run_parallel()
+vici_concurrency = 16
+
 
 class ViciInitiateError(Exception):
     """
@@ -32,6 +42,243 @@ class ViciCommandError(Exception):
     pass
 
 
+def _vici_session(session=None):
+    """Return the given VICI session or open a new one"""
+    if session is not None:
+        return session
+    from vici import Session as vici_session
+
+    try:
+        return vici_session()
+    except Exception:
+        raise ViciInitiateError('IPsec is not initialized')
+
+
+class ViciSnapshot:
+    """
+    SAs and connections read over a single VICI session, indexed by IKE_SA
+    and CHILD_SA name. Data is converted for output once, on first access;
+    the session is kept for subsequent commands, so a whole op-mode request
+    talks to charon over one connection.
+
+    A snapshot created from the state of vyos-ipsec-state (see
+    get_ipsec_state()) has no session.
+    """
+
+    def __init__(self, session=None, state: dict = None):
+        self._sas = None
+        self._conns = None
+        self._ike_index = {}
+        self._child_index = {}
+        self._conn_index = {}
+        if state is not None:
+            self.session = None
+            self._set_sas(state['sas'])
+            self._set_connections(state['connections'])
+        else:
+            self.session = _vici_session(session)
+
+    def _set_sas(self, sas: list):
+        self._sas = sas
+        for sa in sas:
+            for ike_name, ike_sa in sa.items():
+                self._ike_index.setdefault(ike_name, []).append(sa)
+                for child_sa in ike_sa.get('child-sas', {}).values():
+                    key = (ike_name, child_sa.get('name'))
+                    self._child_index.setdefault(key, []).append(child_sa)
+
+    def _set_connections(self, conns: list):
+        self._conns = conns
+        for conn in conns:
+            for ike_name in conn:
+                self._conn_index.setdefault(ike_name, []).append(conn)
+
+    @property
+    def sas(self) -> list:
+        """List of {ike_name: ike_sa} as returned by list-sas"""
+        if self._sas is None:
+            from vyos.utils.convert import convert_data
+
+            try:
+                sas = convert_data(list(self.session.list_sas()))
+            except Exception:
+                raise ViciCommandError('Failed to get SAs')
+            self._set_sas(sas)
+        return self._sas
+
+    @property
+    def connections(self) -> list:
+        """List of {ike_name: connection} as returned by list-conns"""
+        if self._conns is None:
+            from vyos.utils.convert import convert_data
+
+            try:
+                conns = convert_data(list(self.session.list_conns()))
+            except Exception:
+                raise ViciCommandError('Failed to get connections')
+            self._set_connections(conns)
+        return self._conns
+
+    def ike_sas(self, ike_name: str) -> list:
+        """Return the IKE_SAs of a connection as {ike_name: ike_sa} items"""
+        self.sas
+        return self._ike_index.get(ike_name, [])
+
+    def child_sas(self, ike_name: str, child_name: str) -> list:
+        """Return the CHILD_SAs named child_name of all IKE_SAs of ike_name"""
+        self.sas
+        return self._child_index.get((ike_name, child_name), [])
+
+    def connection(self, ike_name: str) -> list:
+        """Return the loaded connection ike_name as {ike_name: connection} items"""
+        self.connections
+        return self._conn_index.get(ike_name, [])
+
+
+class IpsecStateTable:
+    """
+    SA state of charon, kept up to date from the VICI ike-updown,
+    child-updown, ike-rekey and child-rekey events by vyos-ipsec-state.
+
+    Events carry the SA as list-sas reports it, so the table only holds
+    established IKE_SAs and installed CHILD_SAs, keyed by unique id. Byte
+    and packet counters are not reported by events and are left out; the
+    relative times are moved forward to the time of dump().
+    """
+
+    ike_up_states = ('ESTABLISHED', 'REKEYING', 'REKEYED')
+    child_up_states = ('INSTALLED', 'REKEYING', 'REKEYED')
+    counters = ('bytes-in', 'bytes-out', 'packets-in', 'packets-out',
+                'use-in', 'use-out')
+
+    def __init__(self):
+        # uniqueid: (ike_name, ike_sa, time of the data)
+        self._ike_sas = {}
+        # uniqueid: {child key: (child_sa, time of the data)}
+        self._child_sas = {}
+        self._conns = []
+
+    def _set_ike(self, ike_name: str, ike_sa: dict, now: float):
+        uniqueid = ike_sa['uniqueid']
+        self._ike_sas[uniqueid] = (ike_name, {k: v for k, v in ike_sa.items()
+                                              if k != 'child-sas'}, now)
+        children = self._child_sas.setdefault(uniqueid, {})
+        for key, child_sa in ike_sa.get('child-sas', {}).items():
+            self._set_child(children, key, child_sa, now)
+
+    def _set_child(self, children: dict, key: str, child_sa: dict, now: float):
+        if child_sa.get('state') in self.child_up_states:
+            children[key] = ({k: v for k, v in child_sa.items()
+                              if k not in self.counters}, now)
+        else:
+            children.pop(key, None)
+
+    def _drop_ike(self, uniqueid: str) -> bool:
+        self._child_sas.pop(uniqueid, None)
+        return self._ike_sas.pop(uniqueid, None) is not None
+
+    def load(self, sas: list, connections: list):
+        """Replace the table by the (converted) output of list-sas/list-conns"""
+        now = time.monotonic()
+        self._ike_sas = {}
+        self._child_sas = {}
+        self._conns = connections
+        for sa in sas:
+            for ike_name, ike_sa in sa.items():
+                if ike_sa.get('state') in self.ike_up_states:
+                    self._set_ike(ike_name, ike_sa, now)
+
+    def apply(self, event_type: str, event: dict) -> bool:
+        """
+        Apply a (converted) VICI event to the table. Return False if the
+        event does not match the table, i.e. events were missed and a full
+        resync is due.
+        """
+        now = time.monotonic()
+        up = event.get('up') == 'yes'
+        in_sync = True
+        for ike_name, ike_sa in event.items():
+            if not isinstance(ike_sa, dict):
+                continue
+            if event_type == 'ike-updown':
+                if up:
+                    self._set_ike(ike_name, ike_sa, now)
+                else:
+                    in_sync &= self._drop_ike(ike_sa['uniqueid'])
+            elif event_type == 'child-updown':
+                uniqueid = ike_sa['uniqueid']
+                if up:
+                    self._set_ike(ike_name, ike_sa, now)
+                elif uniqueid not in self._ike_sas:
+                    in_sync = False
+                else:
+                    children = self._child_sas[uniqueid]
+                    for key in ike_sa.get('child-sas', {}):
+                        in_sync &= children.pop(key, None) is not None
+            elif event_type == 'ike-rekey':
+                in_sync &= self._drop_ike(ike_sa['old']['uniqueid'])
+                self._set_ike(ike_name, ike_sa['new'], now)
+            elif event_type == 'child-rekey':
+                uniqueid = ike_sa['uniqueid']
+                in_sync &= uniqueid in self._ike_sas
+                self._set_ike(ike_name, {k: v for k, v in ike_sa.items()
+                                         if k != 'child-sas'}, now)
+                children = self._child_sas[uniqueid]
+                for child in ike_sa.get('child-sas', {}).values():
+                    old = child['old']
+                    new = child['new']
+                    old_key = f'{old["name"]}-{old["uniqueid"]}'
+                    in_sync &= children.pop(old_key, None) is not None
+                    self._set_child(children, f'{new["name"]}-{new["uniqueid"]}',
+                                    new, now)
+        return in_sync
+
+    @staticmethod
+    def _age(sa: dict, elapsed: int, forward: tuple, backward: tuple) -> dict:
+        sa = dict(sa)
+        for key in forward:
+            if key in sa:
+                sa[key] = str(int(sa[key]) + elapsed)
+        for key in backward:
+            if key in sa:
+                sa[key] = str(max(int(sa[key]) - elapsed, 0))
+        return sa
+
+    def dump(self) -> dict:
+        """Return the table as {'sas': [..], 'connections': [..]} in the
+        format of list-sas and list-conns"""
+        now = time.monotonic()
+        sas = []
+        for uniqueid in sorted(self._ike_sas, key=int):
+            ike_name, ike_sa, updated = self._ike_sas[uniqueid]
+            ike_sa = self._age(ike_sa, int(now - updated), ('established',),
+                               ('rekey-time', 'reauth-time'))
+            ike_sa['child-sas'] = {
+                key: self._age(child_sa, int(now - updated),
+                               ('install-time',), ('rekey-time', 'life-time'))
+                for key, (child_sa, updated) in self._child_sas[uniqueid].items()}
+            sas.append({ike_name: ike_sa})
+        return {'sas': sas, 'connections': self._conns}
+
+
+def get_ipsec_state(path: str = ipsec_state_socket,
+                    timeout: int = ipsec_state_timeout) -> dict:
+    """
+    Return the SA state cached by vyos-ipsec-state as
+    {'sas': [..], 'connections': [..]}, or None if the daemon does not run
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+        return json.loads(b''.join(chunks))
+    except (OSError, ValueError):
+        return None
+
+
 def get_vici_sas():
     from vici import Session as vici_session
 
@@ -115,18 +362,14 @@ def get_vici_connection_by_name(ike_name: str) -> list:
         raise ViciCommandError('Failed to get SAs')
 
 
-def terminate_vici_ikeid_list(ike_id_list: list) -> None:
+def terminate_vici_ikeid_list(ike_id_list: list, session=None) -> None:
     """
     Terminate IKE SAs by their id that contained in the list
     :param ike_id_list: list of IKE SA id
     :type ike_id_list: list
+    :param session: VICI session to use, a new one if None
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError('IPsec is not initialized')
+    session = _vici_session(session)
     try:
         for ikeid in ike_id_list:
             session_generator = session.terminate({'ike-id': ikeid, 'timeout': '-1'})
@@ -139,7 +382,7 @@ def terminate_vici_ikeid_list(ike_id_list: list) -> None:
         raise ViciCommandError(f'Failed to terminate SA for IKE ids {ike_id_list}')
 
 
-def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
+def terminate_vici_by_name(ike_name: str, child_name: str, session=None) -> None:
     """
     Terminate IKE SAs by name if CHILD SA name is None.
     Terminate CHILD SAs by name if CHILD SA name is specified
@@ -147,13 +390,9 @@ def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
     :type ike_name: str
     :param child_name: CHILD SA name
     :type child_name: str
+    :param session: VICI session to use, a new one if None
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError('IPsec is not initialized')
+    session = _vici_session(session)
     try:
         vici_dict: dict = {}
         if ike_name:
@@ -173,23 +412,21 @@ def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
             raise ViciCommandError(f'Failed to terminate SA for IKE {ike_name}')
 
 
-def vici_initiate_all_child_sa_by_ike(ike_sa_name: str, child_sa_list: list) -> bool:
+def vici_initiate_all_child_sa_by_ike(
+    ike_sa_name: str, child_sa_list: list, session=None
+) -> bool:
     """
     Initiate IKE SA with scpecified CHILD_SAs in list
 
     Args:
         ike_sa_name (str): an IKE SA connection name
         child_sa_list (list): a list of child SA names
+        session: VICI session to use, a new one if None
 
     Returns:
         bool: a result of initiation command
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError('IPsec is not initialized')
+    session = _vici_session(session)
 
     try:
         for child_sa_name in child_sa_list:
@@ -207,7 +444,7 @@ def vici_initiate_all_child_sa_by_ike(ike_sa_name: str, child_sa_list: list) ->
 
 
 def vici_initiate(
-    ike_sa_name: str, child_sa_name: str, src_addr: str, dst_addr: str
+    ike_sa_name: str, child_sa_name: str, src_addr: str, dst_addr: str, session=None
 ) -> bool:
     """Initiate IKE SA with one child_sa connection with specific peer
 
@@ -216,16 +453,12 @@ def vici_initiate(
         child_sa_name (str): a child SA profile name
         src_addr (str): source address
         dst_addr (str): remote address
+        session: VICI session to use, a new one if None
 
     Returns:
         bool: a result of initiation command
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError('IPsec is not initialized')
+    session = _vici_session(session)
 
     try:
         session_generator = session.initiate(
@@ -245,3 +478,55 @@ def vici_initiate(
         return True
     except Exception:
         raise ViciCommandError(f'Failed to initiate SA for IKE {ike_sa_name}')
+
+
+def vici_run_parallel(
+    tasks: dict,
+    concurrency: int = vici_concurrency,
+    rate: float = None,
+    session_factory=None,
+) -> dict:
+    """Run VICI command sequences in parallel
+
+    Each task runs on one of up to concurrency VICI sessions, a failing
+    task does not stop the others.
+
+    Args:
+        tasks (dict): task name to a function taking the session to use
+        concurrency (int): number of parallel sessions
+        rate (float): maximum number of tasks started per second
+        session_factory: function returning a new session, a VICI
+                         session by default
+
+    Returns:
+        dict: task name to (True, task result) or (False, error message),
+              in the order of tasks
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    if session_factory is None:
+        session_factory = _vici_session
+    local = threading.local()
+    lock = threading.Lock()
+    next_start = time.monotonic()
+
+    def run(task):
+        nonlocal next_start
+        if rate:
+            with lock:
+                start = max(next_start, time.monotonic())
+                next_start = start + 1 / rate
+            time.sleep(max(start - time.monotonic(), 0))
+        try:
+            if getattr(local, 'session', None) is None:
+                local.session = session_factory()
+            return True, task(local.session)
+        except Exception as e:
+            # the session may be out of step after an error, use a new one
+            local.session = None
+            return False, str(e)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {name: executor.submit(run, task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
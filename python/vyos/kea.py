@@ -56,6 +56,9 @@
 }
 
 kea_ctrl_socket = '/run/kea/dhcp{inet}-ctrl-socket'
+kea_ctrl_timeout = 30
+# leases per lease4-get-page/lease6-get-page command
+kea_lease_page_size = 1000
 
 def kea_parse_options(config):
     options = []
@@ -295,39 +298,75 @@ def kea6_parse_subnet(subnet, config):
 
     return out
 
+_ctrl_socket_checked = set()
+
 def _ctrl_socket_command(inet, command, args=None):
     path = kea_ctrl_socket.format(inet=inet)
 
     if not os.path.exists(path):
         return None
 
-    if file_permissions(path) != '0775':
-        run(f'sudo chmod 775 {path}')
+    if path not in _ctrl_socket_checked:
+        if file_permissions(path) != '0775':
+            run(f'sudo chmod 775 {path}')
+        _ctrl_socket_checked.add(path)
+
+    payload = {'command': command}
+    if args:
+        payload['arguments'] = args
 
     with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(kea_ctrl_timeout)
         sock.connect(path)
+        sock.sendall(json.dumps(payload).encode())
 
-        payload = {'command': command}
-        if args:
-            payload['arguments'] = args
-
-        sock.send(bytes(json.dumps(payload), 'utf-8'))
-        result = b''
+        # Kea answers one command per connection and closes it once the
+        # response is sent; a short read is no end of response
+        chunks = []
         while True:
-            data = sock.recv(4096)
-            result += data
-            if len(data) < 4096:
+            data = sock.recv(65536)
+            if not data:
                 break
+            chunks.append(data)
+
+    return json.loads(b''.join(chunks))
 
-        return json.loads(result.decode('utf-8'))
+def kea_iter_leases(inet, page_size=kea_lease_page_size):
+    """Generator of the leases of the DHCP server, retrieved page by page"""
+    start = 'start'
+    while True:
+        args = {'from': start, 'limit': page_size}
+        result = _ctrl_socket_command(inet, f'lease{inet}-get-page', args)
+
+        # result 3: no (more) leases
+        if not result or 'result' not in result or result['result'] != 0:
+            return
+
+        leases = result['arguments']['leases']
+        yield from leases
+
+        if len(leases) < page_size:
+            return
+        start = leases[-1]['ip-address']
 
 def kea_get_leases(inet):
-    leases = _ctrl_socket_command(inet, f'lease{inet}-get-all')
+    return list(kea_iter_leases(inet))
+
+def kea_get_lease(inet, ip_address):
+    # an IPv6 address may be a delegated prefix
+    lease_types = ['IA_NA', 'IA_PD'] if inet == '6' else [None]
 
-    if not leases or 'result' not in leases or leases['result'] != 0:
-        return []
+    for lease_type in lease_types:
+        args = {'ip-address': ip_address}
+        if lease_type:
+            args['type'] = lease_type
 
-    return leases['arguments']['leases']
+        result = _ctrl_socket_command(inet, f'lease{inet}-get', args)
+
+        if result and 'result' in result and result['result'] == 0:
+            return result['arguments']
+
+    return None
 
 def kea_delete_lease(inet, ip_address):
     args = {'ip-address': ip_address}
@@ -347,6 +386,18 @@ def kea_get_active_config(inet):
 
     return config
 
+def kea_get_pool_map(config, inet):
+    """Return {subnet id: shared network name} of the active config"""
+    shared_networks = dict_search_args(config, 'arguments', f'Dhcp{inet}', 'shared-networks')
+
+    pools = {}
+    for network in shared_networks or []:
+        for subnet in network.get(f'subnet{inet}', []):
+            if 'id' in subnet:
+                pools.setdefault(int(subnet['id']), network['name'])
+
+    return pools
+
 def kea_get_pool_from_subnet_id(config, inet, subnet_id):
     shared_networks = dict_search_args(config, 'arguments', f'Dhcp{inet}', 'shared-networks')
 
@@ -16,6 +16,7 @@
 import os
 import re
 import json
+import time
 import logging
 from pathlib import Path
 from grp import getgrnam
@@ -172,6 +173,8 @@ def run_migration_scripts(self):
 
         migrate_dir = Path(default_dir['migrate'])
         sort_func = ConfigMigrate.sort_function()
+        # (seconds, script, modified) of the applied scripts
+        timings = []
 
         for key in components:
             p = migrate_dir.joinpath(key)
@@ -190,6 +193,7 @@ def run_migration_scripts(self):
             for file in script_list:
                 f = file.as_posix()
                 self.logger.info(f'applying {f}')
+                start = time.perf_counter()
                 try:
                     self.compose.apply_file(f, func_name='migrate')
                 except ComposeConfigError as e:
@@ -202,6 +206,10 @@ def run_migration_scripts(self):
                     break
                 else:
                     revision.update_component(key, sort_func(file)[1])
+                    timings.append((time.perf_counter() - start, f,
+                                    self.compose.modified))
+
+        self.log_timings(timings)
 
         revision.update_config_body(self.compose.to_string())
         ConfigMigrate.normalize_config_body(revision)
@@ -212,6 +220,20 @@ def run_migration_scripts(self):
 
         del os.environ['VYOS_MIGRATION']
 
+    def log_timings(self, timings: list):
+        """
+        Log the time spent per applied migration script, slowest first.
+        """
+        if not timings:
+            return
+        total = sum(t[0] for t in timings)
+        unchanged = sum(1 for t in timings if not t[2])
+        self.logger.info(f'Applied {len(timings)} migration scripts in {total:.3f}s '
+                         f'({unchanged} without changes), time per script:')
+        for seconds, script, modified in sorted(timings, reverse=True):
+            note = '' if modified else ' (no changes)'
+            self.logger.info(f'{seconds:8.3f}s {script}{note}')
+
     def save_json_record(self):
         """
         Write component versions to a json file
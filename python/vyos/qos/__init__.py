@@ -14,6 +14,7 @@
 # License along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
 from vyos.qos.base import QoSBase
+from vyos.qos.base import tc_batch
 from vyos.qos.cake import CAKE
 from vyos.qos.droptail import DropTail
 from vyos.qos.fairqueue import FairQueue
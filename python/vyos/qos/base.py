@@ -14,16 +14,39 @@
 # License along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import re
 import jmespath
 
+from ipaddress import ip_interface
+
 from vyos.base import Warning
 from vyos.utils.process import cmd
+from vyos.utils.process import rc_cmd
 from vyos.utils.dict import dict_search
 from vyos.utils.file import read_file
 
 from vyos.utils.network import get_protocol_by_name
 
 
+def tc_batch(commands: list):
+    """
+    Run a list of tc commands (without the leading "tc") in a single
+    "tc -force -batch" process. tc carries on after a failing command, so
+    all other commands are applied; OSError is raised naming every failing
+    command.
+    """
+    if not commands:
+        return ''
+    code, output = rc_cmd('tc -force -batch -', input='\n'.join(commands) + '\n')
+    if code:
+        # tc reports each failure as "Command failed -:<line>"
+        failed = [f'tc {commands[int(line) - 1]}' for line in
+                  re.findall(r'^Command failed -:(\d+)$', output, re.MULTILINE)
+                  if 0 < int(line) <= len(commands)]
+        raise OSError(code, 'failed to run:\n' + '\n'.join(failed) + f'\n{output}')
+    return output
+
+
 class QoSBase:
     _debug = False
     _direction = ['egress']
@@ -62,21 +85,106 @@ class QoSBase:
         "CS7": 0xE0,
         "EF": 0xB8
     }
+    # u32 hashkey (mask, offset) of the low byte of the fields an exact
+    # match can be hashed on
+    _hash_fields = {
+        'src'   : ('0x000000ff', 12),
+        'dst'   : ('0x000000ff', 16),
+        'sport' : ('0x00ff0000', 20),
+        'dport' : ('0x000000ff', 20),
+    }
+    # minimum number of consecutive matches on the same field moved to a
+    # u32 hash table
+    _hash_threshold = 16
     qostype = None
 
-    def __init__(self, interface):
+    def __init__(self, interface, batch=None):
+        """
+        When a list is passed as batch, the tc commands are not executed but
+        appended to it (without the leading "tc") for a later tc_batch().
+        """
         if os.path.exists('/tmp/vyos.qos.debug'):
             self._debug = True
         self._interface = interface
+        self._batch = batch
+        # handles of the u32 hash tables, the kernel allocates 800: and up
+        self._hash_handle = 0x100
 
     def _cmd(self, command):
         if self._debug:
             print(f'DEBUG/QoS: {command}')
+        if self._batch is not None:
+            self._batch.append(command.removeprefix('tc '))
+            return ''
         return cmd(command)
 
     def get_direction(self) -> list:
         return self._direction
 
+    def _get_hash_key(self, match_config):
+        """
+        Return (field, bucket) of the exact IPv4 host address or port the
+        u32 filter of a match can be hashed on, None if there is none
+        """
+        if 'ip' not in match_config or {'ipv6', 'mark', 'vif'} & set(match_config):
+            return None
+
+        for direction, field in [('source', 'src'), ('destination', 'dst')]:
+            tmp = dict_search(f'ip.{direction}.address', match_config)
+            if not tmp:
+                continue
+            try:
+                address = ip_interface(tmp)
+            except ValueError:
+                continue
+            if address.version == 4 and address.network.prefixlen == 32:
+                return (field, int(address.ip) & 0xff)
+
+        for direction, field in [('source', 'sport'), ('destination', 'dport')]:
+            tmp = dict_search(f'ip.{direction}.port', match_config)
+            if tmp and tmp.isdigit():
+                return (field, int(tmp) & 0xff)
+
+        return None
+
+    def _add_filters(self, filters):
+        """
+        Add the (command, priority, hash key) u32 filters in order. A run of
+        at least _hash_threshold consecutive filters of a priority hashable
+        on the same field is moved to a 256 bucket hash table on the low
+        byte of it, linked in place of the run. The filters keep all their
+        matches and their order, a lookup only walks a single bucket.
+        """
+        runs = {}
+
+        def flush(prio):
+            run = runs.pop(prio, [])
+            if len(run) < self._hash_threshold:
+                for filter_cmd, _ in run:
+                    self._cmd(filter_cmd)
+                return
+
+            handle = self._hash_handle
+            self._hash_handle += 1
+            mask, offset = self._hash_fields[run[0][1][0]]
+            tmp = f'tc filter add dev {self._interface} parent {self._parent:x}: prio {prio} protocol all'
+            self._cmd(f'{tmp} handle {handle:x}: u32 divisor 256')
+            self._cmd(f'{tmp} u32 link {handle:x}: hashkey mask {mask} at {offset} match u32 0 0 at 0')
+            for filter_cmd, (_, bucket) in run:
+                self._cmd(filter_cmd.replace(' u32', f' u32 ht {handle:x}:{bucket:x}:', 1))
+
+        for filter_cmd, prio, key in filters:
+            run = runs.get(prio)
+            if run and (not key or key[0] != run[0][1][0]):
+                flush(prio)
+            if key and prio is not None:
+                runs.setdefault(prio, []).append((filter_cmd, key))
+            else:
+                self._cmd(filter_cmd)
+
+        for prio in list(runs):
+            flush(prio)
+
     def _get_class_max_id(self, config) -> int:
         if 'class' in config:
             tmp = list(config['class'].keys())
@@ -232,17 +340,21 @@ def update(self, config, direction, priority=None):
             pprint.pprint(config)
 
         if 'class' in config:
+            # u32 filters of all classes, added once all classes are known
+            filters = []
             for cls, cls_config in config['class'].items():
                 self._build_base_qdisc(cls_config, int(cls))
 
                 # every match criteria has it's tc instance
                 filter_cmd_base = f'tc filter add dev {self._interface} parent {self._parent:x}:'
 
+                cls_prio = None
                 if priority:
+                    cls_prio = cls
                     filter_cmd_base += f' prio {cls}'
                 elif 'priority' in cls_config:
-                    prio = cls_config['priority']
-                    filter_cmd_base += f' prio {prio}'
+                    cls_prio = cls_config['priority']
+                    filter_cmd_base += f' prio {cls_prio}'
 
                 filter_cmd_base += ' protocol all'
 
@@ -250,6 +362,8 @@ def update(self, config, direction, priority=None):
                     has_filter = False
                     for index, (match, match_config) in enumerate(cls_config['match'].items(), start=1):
                         filter_cmd = filter_cmd_base
+                        prio = cls_prio
+                        hash_key = self._get_hash_key(match_config)
                         if not has_filter:
                             for key in ['mark', 'vif', 'ip', 'ipv6']:
                                 if key in match_config:
@@ -257,6 +371,7 @@ def update(self, config, direction, priority=None):
                                     break
 
                         if self.qostype == 'shaper' and 'prio ' not in filter_cmd:
+                            prio = index
                             filter_cmd += f' prio {index}'
                         if 'mark' in match_config:
                             mark = match_config['mark']
@@ -337,7 +452,7 @@ def update(self, config, direction, priority=None):
 
                                 cls = int(cls)
                                 filter_cmd += f' flowid {self._parent:x}:{cls:x}'
-                                self._cmd(filter_cmd)
+                                filters.append((filter_cmd, prio, hash_key))
 
                     vlan_expression = "match.*.vif"
                     match_vlan = jmespath.search(vlan_expression, cls_config)
@@ -369,7 +484,7 @@ def update(self, config, direction, priority=None):
 
                         cls = int(cls)
                         filter_cmd += f' flowid {self._parent:x}:{cls:x}'
-                        self._cmd(filter_cmd)
+                        filters.append((filter_cmd, prio, hash_key))
 
                 # The police block allows limiting of the byte or packet rate of
                 # traffic matched by the filter it is attached to.
@@ -396,6 +511,8 @@ def update(self, config, direction, priority=None):
                 #     burst = cls_config['burst']
                 #     filter_cmd += f' burst {burst}'
 
+            self._add_filters(filters)
+
         if 'default' in config:
             default_cls_id = 1
             if 'class' in config:
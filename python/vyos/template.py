@@ -193,8 +193,10 @@ def ip_from_cidr(prefix):
     Example:
     192.0.2.1/24 -> 192.0.2.1, 2001:db8::1/64 -> 2001:db8::1
     """
-    from ipaddress import ip_interface
-    return str(ip_interface(prefix).ip)
+    from vyos.utils.ipaddr import parse_interface
+    from vyos.utils.ipaddr import to_address
+    version, address, _ = parse_interface(prefix)
+    return to_address(version, address)
 
 @register_filter('address_from_cidr')
 def address_from_cidr(prefix):
@@ -202,8 +204,10 @@ def address_from_cidr(prefix):
     Example:
     192.0.2.0/24 -> 192.0.2.0, 2001:db8::/48 -> 2001:db8::
     """
-    from ipaddress import ip_network
-    return str(ip_network(prefix).network_address)
+    from vyos.utils.ipaddr import parse_network
+    from vyos.utils.ipaddr import to_address
+    version, network, _ = parse_network(prefix)
+    return to_address(version, network)
 
 @register_filter('bracketize_ipv6')
 def bracketize_ipv6(address):
@@ -239,8 +243,11 @@ def netmask_from_cidr(prefix):
       - 192.0.2.0/24 -> 255.255.255.0
       - 2001:db8::/48 -> ffff:ffff:ffff::
     """
-    from ipaddress import ip_network
-    return str(ip_network(prefix).netmask)
+    from vyos.utils.ipaddr import netmask
+    from vyos.utils.ipaddr import parse_network
+    from vyos.utils.ipaddr import to_address
+    version, _, prefixlen = parse_network(prefix)
+    return to_address(version, netmask(version, prefixlen))
 
 @register_filter('netmask_from_ipv4')
 def netmask_from_ipv4(address):
@@ -278,11 +285,11 @@ def is_ip_network(addr):
       - 2001:db8:1000::/64 -> True
     """
     try:
-        from ipaddress import ip_network
+        from vyos.utils.ipaddr import parse_network
         # input variables must contain a / to indicate its CIDR notation
         if len(addr.split('/')) != 2:
             raise ValueError()
-        ip_network(addr)
+        parse_network(addr)
         return True
     except:
         return False
@@ -315,15 +322,15 @@ def is_ip(addr):
 @register_filter('is_ipv4')
 def is_ipv4(text):
     """ Filter IP address, return True on IPv4 address, False otherwise """
-    from ipaddress import ip_interface
-    try: return ip_interface(text).version == 4
+    from vyos.utils.ipaddr import parse_interface
+    try: return parse_interface(text)[0] == 4
     except: return False
 
 @register_filter('is_ipv6')
 def is_ipv6(text):
     """ Filter IP address, return True on IPv6 address, False otherwise """
-    from ipaddress import ip_interface
-    try: return ip_interface(text).version == 6
+    from vyos.utils.ipaddr import parse_interface
+    try: return parse_interface(text)[0] == 6
     except: return False
 
 @register_filter('first_host_address')
@@ -333,9 +340,11 @@ def first_host_address(prefix):
       - 10.0.0.0/24 -> 10.0.0.1
       - 2001:db8::/64 -> 2001:db8::
     """
-    from ipaddress import ip_interface
-    tmp = ip_interface(prefix).network
-    return str(tmp.network_address +1)
+    from vyos.utils.ipaddr import network_address
+    from vyos.utils.ipaddr import parse_interface
+    from vyos.utils.ipaddr import to_address
+    version, address, prefixlen = parse_interface(prefix)
+    return to_address(version, network_address(version, address, prefixlen) + 1)
 
 @register_filter('last_host_address')
 def last_host_address(text):
@@ -344,15 +353,16 @@ def last_host_address(text):
       - 10.0.0.0/24 -> 10.0.0.254
       - 2001:db8::/64 -> 2001:db8::ffff:ffff:ffff:ffff
     """
-    from ipaddress import ip_interface
-    from ipaddress import IPv4Network
-    from ipaddress import IPv6Network
+    from vyos.utils.ipaddr import broadcast_address
+    from vyos.utils.ipaddr import parse_interface
+    from vyos.utils.ipaddr import to_address
 
-    addr = ip_interface(text)
-    if addr.version == 4:
-        return str(IPv4Network(addr).broadcast_address - 1)
+    version, address, prefixlen = parse_interface(text)
+    broadcast = broadcast_address(version, address, prefixlen)
+    if version == 4:
+        return to_address(version, broadcast - 1)
 
-    return str(IPv6Network(addr).broadcast_address)
+    return to_address(version, broadcast)
 
 @register_filter('inc_ip')
 def inc_ip(address, increment):
@@ -362,8 +372,10 @@ def inc_ip(address, increment):
       - 10.0.0.0/24 -> 10.0.0.2
       - 2001:db8::/64 -> 2001:db8::2
     """
-    from ipaddress import ip_interface
-    return str(ip_interface(address).ip + int(increment))
+    from vyos.utils.ipaddr import parse_interface
+    from vyos.utils.ipaddr import to_address
+    version, value, _ = parse_interface(address)
+    return to_address(version, value + int(increment))
 
 @register_filter('dec_ip')
 def dec_ip(address, decrement):
@@ -373,8 +385,10 @@ def dec_ip(address, decrement):
       - 10.0.0.0/24 -> 10.0.0.2
       - 2001:db8::/64 -> 2001:db8::2
     """
-    from ipaddress import ip_interface
-    return str(ip_interface(address).ip - int(decrement))
+    from vyos.utils.ipaddr import parse_interface
+    from vyos.utils.ipaddr import to_address
+    version, value, _ = parse_interface(address)
+    return to_address(version, value - int(decrement))
 
 @register_filter('compare_netmask')
 def compare_netmask(netmask1, netmask2):
@@ -384,9 +398,11 @@ def compare_netmask(netmask1, netmask2):
     compare_netmask('10.0.0.0/8', '20.0.0.0/8') -> True
     compare_netmask('10.0.0.0/8', '20.0.0.0/16') -> False
     """
-    from ipaddress import ip_network
+    from vyos.utils.ipaddr import parse_network
     try:
-        return ip_network(netmask1).netmask == ip_network(netmask2).netmask
+        version1, _, prefixlen1 = parse_network(netmask1)
+        version2, _, prefixlen2 = parse_network(netmask2)
+        return (version1, prefixlen1) == (version2, prefixlen2)
     except:
         return False
 
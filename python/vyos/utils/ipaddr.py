@@ -0,0 +1,175 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cached, integer based IP address and prefix helpers
+
+Addresses are represented as (version, value) and prefixes as
+(version, value, prefixlen) tuples of plain integers. Parsing of the textual
+representation is memoised, so repeated lookups of the same address - as it
+happens when rendering large configurations - only pay the cost of the
+ipaddress module once. All derived values (netmask, network, broadcast,
+host addresses) are calculated using integer arithmetic.
+"""
+
+from functools import lru_cache
+from ipaddress import IPv4Address
+from ipaddress import IPv6Address
+from ipaddress import ip_address
+from ipaddress import ip_interface
+from ipaddress import ip_network
+
+_cache_size = 65536
+_max_prefixlen = {4: 32, 6: 128}
+
+@lru_cache(maxsize=_cache_size)
+def parse_address(text: str) -> tuple:
+    """ Parse an IPv4/IPv6 address into (version, value)
+
+    Raises ValueError on invalid input
+    """
+    addr = ip_address(text)
+    return addr.version, int(addr)
+
+@lru_cache(maxsize=_cache_size)
+def parse_interface(text: str) -> tuple:
+    """ Parse an IPv4/IPv6 address with optional prefix length, host bits may
+    be set, into (version, address value, prefixlen)
+
+    Raises ValueError on invalid input
+    """
+    iface = ip_interface(text)
+    return iface.version, int(iface.ip), iface.network.prefixlen
+
+@lru_cache(maxsize=_cache_size)
+def parse_network(text: str, strict: bool=True) -> tuple:
+    """ Parse an IPv4/IPv6 prefix into (version, network value, prefixlen)
+
+    strict: raise ValueError if host bits are set, like ipaddress.ip_network()
+    """
+    net = ip_network(text, strict=strict)
+    return net.version, int(net.network_address), net.prefixlen
+
+@lru_cache(maxsize=_cache_size)
+def to_address(version: int, value: int) -> str:
+    """ Convert (version, value) back into the compressed string notation """
+    if version == 4:
+        return str(IPv4Address(value))
+    return str(IPv6Address(value))
+
+def max_prefixlen(version: int) -> int:
+    return _max_prefixlen[version]
+
+def netmask(version: int, prefixlen: int) -> int:
+    """ Return the netmask of a prefix length as integer """
+    bits = _max_prefixlen[version]
+    return ((1 << prefixlen) - 1) << (bits - prefixlen)
+
+def hostmask(version: int, prefixlen: int) -> int:
+    """ Return the hostmask (inverted netmask) of a prefix length as integer """
+    return (1 << (_max_prefixlen[version] - prefixlen)) - 1
+
+def network_address(version: int, value: int, prefixlen: int) -> int:
+    return value & netmask(version, prefixlen)
+
+def broadcast_address(version: int, value: int, prefixlen: int) -> int:
+    return value | hostmask(version, prefixlen)
+
+def contains(network: str, address: str) -> bool:
+    """ Check if address is part of network (host bits in network are ignored) """
+    net_version, net, prefixlen = parse_network(network, strict=False)
+    version, value = parse_address(address.split('%')[0])
+    if version != net_version:
+        return False
+    return value & netmask(version, prefixlen) == net
+
+def contains_many(network: str, addresses: list) -> list:
+    """ Check a list of addresses against a single network
+
+    return: list of bool, in the order of addresses
+    """
+    net_version, net, prefixlen = parse_network(network, strict=False)
+    mask = netmask(net_version, prefixlen)
+    result = []
+    for address in addresses:
+        version, value = parse_address(address.split('%')[0])
+        result.append(version == net_version and value & mask == net)
+    return result
+
+def _range_to_blocks(first: int, last: int, bits: int) -> list:
+    """ Split integer range into the minimal list of (value, prefixlen) blocks """
+    blocks = []
+    while first <= last:
+        # Largest block aligned at first which does not exceed last
+        size = (first & -first).bit_length() - 1 if first else bits
+        while first + (1 << size) - 1 > last:
+            size -= 1
+        blocks.append((first, bits - size))
+        first += 1 << size
+    return blocks
+
+def range_to_prefixes(first: str, last: str) -> list:
+    """ Convert an address range into the minimal list of covering prefixes
+
+    Example:
+      - 192.0.2.1, 192.0.2.6 -> 192.0.2.1/32, 192.0.2.2/31, 192.0.2.4/31, 192.0.2.6/32
+    """
+    version, first_value = parse_address(first)
+    last_version, last_value = parse_address(last)
+    if version != last_version:
+        raise ValueError(f'Address family mismatch between "{first}" and "{last}"')
+    if first_value > last_value:
+        raise ValueError(f'Range start "{first}" is larger than end "{last}"')
+
+    return [f'{to_address(version, value)}/{prefixlen}' for value, prefixlen in
+            _range_to_blocks(first_value, last_value, _max_prefixlen[version])]
+
+def summarise(prefixes: list) -> list:
+    """ Collapse a list of addresses and prefixes into the minimal list of
+    prefixes covering exactly the same address space - IPv4 entries come first
+
+    Example:
+      - 192.0.2.0/25, 192.0.2.128/25, 192.0.2.10 -> 192.0.2.0/24
+    """
+    intervals = []
+    for prefix in prefixes:
+        version, value, prefixlen = parse_network(prefix, strict=False)
+        intervals.append((version, value, broadcast_address(version, value, prefixlen)))
+    intervals.sort()
+
+    merged = []
+    for version, first, last in intervals:
+        if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+            if last > merged[-1][2]:
+                merged[-1][2] = last
+            continue
+        merged.append([version, first, last])
+
+    result = []
+    for version, first, last in merged:
+        result.extend(f'{to_address(version, value)}/{prefixlen}' for value, prefixlen in
+                      _range_to_blocks(first, last, _max_prefixlen[version]))
+    return result
+
+def range_prefix_length(first: str, last: str):
+    """ Return the prefix length if the address range covers exactly one
+    prefix, None otherwise (or if any address is invalid) """
+    try:
+        prefixes = range_to_prefixes(first, last)
+    except ValueError:
+        return None
+    if len(prefixes) != 1:
+        return None
+    return int(prefixes[0].split('/')[1])
@@ -405,40 +405,36 @@ def is_subnet_connected(subnet, primary=False):
 
     Return True/False
     """
-    from ipaddress import ip_address
-    from ipaddress import ip_network
-
     from netifaces import ifaddresses
     from netifaces import interfaces
     from netifaces import AF_INET
     from netifaces import AF_INET6
 
-    from vyos.template import is_ipv6
+    from vyos.utils.ipaddr import contains_many
+    from vyos.utils.ipaddr import parse_network
 
     # determine IP version (AF_INET or AF_INET6) depending on passed address
     addr_type = AF_INET
-    if is_ipv6(subnet):
+    if parse_network(subnet, strict=False)[0] == 6:
         addr_type = AF_INET6
 
     for interface in interfaces():
+        addresses = ifaddresses(interface)
         # check if the requested address type is configured at all
-        if addr_type not in ifaddresses(interface).keys():
+        if addr_type not in addresses:
             continue
 
         # An interface can have multiple addresses, but some software components
         # only support the primary address :(
         if primary:
-            ip = ifaddresses(interface)[addr_type][0]['addr']
-            if ip_address(ip) in ip_network(subnet):
+            if contains_many(subnet, [addresses[addr_type][0]['addr']])[0]:
                 return True
         else:
             # Check every assigned IP address if it is connected to the subnet
-            # in question
-            for ip in ifaddresses(interface)[addr_type]:
-                # remove interface extension (e.g. %eth0) that gets thrown on the end of _some_ addrs
-                addr = ip['addr'].split('%')[0]
-                if ip_address(addr) in ip_network(subnet):
-                    return True
+            # in question, interface extension (e.g. %eth0) that gets thrown on
+            # the end of _some_ addrs is removed by contains_many()
+            if any(contains_many(subnet, [ip['addr'] for ip in addresses[addr_type]])):
+                return True
 
     return False
 
@@ -537,38 +533,17 @@ def get_vxlan_vni_filter(interface: str) -> list:
     return os_configured_vnis
 
 # Calculate prefix length of an IPv6 range, where possible
-# Python-ified from source: https://gitlab.isc.org/isc-projects/dhcp/-/blob/master/keama/confparse.c#L4591
 def ipv6_prefix_length(low, high):
-    import socket
-
-    bytemasks = [0x80, 0xc0, 0xe0, 0xf0, 0xf8, 0xfc, 0xfe, 0xff]
-
+    """ Return the prefix length if the IPv6 range low-high covers exactly one
+    prefix, None otherwise """
+    from vyos.utils.ipaddr import parse_address
+    from vyos.utils.ipaddr import range_prefix_length
     try:
-        lo = bytearray(socket.inet_pton(socket.AF_INET6, low))
-        hi = bytearray(socket.inet_pton(socket.AF_INET6, high))
-    except:
-        return None
-
-    xor = bytearray(a ^ b for a, b in zip(lo, hi))
-
-    plen = 0
-    while plen < 128 and xor[plen // 8] == 0:
-        plen += 8
-
-    if plen == 128:
-        return plen
-
-    for i in range((plen // 8) + 1, 16):
-        if xor[i] != 0:
+        if parse_address(low)[0] != 6:
             return None
-
-    for i in range(8):
-        msk = ~xor[plen // 8] & 0xff
-
-        if msk == bytemasks[i]:
-            return plen + i + 1
-
-    return None
+    except ValueError:
+        return None
+    return range_prefix_length(low, high)
 
 def get_nft_vrf_zone_mapping() -> dict:
     """
@@ -54,6 +54,12 @@ def is_valueless(path: list) -> bool:
 def is_leaf(path: list) -> bool:
     return load_reference().is_leaf(path)
 
+def split_path(path: list) -> tuple:
+    return load_reference().split_path(path)
+
+def constraints(path: list) -> tuple:
+    return load_reference().constraints(path)
+
 def owner(path: list, with_tag=False) -> str:
     return load_reference().owner(path, with_tag=with_tag)
 
@@ -161,6 +161,26 @@ def is_leaf(self, path: list) -> bool:
         d = self._get_ref_path(path)
         return self._is_leaf_node(d)
 
+    def constraints(self, path: list) -> Tuple[list, str]:
+        """ Return the value constraints of a leaf node or the name
+        constraints of a tag node, as a list of (kind, argument) tuples with
+        kind 'regex' or 'exec', and the constraint error message.
+
+        Raises ValueError if the cache was generated without constraint
+        data, as the node can not be validated then.
+        """
+        d = self._get_ref_path(path)
+        res = []
+        constraints = self._get_ref_node_data(d, 'constraints')
+        message = d.get('node_data', {}).get('constraint_error_message')
+        for c in constraints or []:
+            # serialized variant type: ["Regex", "..."], ["External", "...", "args"]
+            kind, *args = c if isinstance(c, list) else [c]
+            kind = 'regex' if kind.lower() == 'regex' else 'exec'
+            arg = ' '.join(a for a in args if a)
+            res.append((kind, arg))
+        return res, message or ''
+
     def _least_upper_data(self, path: list, name: str) -> str:
         ref_path = path.copy()
         d = self.ref
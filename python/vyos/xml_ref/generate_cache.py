@@ -34,7 +34,8 @@
 ref_cache = abspath(join(_here, 'cache.py'))
 
 node_data_fields = ("node_type", "multi", "valueless", "default_value",
-                    "owner", "priority")
+                    "owner", "priority", "constraints",
+                    "constraint_error_message")
 
 def trim_node_data(cache: dict):
     for k in list(cache):
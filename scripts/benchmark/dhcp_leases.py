@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark of the DHCP server lease assembly of 'show dhcp server leases'
+# with synthetic Kea leases, against the former per-lease pool lookup and
+# list based deduplication. The op-mode module reads the running config on
+# import, so run this on a VyOS system, from the repository root:
+#
+#   PYTHONPATH=python scripts/benchmark/dhcp_leases.py --leases 100000
+
+import argparse
+import importlib.util
+import time
+
+from ipaddress import ip_address
+
+from vyos.kea import kea_get_pool_from_subnet_id
+
+def load_op_mode():
+    spec = importlib.util.spec_from_file_location('dhcp', 'src/op_mode/dhcp.py')
+    dhcp = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dhcp)
+    return dhcp
+
+def make_leases(count, subnets):
+    now = int(time.time())
+    first = int(ip_address('10.0.0.0'))
+    leases = []
+    for i in range(count):
+        leases.append({'ip-address': str(ip_address(first + i % (count - count // 100))),
+                       'hw-address': f'00:53:{(i >> 24) & 0xff:02x}:{(i >> 16) & 0xff:02x}:'
+                                     f'{(i >> 8) & 0xff:02x}:{i & 0xff:02x}',
+                       'hostname': f'host{i}', 'state': i % 3,
+                       'cltt': now - i % 3600, 'valid-lft': 86400,
+                       'subnet-id': i % subnets + 1})
+    return leases
+
+def make_config(subnets, networks):
+    shared_networks = [{'name': f'POOL{n}', 'subnet4': []} for n in range(networks)]
+    for s in range(subnets):
+        shared_networks[s % networks]['subnet4'].append({'id': s + 1})
+    return {'arguments': {'Dhcp4': {'shared-networks': shared_networks}}}
+
+def legacy_assemble(leases, config, pools):
+    # the cost relevant part of the former implementation
+    data = []
+    for lease in leases:
+        data_lease = {'ip': lease['ip-address'],
+                      'pool': kea_get_pool_from_subnet_id(config, '4', lease['subnet-id'])}
+        if data_lease['pool'] in pools:
+            data.append(data_lease)
+        checked = []
+        for entry in data:
+            addr = entry.get('ip')
+            if addr not in checked:
+                checked.append(addr)
+            else:
+                data.pop(next(i for i, d in enumerate(data) if d['ip'] == addr))
+    return data
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leases', type=int, default=100000,
+                        help='Number of leases (default: %(default)s)')
+    parser.add_argument('--subnets', type=int, default=256,
+                        help='Number of subnets (default: %(default)s)')
+    parser.add_argument('--networks', type=int, default=16,
+                        help='Number of shared networks (default: %(default)s)')
+    parser.add_argument('--legacy-leases', type=int, default=1000,
+                        help='Number of leases for the former implementation (default: %(default)s)')
+    args = parser.parse_args()
+
+    leases = make_leases(args.leases, args.subnets)
+    config = make_config(args.subnets, args.networks)
+    pools = [f'POOL{n}' for n in range(args.networks)]
+
+    dhcp = load_op_mode()
+    dhcp.kea_iter_leases = lambda inet: iter(leases)
+    dhcp.kea_get_active_config = lambda inet: config
+    dhcp._get_dhcp_pools = lambda family: pools
+
+    print(f'{args.leases} leases, {args.subnets} subnets, {args.networks} shared networks')
+    for sorted in [None, 'ip', 'mac', 'state', 'end', 'hostname']:
+        start = time.perf_counter()
+        data = dhcp._get_raw_server_leases(family='inet', sorted=sorted)
+        print(f'sorted by {str(sorted):<10} {time.perf_counter() - start:>8.3f}s ({len(data)} leases)')
+
+    start = time.perf_counter()
+    data = dhcp._get_raw_server_leases(family='inet', state='active', pool='POOL0')
+    print(f'{"filtered":<20} {time.perf_counter() - start:>8.3f}s ({len(data)} leases)')
+
+    legacy = leases[:args.legacy_leases]
+    dhcp.kea_iter_leases = lambda inet: iter(legacy)
+    start = time.perf_counter()
+    dhcp._get_raw_server_leases(family='inet')
+    new_time = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy_assemble(legacy, config, pools)
+    old_time = time.perf_counter() - start
+    print(f'{len(legacy)} leases: former {old_time:.3f}s, now {new_time:.3f}s, '
+          f'{old_time / new_time:.1f}x')
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Micro-benchmark of the IP address helpers used by vyos.template filters,
+# comparing plain ipaddress objects against the cached integer helpers in
+# vyos.utils.ipaddr. Run from the repository root:
+#
+#   PYTHONPATH=python scripts/benchmark/ipaddr.py
+
+import argparse
+import timeit
+
+from ipaddress import ip_address
+from ipaddress import ip_interface
+from ipaddress import ip_network
+
+from vyos.utils.ipaddr import broadcast_address
+from vyos.utils.ipaddr import contains_many
+from vyos.utils.ipaddr import netmask
+from vyos.utils.ipaddr import network_address
+from vyos.utils.ipaddr import parse_interface
+from vyos.utils.ipaddr import parse_network
+from vyos.utils.ipaddr import to_address
+
+def first_host_address_ipaddress(prefix):
+    return str(ip_interface(prefix).network.network_address + 1)
+
+def first_host_address_cached(prefix):
+    version, address, prefixlen = parse_interface(prefix)
+    return to_address(version, network_address(version, address, prefixlen) + 1)
+
+def last_host_address_ipaddress(prefix):
+    return str(ip_interface(prefix).network.broadcast_address - 1)
+
+def last_host_address_cached(prefix):
+    version, address, prefixlen = parse_interface(prefix)
+    return to_address(version, broadcast_address(version, address, prefixlen) - 1)
+
+def netmask_from_cidr_ipaddress(prefix):
+    return str(ip_network(prefix).netmask)
+
+def netmask_from_cidr_cached(prefix):
+    version, _, prefixlen = parse_network(prefix)
+    return to_address(version, netmask(version, prefixlen))
+
+def inc_ip_ipaddress(address):
+    return str(ip_interface(address).ip + 10)
+
+def inc_ip_cached(address):
+    version, value, _ = parse_interface(address)
+    return to_address(version, value + 10)
+
+def contains_ipaddress(network, addresses):
+    return [ip_address(a) in ip_network(network) for a in addresses]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prefixes', type=int, default=1000,
+                        help='Number of distinct prefixes (default: %(default)s)')
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='Number of times each prefix is rendered (default: %(default)s)')
+    args = parser.parse_args()
+
+    # Large configurations reference the same subnets from many places
+    prefixes = [f'10.{(i >> 8) & 0xff}.{i & 0xff}.0/24' for i in range(args.prefixes)]
+    addresses = [f'10.0.{i & 0xff}.{i % 254 + 1}' for i in range(args.prefixes)]
+
+    print(f'{"function":<20} {"ipaddress":>12} {"cached":>12} {"speedup":>8}')
+    for name, old, new in [
+            ('first_host_address', first_host_address_ipaddress, first_host_address_cached),
+            ('last_host_address', last_host_address_ipaddress, last_host_address_cached),
+            ('netmask_from_cidr', netmask_from_cidr_ipaddress, netmask_from_cidr_cached),
+            ('inc_ip', inc_ip_ipaddress, inc_ip_cached)]:
+        for prefix in prefixes:
+            assert old(prefix) == new(prefix)
+        old_time = timeit.timeit(lambda: [old(p) for p in prefixes], number=args.rounds)
+        new_time = timeit.timeit(lambda: [new(p) for p in prefixes], number=args.rounds)
+        print(f'{name:<20} {old_time:>11.3f}s {new_time:>11.3f}s {old_time / new_time:>7.1f}x')
+
+    assert contains_ipaddress('10.0.0.0/16', addresses) == contains_many('10.0.0.0/16', addresses)
+    old_time = timeit.timeit(lambda: contains_ipaddress('10.0.0.0/16', addresses), number=args.rounds)
+    new_time = timeit.timeit(lambda: contains_many('10.0.0.0/16', addresses), number=args.rounds)
+    print(f'{"contains_many":<20} {old_time:>11.3f}s {new_time:>11.3f}s {old_time / new_time:>7.1f}x')
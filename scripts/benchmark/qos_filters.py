@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Classification cost of the u32 filters generated by vyos.qos for a
+# synthetic per-subscriber shaper (one class per /32 or port), with and
+# without u32 hash tables. The generated tc commands are replayed into a
+# model of the u32 classifier walk, which counts the match keys compared
+# per packet as the kernel does. Run from the repository root:
+#
+#   PYTHONPATH=python scripts/benchmark/qos_filters.py --matches 4000
+
+import argparse
+import random
+import time
+
+from ipaddress import ip_address
+
+from vyos.qos import TrafficShaper
+
+FIELDS = {
+    'src'   : ('source', 'address'),
+    'dst'   : ('destination', 'address'),
+    'sport' : ('source', 'port'),
+    'dport' : ('destination', 'port'),
+}
+
+def make_config(matches, field, priority):
+    direction, key = FIELDS[field]
+    first = int(ip_address('100.64.0.0'))
+    classes = {}
+    for i in range(matches):
+        value = str(ip_address(first + i)) if key == 'address' else str(1024 + i)
+        classes[str(i + 2)] = {'bandwidth': '1mbit', 'burst': '15k',
+                               'codel_quantum': '1514', 'queue_type': 'fq-codel',
+                               'match': {'SUB': {'ip': {direction: {key: value}}}}}
+        if priority is not None:
+            classes[str(i + 2)]['priority'] = str(priority)
+    return {'bandwidth': '10gbit', 'class': classes,
+            'default': {'bandwidth': '10%', 'burst': '15k', 'codel_quantum': '1514',
+                        'priority': '20', 'queue_type': 'fq-codel'}}
+
+def generate(config, threshold):
+    commands = []
+    shaper = TrafficShaper('bench0', batch=commands)
+    shaper._hash_threshold = threshold
+    start = time.perf_counter()
+    shaper.update(config, 'egress')
+    return [c for c in commands if c.startswith('filter')], time.perf_counter() - start
+
+def parse_filters(commands):
+    # {prio: {'root' or 'handle:bucket': [node]}},
+    # node: {'keys': [(field, value)], 'link': handle, 'hash': field}
+    tables = {}
+    for command in commands:
+        args = command.split()
+        prio = int(args[args.index('prio') + 1])
+        tables.setdefault(prio, {})
+        if 'divisor' in args:
+            continue
+        node = {'keys': [], 'link': None, 'hash': None}
+        ht = 'root'
+        i = args.index('u32') + 1
+        while i < len(args):
+            if args[i] == 'ht':
+                ht = args[i + 1].rstrip(':')
+            elif args[i] == 'link':
+                node['link'] = args[i + 1].rstrip(':')
+            elif args[i] == 'hashkey':
+                mask, offset = args[i + 2], int(args[i + 4])
+                node['hash'] = {('0x000000ff', 12): 'src', ('0x000000ff', 16): 'dst',
+                                ('0x00ff0000', 20): 'sport', ('0x000000ff', 20): 'dport'}[(mask, offset)]
+            elif args[i] == 'match':
+                if args[i + 1] == 'u32':
+                    node['keys'].append((None, None))
+                else:
+                    value = args[i + 3].split('/')[0]
+                    node['keys'].append((args[i + 2], value))
+            elif args[i] == 'action':
+                break
+            i += 1
+        tables[prio].setdefault(ht, []).append(node)
+    return tables
+
+def classify(tables, packet):
+    keys = 0
+    for prio in sorted(tables):
+        for node in tables[prio].get('root', []):
+            matched = True
+            for field, value in node['keys']:
+                keys += 1
+                if field and packet[field] != value:
+                    matched = False
+                    break
+            if not matched:
+                continue
+            if node['link'] is None:
+                return keys
+            bucket = int(ip_address(packet[node['hash']])) if node['hash'] in ['src', 'dst'] \
+                     else int(packet[node['hash']])
+            bucket = f'{node["link"]}:{bucket & 0xff:x}'
+            for leaf in tables[prio].get(bucket, []):
+                for field, value in leaf['keys']:
+                    keys += 1
+                    if packet[field] != value:
+                        break
+                else:
+                    return keys
+    return keys
+
+def make_packets(count, matches):
+    first = int(ip_address('100.64.0.0'))
+    packets = []
+    for _ in range(count):
+        # one in ten packets does not belong to a subscriber
+        i = random.randrange(matches + matches // 10)
+        packets.append({'src': str(ip_address(first + i)), 'dst': str(ip_address(first + i)),
+                        'sport': str(1024 + i), 'dport': str(1024 + i)})
+    return packets
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=4000,
+                        help='Number of classes with one match each (default: %(default)s)')
+    parser.add_argument('--field', choices=list(FIELDS), default='src',
+                        help='Field matched by the classes (default: %(default)s)')
+    parser.add_argument('--priority', type=int, default=5,
+                        help='Class priority, -1 for none (default: %(default)s)')
+    parser.add_argument('--packets', type=int, default=10000,
+                        help='Number of classified packets (default: %(default)s)')
+    args = parser.parse_args()
+
+    priority = args.priority if args.priority >= 0 else None
+    config = make_config(args.matches, args.field, priority)
+    packets = make_packets(args.packets, args.matches)
+
+    print(f'{args.matches} matches on {args.field}, {args.packets} packets')
+    for name, threshold in [('linear', float('inf')), ('hashed', TrafficShaper._hash_threshold)]:
+        commands, gen_time = generate(config, threshold)
+        tables = parse_filters(commands)
+        cost = [classify(tables, packet) for packet in packets]
+        print(f'{name:<8} {len(commands):>7} filters, generated in {gen_time:.3f}s, '
+              f'keys per packet: avg {sum(cost) / len(cost):.1f} max {max(cost)}')
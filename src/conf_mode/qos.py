@@ -36,6 +36,7 @@
 from vyos.qos import RoundRobin
 from vyos.qos import TrafficShaper
 from vyos.qos import TrafficShaperHFSC
+from vyos.qos import tc_batch
 from vyos.utils.dict import dict_search_recursive
 from vyos.utils.process import run
 from vyos import ConfigError
@@ -120,29 +121,11 @@ def _get_group_match(config:dict, group_name:str) -> dict:
     return match
 
 
-def get_config(config=None):
-    if config:
-        conf = config
-    else:
-        conf = Config()
-    base = ['qos']
-    if not conf.exists(base):
-        return None
-
-    qos = conf.get_config_dict(base, key_mangling=('-', '_'),
+def _get_qos_dict(conf, effective=False):
+    qos = conf.get_config_dict(['qos'], key_mangling=('-', '_'),
                                get_first_key=True,
-                               no_tag_node_value_mangle=True)
-
-    for ifname in interfaces():
-        if_node = Section.get_config_path(ifname)
-
-        if not if_node:
-            continue
-
-        path = f'interfaces {if_node}'
-        if conf.exists(f'{path} mirror') or conf.exists(f'{path} redirect'):
-            type_node = path.split(" ")[1] # return only interface type node
-            set_dependents(type_node, conf, ifname.split(".")[0])
+                               no_tag_node_value_mangle=True,
+                               effective=effective)
 
     for policy in qos.get('policy', []):
         if policy in ['random_detect']:
@@ -195,6 +178,69 @@ def get_config(config=None):
     return qos
 
 
+def _get_interface_shapers(qos):
+    """
+    Return the policy type and config used per interface and direction:
+    {interface: {direction: (policy type, policy config)}}
+    """
+    shapers = {}
+    for interface, interface_config in qos.get('interface', {}).items():
+        shapers[interface] = {}
+        for direction in ['egress', 'ingress']:
+            if direction not in interface_config:
+                continue
+            policy_name = interface_config[direction]
+            for shaper_type, policies in qos.get('policy', {}).items():
+                if policy_name in policies:
+                    shapers[interface][direction] = (shaper_type, policies[policy_name])
+    return shapers
+
+
+def get_config(config=None):
+    if config:
+        conf = config
+    else:
+        conf = Config()
+    base = ['qos']
+
+    effective = {}
+    if conf.exists_effective(base):
+        effective = _get_qos_dict(conf, effective=True)
+
+    if not conf.exists(base):
+        # only the interfaces which had a QoS policy need to be cleaned up
+        return {'rebuild': list(effective.get('interface', {}))}
+
+    qos = _get_qos_dict(conf)
+
+    # Only interfaces whose resolved policies changed are rebuilt. Without
+    # any QoS change the script was called to re-apply the configuration
+    # (e.g. after a dialup interface came up) - rebuild all of them.
+    old_shapers = _get_interface_shapers(effective)
+    new_shapers = _get_interface_shapers(qos)
+    if qos == effective:
+        rebuild = set(new_shapers)
+    else:
+        rebuild = {interface for interface in old_shapers.keys() | new_shapers.keys()
+                   if old_shapers.get(interface) != new_shapers.get(interface)}
+
+    for ifname in interfaces():
+        if_node = Section.get_config_path(ifname)
+
+        if not if_node:
+            continue
+
+        path = f'interfaces {if_node}'
+        if conf.exists(f'{path} mirror') or conf.exists(f'{path} redirect'):
+            type_node = path.split(" ")[1] # return only interface type node
+            set_dependents(type_node, conf, ifname.split(".")[0])
+            # the mirror/redirect re-apply clears the qdiscs of the interface
+            rebuild.add(ifname)
+
+    qos['rebuild'] = sorted(rebuild)
+    return qos
+
+
 def _verify_match(cls_config: dict) -> None:
     if 'match' in cls_config:
         for match, match_config in cls_config['match'].items():
@@ -291,33 +337,53 @@ def generate(qos):
     return None
 
 def apply(qos):
-    # Always delete "old" shapers first
-    for interface in interfaces():
+    # Always delete "old" shapers of the interfaces to rebuild first
+    existing = interfaces()
+    for interface in qos['rebuild']:
+        if interface not in existing:
+            continue
         # Ignore errors (may have no qdisc)
         run(f'tc qdisc del dev {interface} parent ffff:')
         run(f'tc qdisc del dev {interface} root')
 
     call_dependents()
 
-    if not qos or 'interface' not in qos:
+    if 'interface' not in qos:
         return None
 
+    errors = []
     for interface, interface_config in qos['interface'].items():
+        if interface not in qos['rebuild']:
+            continue
+
         if not verify_interface_exists(qos, interface, state_required=True, warning_only=True):
             # When shaper is bound to a dialup (e.g. PPPoE) interface it is
             # possible that it is yet not availbale when to QoS code runs.
             # Skip the configuration and inform the user via warning_only=True
             continue
 
+        # all qdiscs, classes and filters of an interface are programmed
+        # by a single tc process
+        batch = []
         for direction in ['egress', 'ingress']:
             # bail out early if shaper for given direction is not used at all
             if direction not in interface_config:
                 continue
 
             shaper_type, shaper_config = get_shaper(qos, interface_config, direction)
-            tmp = shaper_type(interface)
+            tmp = shaper_type(interface, batch=batch)
             tmp.update(shaper_config, direction)
 
+        # the old qdiscs are gone: program all interfaces as far as possible
+        # and report the failing commands of all of them
+        try:
+            tc_batch(batch)
+        except OSError as e:
+            errors.append(f'QoS on interface "{interface}" is incomplete, {e.strerror}')
+
+    if errors:
+        raise ConfigError('\n'.join(errors))
+
     return None
 
 
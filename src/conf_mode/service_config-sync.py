@@ -17,6 +17,8 @@
 import os
 import json
 from pathlib import Path
+from shutil import chown
+from shutil import rmtree
 
 from vyos.config import Config
 from vyos import ConfigError
@@ -29,6 +31,8 @@
 post_commit_dir = '/run/scripts/commit/post-hooks.d'
 post_commit_file_src = '/usr/libexec/vyos/vyos_config_sync.py'
 post_commit_file = f'{post_commit_dir}/vyos_config_sync'
+# sections last synchronized to each secondary, written by the post-commit hook
+sync_state_dir = '/run/config_sync'
 
 
 def get_config(config=None):
@@ -65,6 +69,10 @@ def verify(config):
 
 
 def generate(config):
+    # the synchronized sections may differ now, start over
+    if os.path.isdir(sync_state_dir):
+        rmtree(sync_state_dir)
+
     if not config:
 
         if os.path.exists(post_commit_file):
@@ -79,6 +87,11 @@ def generate(config):
     conf_json = json.dumps(config, indent=4)
     service_conf.write_text(conf_json)
 
+    if config['mode'] == 'delta':
+        os.makedirs(sync_state_dir)
+        chown(sync_state_dir, group='vyattacfg')
+        os.chmod(sync_state_dir, 0o2775)
+
     # Create post commit dir
     if not os.path.isdir(post_commit_dir):
         os.makedirs(post_commit_dir)
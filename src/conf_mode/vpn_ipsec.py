@@ -721,7 +721,9 @@ def generate(ipsec):
 
 def apply(ipsec):
     systemd_service = 'strongswan.service'
+    state_service = 'vyos-ipsec-state.service'
     if not ipsec:
+        call(f'systemctl stop {state_service}')
         call(f'systemctl stop {systemd_service}')
 
         if vti_updown_db_exists():
@@ -729,6 +731,8 @@ def apply(ipsec):
 
     else:
         call(f'systemctl reload-or-restart {systemd_service}')
+        # the SA state cache re-reads the connections on reload
+        call(f'systemctl reload-or-restart {state_service}')
 
         if ipsec['enabled_vti_interfaces']:
             with open_vti_updown_db_for_create_or_update() as db:
@@ -14,147 +14,391 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+# All next-hops are checked concurrently by an asyncio health-check engine,
+# each one at its own interval ("check timeout"). ICMP and TCP probes are sent
+# natively from this process, only ARP probes still use arping. Route changes
+# are collected and programmed in batches via a single netlink socket.
+
 import argparse
+import asyncio
 import json
+import os
 import socket
+import struct
 import time
 
-from vyos.utils.process import rc_cmd
+from ipaddress import ip_network
 from pathlib import Path
+
+from pyroute2 import IPRoute
+from pyroute2 import NetlinkError
 from systemd import journal
 
 
 my_name = Path(__file__).stem
+state_file = Path('/run/vyos-failover.state')
 
+# Own routing protocol number, see /etc/iproute2/rt_protos.d/failover.conf
+rt_proto_failover = 111
+RTNH_F_ONLINK = 4
 
-def is_route_exists(route, gateway, interface, metric):
-    """Check if route with expected gateway, dev and metric exists"""
-    rc, data = rc_cmd(f'ip --json route show protocol failover {route} '
-                      f'via {gateway} dev {interface} metric {metric}')
-    if rc == 0:
-        data = json.loads(data)
-        if len(data) > 0:
-            return True
-    return False
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
 
+# Number of probes sent to a single target per check and time to wait for
+# each reply - this mimics the former "ping -c 2 -W 1" behavior
+probe_count = 2
+probe_timeout = 1
+tcp_timeout = 2
 
-def get_best_route_options(route, debug=False):
-    """
-    Return current best route ('gateway, interface, metric)
+# Time to wait for further next-hop state changes before programming routes
+batch_window = 0.1
+# Interval to re-sync the kernel routing table if no state changed
+sync_interval = 5
 
-    % get_best_route_options('203.0.113.1')
-    ('192.168.0.1', 'eth1', 1)
+debug = False
 
-    % get_best_route_options('203.0.113.254')
-    (None, None, None)
-    """
-    rc, data = rc_cmd(f'ip --detail --json route show protocol failover {route}')
-    if rc == 0:
-        data = json.loads(data)
-        if len(data) == 0:
-            print(f'\nRoute {route} for protocol failover was not found')
-            return None, None, None
-        # Fake metric 999 by default
-        # Search route with the lowest metric
-        best_metric = 999
-        for entry in data:
-            if debug: print('\n', entry)
-            metric = entry.get('metric')
-            gateway = entry.get('gateway')
-            iface = entry.get('dev')
-            if metric < best_metric:
-                best_metric = metric
-                best_gateway = gateway
-                best_interface = iface
-        if debug:
-            print(f'### Best_route exists: {route}, best_gateway: {best_gateway}, '
-                  f'best_metric: {best_metric}, best_iface: {best_interface}')
-        return best_gateway, best_interface, best_metric
-
-
-def is_port_open(ip, port):
-    """
-    Check connection to remote host and port
-    Return True if host alive
 
-    % is_port_open('example.com', 8080)
-    True
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+class IcmpProber:
     """
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
-    s.settimeout(2)
-    try:
-        s.connect((ip, int(port)))
-        s.shutdown(socket.SHUT_RDWR)
-        return True
-    except:
-        return False
-    finally:
-        s.close()
-
-
-def is_target_alive(target_list=None,
-                    iface='',
-                    proto='icmp',
-                    port=None,
-                    debug=False,
-                    policy='any-available') -> bool:
-    """Check the availability of each target in the target_list using
-    the specified protocol ICMP, ARP, TCP
-
-    Args:
-        target_list (list): A list of IP addresses or hostnames to check.
-        iface (str): The name of the network interface to use for the check.
-        proto (str): The protocol to use for the check. Options are 'icmp', 'arp', or 'tcp'.
-        port (int): The port number to use for the TCP check. Only applicable if proto is 'tcp'.
-        debug (bool): If True, print debug information during the check.
-        policy (str): The policy to use for the check. Options are 'any-available' or 'all-available'.
-
-    Returns:
-        bool: True if all targets are reachable according to the policy, False otherwise.
-
-    Example:
-        % is_target_alive(['192.0.2.1', '192.0.2.5'], 'eth1', proto='arp', policy='all-available')
-        True
+    Send ICMP echo requests from raw sockets (one per interface) and match
+    replies to the outstanding requests by identifier and sequence number
     """
-    if iface != '':
-        iface = f'-I {iface}'
+    def __init__(self):
+        self._identifier = os.getpid() & 0xffff
+        self._sequence = 0
+        self._sockets = {}
+        self._pending = {}
+
+    def _get_socket(self, iface):
+        if iface in self._sockets:
+            return self._sockets[iface]
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        try:
+            sock.setblocking(False)
+            if iface:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, iface.encode())
+        except OSError:
+            sock.close()
+            raise
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable, sock)
+        self._sockets[iface] = sock
+        return sock
+
+    def _drop_socket(self, iface):
+        # the interface was removed or renamed, a new socket is bound to the
+        # interface of that name on the next probe
+        sock = self._sockets.pop(iface, None)
+        if sock:
+            asyncio.get_running_loop().remove_reader(sock.fileno())
+            sock.close()
+
+    def _on_readable(self, sock):
+        while True:
+            try:
+                packet, (address, _) = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            # Skip IPv4 header
+            header_len = (packet[0] & 0x0f) * 4
+            if len(packet) < header_len + 8:
+                continue
+            icmp_type, _, _, identifier, sequence = struct.unpack(
+                '!BBHHH', packet[header_len:header_len + 8])
+            if icmp_type != ICMP_ECHO_REPLY or identifier != self._identifier:
+                continue
+            future = self._pending.pop((address, sequence), None)
+            if future and not future.done():
+                future.set_result(time.monotonic())
+
+    async def probe(self, target, iface='', timeout=probe_timeout):
+        """ Send one echo request, return RTT in milliseconds or None """
+        try:
+            sock = self._get_socket(iface)
+        except OSError as e:
+            # e.g. the interface does not exist (any longer)
+            if debug:
+                print(f'    [ CHECK-TARGET ]: no socket for interface "{iface}": {e}')
+            return None
+
+        self._sequence = (self._sequence + 1) & 0xffff
+        sequence = self._sequence
+
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self._identifier, sequence)
+        payload = struct.pack('!d', time.monotonic())
+        packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, _checksum(header + payload),
+                             self._identifier, sequence) + payload
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(target, sequence)] = future
+        sent = time.monotonic()
+        try:
+            sock.sendto(packet, (target, 0))
+            received = await asyncio.wait_for(future, timeout)
+            return (received - sent) * 1000
+        except OSError:
+            self._drop_socket(iface)
+            return None
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending.pop((target, sequence), None)
+
+
+async def arp_probe(target, iface=''):
+    """ Check target using arping, return RTT in milliseconds or None """
+    command = ['/usr/bin/arping', '-b', '-c', '2', '-f', '-w', '1', '-i', '1']
+    if iface:
+        command += ['-I', iface]
+    command.append(target)
+
+    sent = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.DEVNULL,
+                                                stderr=asyncio.subprocess.DEVNULL)
+    rc = await proc.wait()
+    if debug:
+        print(f'    [ CHECK-TARGET ]: [{" ".join(command)}] -- return-code [RC: {rc}]')
+    if rc == 0:
+        return (time.monotonic() - sent) * 1000
+    return None
 
-    num_reachable_targets = 0
-    for target in target_list:
-        match proto:
-            case 'icmp':
-                command = f'/usr/bin/ping -q {target} {iface} -n -c 2 -W 1'
-                rc, response = rc_cmd(command)
-                if debug:
-                    print(f'    [ CHECK-TARGET ]: [{command}] -- return-code [RC: {rc}]')
-                if rc == 0:
-                    num_reachable_targets += 1
-                    if policy == 'any-available':
-                        return True
 
+async def tcp_probe(target, port):
+    """ Check connection to remote host and port, return RTT in milliseconds or None """
+    sent = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(target, int(port)),
+                                           tcp_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = (time.monotonic() - sent) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return rtt
+
+
+class TargetStats:
+    """ Probe statistics of a single check target """
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.rtt = None
+        self.rtt_min = None
+        self.rtt_max = None
+        self.rtt_avg = None
+
+    def update(self, rtt):
+        self.sent += 1
+        if rtt is None:
+            return
+        self.received += 1
+        self.rtt = rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        # Exponentially weighted moving average
+        self.rtt_avg = rtt if self.rtt_avg is None else 0.875 * self.rtt_avg + 0.125 * rtt
+
+    def to_dict(self):
+        loss = 100 * (self.sent - self.received) / self.sent if self.sent else 0
+        return {'sent': self.sent, 'received': self.received, 'loss': round(loss, 2),
+                'rtt': self.rtt, 'rtt_min': self.rtt_min, 'rtt_max': self.rtt_max,
+                'rtt_avg': self.rtt_avg}
+
+
+class NextHop:
+    """ Health-check state of one next-hop of a failover route """
+    def __init__(self, route, next_hop, config):
+        check = config.get('check')
+        self.route = route
+        self.next_hop = next_hop
+        self.interface = config.get('interface')
+        self.metric = int(config.get('metric'))
+        self.onlink = 'onlink' in config
+        self.proto = check.get('type')
+        self.port = check.get('port')
+        self.policy = check.get('policy')
+        self.interval = int(check.get('timeout'))
+        self.rise = int(check.get('rise', 1))
+        self.fall = int(check.get('fall', 1))
+        self.targets = {target: TargetStats() for target in check.get('target')}
+        # None until the first check completed
+        self.alive = None
+        self._count = 0
+
+    def __str__(self):
+        onlink = ' onlink' if self.onlink else ''
+        return (f'{self.route} via {self.next_hop} dev {self.interface}{onlink} '
+                f'metric {self.metric} proto failover')
+
+    async def _probe_target(self, target, prober):
+        match self.proto:
+            case 'icmp':
+                for _ in range(probe_count):
+                    rtt = await prober.probe(target, self.interface)
+                    self.targets[target].update(rtt)
+                    if rtt is not None:
+                        break
             case 'arp':
-                command = f'/usr/bin/arping -b -c 2 -f -w 1 -i 1 {iface} {target}'
-                rc, response = rc_cmd(command)
-                if debug:
-                    print(f'    [ CHECK-TARGET ]: [{command}] -- return-code [RC: {rc}]')
-                if rc == 0:
-                    num_reachable_targets += 1
-                    if policy == 'any-available':
-                        return True
-
-            case _ if proto == 'tcp' and port is not None:
-                if is_port_open(target, port):
-                    num_reachable_targets += 1
-                    if policy == 'any-available':
-                        return True
-
+                rtt = await arp_probe(target, self.interface)
+                self.targets[target].update(rtt)
+            case 'tcp' if self.port is not None:
+                rtt = await tcp_probe(target, self.port)
+                self.targets[target].update(rtt)
             case _:
-                return False
-
-        if policy == 'all-available' and num_reachable_targets == len(target_list):
+                rtt = None
+        return rtt is not None
+
+    async def check(self, prober) -> bool:
+        """ Probe all targets concurrently, evaluate result according to policy """
+        results = await asyncio.gather(*[self._probe_target(target, prober)
+                                         for target in self.targets])
+        if self.policy == 'all-available':
+            return all(results)
+        return any(results)
+
+    def update(self, result) -> bool:
+        """ Apply check result with rise/fall hysteresis, return True on state change """
+        if self.alive is None:
+            self.alive = result
             return True
 
-    return False
+        if result == self.alive:
+            self._count = 0
+            return False
+
+        self._count += 1
+        if self._count < (self.rise if result else self.fall):
+            return False
+
+        self._count = 0
+        self.alive = result
+        return True
+
+    def to_dict(self):
+        return {'route': self.route, 'next_hop': self.next_hop,
+                'interface': self.interface, 'metric': self.metric,
+                'state': 'unknown' if self.alive is None else 'up' if self.alive else 'down',
+                'targets': {target: stats.to_dict() for target, stats in self.targets.items()}}
+
+
+class RouteProgrammer:
+    """ Synchronize failover routes with the kernel using one netlink socket """
+    def __init__(self, next_hops):
+        self.next_hops = next_hops
+        self.ipr = IPRoute()
+
+    def _kernel_routes(self):
+        routes = {}
+        for msg in self.ipr.get_routes(family=socket.AF_INET, proto=rt_proto_failover):
+            dst = msg.get_attr('RTA_DST') or '0.0.0.0'
+            key = (f'{dst}/{msg["dst_len"]}', msg.get_attr('RTA_GATEWAY'),
+                   msg.get_attr('RTA_OIF'), msg.get_attr('RTA_PRIORITY') or 0)
+            routes[key] = msg
+        return routes
+
+    def sync(self):
+        """ Add routes of all alive next-hops and remove all others """
+        ifindex = {}
+        wanted = {}
+        for nh in self.next_hops:
+            if nh.interface not in ifindex:
+                index = self.ipr.link_lookup(ifname=nh.interface)
+                ifindex[nh.interface] = index[0] if index else None
+            if nh.alive and ifindex[nh.interface]:
+                route = str(ip_network(nh.route, strict=False))
+                wanted[(route, nh.next_hop, ifindex[nh.interface], nh.metric)] = nh
+
+        present = self._kernel_routes()
+        for key in present.keys() - wanted.keys():
+            route, gateway, oif, metric = key
+            try:
+                self.ipr.route('del', dst=route, gateway=gateway, oif=oif,
+                               priority=metric, proto=rt_proto_failover)
+            except NetlinkError as e:
+                if debug: print(f'    [ DEL ] {route} via {gateway} failed: {e}')
+                continue
+            message = f'ip route del {route} via {gateway} metric {metric} proto failover'
+            if debug: print(f'    [ DEL ] -- {message}')
+            journal.send(message, SYSLOG_IDENTIFIER=my_name)
+
+        for key in wanted.keys() - present.keys():
+            nh = wanted[key]
+            route, gateway, oif, metric = key
+            try:
+                self.ipr.route('add', dst=route, gateway=gateway, oif=oif, priority=metric,
+                               proto=rt_proto_failover, flags=RTNH_F_ONLINK if nh.onlink else 0)
+            except NetlinkError as e:
+                # Example: Error: Next-hop has invalid gateway.
+                if debug: print(f'    [ ADD ] {nh} failed: {e}')
+                continue
+            if debug: print(f'    [ ADD ] -- ip route add {nh}')
+            journal.send(f'ip route add {nh}', SYSLOG_IDENTIFIER=my_name)
+
+
+def write_state(next_hops):
+    state = [nh.to_dict() for nh in next_hops]
+    tmp = state_file.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state, indent=2))
+    tmp.replace(state_file)
+
+
+async def check_next_hop(nh, prober, changed):
+    """ Health-check loop of a single next-hop """
+    while True:
+        started = time.monotonic()
+        result = await nh.check(prober)
+        if nh.update(result):
+            if not nh.alive:
+                targets = ' '.join(nh.targets)
+                port = f' port {nh.port}' if nh.port else ''
+                if debug: print(f'    [ TARGET_FAIL ] target checks fails for [{targets}]')
+                journal.send(f'Check fail for route {nh.route} target {targets} '
+                             f'proto {nh.proto}{port}', SYSLOG_IDENTIFIER=my_name)
+            changed.set()
+        await asyncio.sleep(max(0, nh.interval - (time.monotonic() - started)))
+
+
+async def program_routes(programmer, changed):
+    """ Batch next-hop state changes and program them into the kernel """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await asyncio.wait_for(changed.wait(), sync_interval)
+            # Coalesce state changes of next-hops failing at the same time
+            await asyncio.sleep(batch_window)
+        except asyncio.TimeoutError:
+            pass
+        changed.clear()
+        await loop.run_in_executor(None, programmer.sync)
+        await loop.run_in_executor(None, write_state, programmer.next_hops)
+
+
+async def main(config):
+    next_hops = []
+    for route, route_config in config.get('route').items():
+        for next_hop, nexthop_config in route_config.get('next_hop').items():
+            next_hops.append(NextHop(route, next_hop, nexthop_config))
+
+    prober = IcmpProber()
+    changed = asyncio.Event()
+    programmer = RouteProgrammer(next_hops)
+
+    tasks = [check_next_hop(nh, prober, changed) for nh in next_hops]
+    tasks.append(program_routes(programmer, changed))
+    await asyncio.gather(*tasks)
 
 
 if __name__ == '__main__':
@@ -180,56 +424,5 @@ def is_target_alive(target_list=None,
     # Useful debug info to console, use debug = True
     # sudo systemctl stop vyos-failover.service
     # sudo /usr/libexec/vyos/vyos-failover.py --config /run/vyos-failover.conf
-    debug = False
-
-    while(True):
-
-        for route, route_config in config.get('route').items():
-
-            exists_gateway, exists_iface, exists_metric =  get_best_route_options(route, debug=debug)
-
-            for next_hop, nexthop_config in route_config.get('next_hop').items():
-                conf_iface = nexthop_config.get('interface')
-                conf_metric = int(nexthop_config.get('metric'))
-                port = nexthop_config.get('check').get('port')
-                port_opt = f'port {port}' if port else ''
-                policy = nexthop_config.get('check').get('policy')
-                proto = nexthop_config.get('check').get('type')
-                target = nexthop_config.get('check').get('target')
-                timeout = nexthop_config.get('check').get('timeout')
-                onlink = 'onlink' if 'onlink' in nexthop_config else ''
-
-                # Route not found in the current routing table
-                if not is_route_exists(route, next_hop, conf_iface, conf_metric):
-                    if debug: print(f"    [NEW_ROUTE_DETECTED] route: [{route}]")
-                    # Add route if check-target alive
-                    if is_target_alive(target, conf_iface, proto, port, debug=debug, policy=policy):
-                        if debug: print(f'    [ ADD ] -- ip route add {route} via {next_hop} dev {conf_iface} '
-                                        f'metric {conf_metric} proto failover\n###')
-                        rc, command = rc_cmd(f'ip route add {route} via {next_hop} dev {conf_iface} '
-                                             f'{onlink} metric {conf_metric} proto failover')
-                        # If something is wrong and gateway not added
-                        # Example: Error: Next-hop has invalid gateway.
-                        if rc !=0:
-                            if debug: print(f'{command} -- return-code [RC: {rc}] {next_hop} dev {conf_iface}')
-                        else:
-                            journal.send(f'ip route add {route} via {next_hop} dev {conf_iface} '
-                                         f'{onlink} metric {conf_metric} proto failover', SYSLOG_IDENTIFIER=my_name)
-                    else:
-                        if debug: print(f'    [ TARGET_FAIL ] target checks fails for [{target}], do nothing')
-                        journal.send(f'Check fail for route {route} target {target} proto {proto} '
-                                     f'{port_opt}', SYSLOG_IDENTIFIER=my_name)
-
-                # Route was added, check if the target is alive
-                # We should delete route if check fails only if route exists in the routing table
-                if not is_target_alive(target, conf_iface, proto, port, debug=debug, policy=policy) and \
-                        is_route_exists(route, next_hop, conf_iface, conf_metric):
-                    if debug:
-                        print(f'Nexh_hop {next_hop} fail, target not response')
-                        print(f'    [ DEL ] -- ip route del {route} via {next_hop} dev {conf_iface} '
-                              f'metric {conf_metric} proto failover [DELETE]')
-                    rc_cmd(f'ip route del {route} via {next_hop} dev {conf_iface} metric {conf_metric} proto failover')
-                    journal.send(f'ip route del {route} via {next_hop} dev {conf_iface} '
-                                 f'metric {conf_metric} proto failover', SYSLOG_IDENTIFIER=my_name)
-
-                time.sleep(int(timeout))
+
+    asyncio.run(main(config))
@@ -17,19 +17,26 @@
 #
 
 import os
+import gzip
 import json
 import requests
 import urllib3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Tuple, Dict, Any
 
 from vyos.config import Config
 from vyos.configtree import ConfigTree
-from vyos.configtree import mask_inclusive
+from vyos.config_sync import config_digest
+from vyos.config_sync import delta_commands
+from vyos.config_sync import mask_from_sections
+from vyos.config_sync import masked_config
 from vyos.template import bracketize_ipv6
 
 
 CONFIG_FILE = '/run/config_sync_conf.conf'
+# sections last synchronized to each secondary, for mode 'delta'
+STATE_DIR = '/run/config_sync'
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -40,30 +47,40 @@
 API_HEADERS = {'Content-Type': 'application/json'}
 
 
-def post_request(url: str,
+def post_request(session: requests.Session,
+                 url: str,
                  data: str,
-                 headers: Dict[str, str]) -> requests.Response:
+                 headers: Dict[str, str],
+                 timeout: int,
+                 compress: bool = False) -> requests.Response:
     """Sends a POST request to the specified URL
 
     Args:
+        session (requests.Session): The session (keep-alive connection) to use.
         url (str): The URL to send the POST request to.
         data (Dict[str, Any]): The data to send with the POST request.
         headers (Dict[str, str]): The headers to include with the POST request.
+        timeout (int): The request timeout in seconds.
+        compress (bool): Send the data gzip compressed.
 
     Returns:
         requests.Response: The response object representing the server's response to the request
     """
 
-    response = requests.post(url,
-                             data=data,
-                             headers=headers,
-                             verify=False,
-                             timeout=timeout)
-    return response
+    body = data.encode()
+    if compress:
+        body = gzip.compress(body)
+        headers = {**headers, 'Content-Encoding': 'gzip'}
 
+    response = session.post(url,
+                            data=body,
+                            headers=headers,
+                            verify=False,
+                            timeout=timeout)
+    return response
 
 
-def retrieve_config(sections: List[list[str]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+def retrieve_config(sections: List[list[str]]) -> Tuple[Dict[str, Any], ConfigTree]:
     """Retrieves the configuration from the local server.
 
     Args:
@@ -71,60 +88,52 @@ def retrieve_config(sections: List[list[str]]) -> Tuple[Dict[str, Any], Dict[str
         to retrieve, given as list of paths.
 
     Returns:
-        Tuple[Dict[str, Any],Dict[str,Any]]: The tuple (mask, config) where:
+        Tuple[Dict[str, Any],ConfigTree]: The tuple (mask, config) where:
             - mask: The tree of paths of sections, as a dictionary.
-            - config: The subtree of masked config data, as a dictionary.
+            - config: The subtree of masked config data.
     """
 
-    mask = ConfigTree('')
-    for section in sections:
-        mask.set(section)
+    mask = mask_from_sections(sections)
     mask_dict = json.loads(mask.to_json())
 
     config = Config()
     config_tree = config.get_config_tree()
-    masked = mask_inclusive(config_tree, mask)
-    config_dict = json.loads(masked.to_json())
+    masked = masked_config(config_tree, mask)
+
+    return mask_dict, masked
 
-    return mask_dict, config_dict
 
 def set_remote_config(
-        address: str,
-        key: str,
+        session: requests.Session,
+        secondary: Dict[str, Any],
         op: str,
         mask: Dict[str, Any],
-        config: Dict[str, Any],
-        port: int) -> Optional[Dict[str, Any]]:
+        config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Loads the VyOS configuration in JSON format to a remote host.
 
     Args:
-        address (str): The address of the remote host.
-        key (str): The key to use for loading the configuration.
+        session (requests.Session): The session to the remote host.
+        secondary (dict): The address, key, port and timeout of the remote host.
         op (str): The operation to perform (set or load).
         mask (dict): The dict of paths in sections.
         config (dict): The dict of masked config data.
-        port (int): The remote API port
 
     Returns:
         Optional[Dict[str, Any]]: The response from the remote host as a
         dictionary, or None if a RequestException occurred.
     """
 
-    headers = {'Content-Type': 'application/json'}
-
-    # Disable the InsecureRequestWarning
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-    url = f'https://{address}:{port}/configure-section'
+    url = f"https://{secondary['address']}:{secondary['port']}/configure-section"
     data = json.dumps({
         'op': op,
         'mask': mask,
         'config': config,
-        'key': key
+        'key': secondary['key']
     })
 
     try:
-        config = post_request(url, data, headers)
+        config = post_request(session, url, data, API_HEADERS,
+                              secondary['timeout'])
         return config.json()
     except requests.exceptions.RequestException as e:
         print(f"An error occurred: {e}")
@@ -132,39 +141,184 @@ def set_remote_config(
         return None
 
 
+def state_file(address: str) -> str:
+    return os.path.join(STATE_DIR, address.strip('[]'))
+
+
+def save_state(address: str, digest: str, config: str):
+    try:
+        with open(state_file(address), 'w') as f:
+            json.dump({'digest': digest, 'config': config}, f)
+    except OSError as e:
+        logger.warning(f"Cannot save sync state of '{address}': {e}")
+
+
+def drop_state(address: str):
+    try:
+        os.unlink(state_file(address))
+    except FileNotFoundError:
+        pass
+
+
+def prepare_delta(address: str,
+                  config: ConfigTree,
+                  digest: str) -> Optional[Dict[str, Any]]:
+    """Compute the delta from the sections last synchronized to the
+    secondary to the current ones.
+
+    Args:
+        address (str): The address of the remote host.
+        config (ConfigTree): The masked config data.
+        digest (str): The digest of config.
+
+    Returns:
+        Optional[Dict[str, Any]]: The base and target digest and the
+        commands, or None if the last synchronized sections are unknown.
+    """
+
+    try:
+        with open(state_file(address)) as f:
+            state = json.load(f)
+        base = state['digest']
+        synced = ConfigTree(state['config'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+    commands = [] if base == digest else delta_commands(synced, config)
+    return {'base': base, 'target': digest, 'commands': commands}
+
+
+def set_remote_delta(
+        session: requests.Session,
+        secondary: Dict[str, Any],
+        mask: Dict[str, Any],
+        delta: Optional[Dict[str, Any]]) -> bool:
+    """Sends the delta to the secondary, which applies it only if its
+    sections match the base digest.
+
+    Args:
+        session (requests.Session): The session to the remote host.
+        secondary (dict): The address, key, port and timeout of the remote host.
+        mask (dict): The dict of paths in sections.
+        delta (dict): The delta, as returned by prepare_delta.
+
+    Returns:
+        bool: True if the secondary applied the delta; False if a full
+        resync is required.
+    """
+
+    address = secondary['address']
+    if delta is None:
+        logger.info(f"No sync state for '{address}', full resync required")
+        return False
+    if delta['base'] == delta['target']:
+        return True
+
+    url = f"https://{address}:{secondary['port']}/config-sync"
+    data = json.dumps({
+        'op': 'delta',
+        'mask': mask,
+        **delta,
+        'key': secondary['key']
+    })
+
+    try:
+        # the key is also sent as header, the API checks it before it
+        # decompresses the request
+        headers = {**API_HEADERS, 'X-API-Key': secondary['key']}
+        response = post_request(session, url, data, headers,
+                                secondary['timeout'], compress=True)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"An error occurred: {e}")
+        return False
+
+    if response.status_code == 409:
+        logger.warning(f"Config drift on '{address}', full resync required")
+        return False
+    if response.status_code != 200:
+        logger.error(f"Delta sync to '{address}' failed: {response.text}")
+        return False
+
+    return True
+
+
+def sync_secondary(secondary: Dict[str, Any],
+                   mode: str,
+                   mask: Dict[str, Any],
+                   config: Dict[str, Any],
+                   state: Tuple[str, str],
+                   delta: Optional[Dict[str, Any]]):
+    """Synchronize the sections to one secondary over a single keep-alive
+    connection
+
+    Only the HTTP requests run here, in parallel for all secondaries; the
+    config trees are processed beforehand, as libvyosconfig must not be
+    called from several threads.
+    """
+
+    # Disable the InsecureRequestWarning
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    address = secondary['address']
+    with requests.Session() as session:
+        if mode == 'delta':
+            if set_remote_delta(session, secondary, mask, delta):
+                save_state(address, *state)
+                return
+            # keep no state unless the full resync succeeds
+            drop_state(address)
+
+        op = 'load' if mode == 'delta' else mode
+        res = set_remote_config(session, secondary, op, mask, config)
+        logger.debug(f"Set config for '{address}': {res}")
+        if mode == 'delta' and res and res.get('success'):
+            save_state(address, *state)
+
+
 def is_section_revised(section: List[str]) -> bool:
     from vyos.config_mgmt import is_node_revised
     return is_node_revised(section)
 
 
-def config_sync(secondary_address: str,
-                secondary_key: str,
+def config_sync(secondaries: List[Dict[str, Any]],
                 sections: List[list[str]],
-                mode: str,
-                secondary_port: int):
+                mode: str):
     """Retrieve a config section from primary router in JSON format and send it to
-       secondary router
+       the secondary routers, in parallel
     """
     if not any(map(is_section_revised, sections)):
         return
 
+    addresses = ', '.join(s['address'] for s in secondaries)
     logger.info(
-        f"Config synchronization: Mode={mode}, Secondary={secondary_address}"
+        f"Config synchronization: Mode={mode}, Secondary={addresses}"
     )
 
     # Sync sections ("nat", "firewall", etc)
-    mask_dict, config_dict = retrieve_config(sections)
+    mask_dict, config = retrieve_config(sections)
+    config_dict = json.loads(config.to_json())
     logger.debug(
         f"Retrieved config for sections '{sections}': {config_dict}")
 
-    set_config = set_remote_config(address=secondary_address,
-                                   key=secondary_key,
-                                   op=mode,
-                                   mask=mask_dict,
-                                   config=config_dict,
-                                   port=secondary_port)
-
-    logger.debug(f"Set config for sections '{sections}': {set_config}")
+    state = (config_digest(config), config.to_string())
+    deltas = {}
+    if mode == 'delta':
+        for secondary in secondaries:
+            address = secondary['address']
+            deltas[address] = prepare_delta(address, config, state[0])
+
+    with ThreadPoolExecutor(max_workers=len(secondaries)) as executor:
+        futures = {}
+        for secondary in secondaries:
+            address = secondary['address']
+            futures[address] = executor.submit(sync_secondary, secondary, mode,
+                                               mask_dict, config_dict, state,
+                                               deltas.get(address))
+        for address, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Config synchronization to '{address}' failed: {e}")
 
 
 if __name__ == '__main__':
@@ -179,17 +333,24 @@ def config_sync(secondary_address: str,
     config = json.loads(config_data)
 
     mode = config.get('mode')
-    secondary_address = config.get('secondary', {}).get('address')
-    secondary_address = bracketize_ipv6(secondary_address)
-    secondary_key = config.get('secondary', {}).get('key')
-    secondary_port = int(config.get('secondary', {}).get('port', 443))
+    secondary = config.get('secondary', {})
+    addresses = secondary.get('address')
+    if isinstance(addresses, str):
+        addresses = [addresses]
+    secondary_key = secondary.get('key')
+    secondary_port = int(secondary.get('port', 443))
     sections = config.get('section')
-    timeout = int(config.get('secondary', {}).get('timeout'))
+    timeout = int(secondary.get('timeout'))
 
-    if not all([mode, secondary_address, secondary_key, sections]):
+    if not all([mode, addresses, secondary_key, sections]):
         logger.error("Missing required configuration data for config synchronization.")
         exit(0)
 
+    secondaries = [{'address': bracketize_ipv6(address),
+                    'key': secondary_key,
+                    'port': secondary_port,
+                    'timeout': timeout} for address in addresses]
+
     # Generate list_sections of sections/subsections
     # [
     #   ['interfaces', 'pseudo-ethernet'], ['interfaces', 'virtual-ethernet'], ['nat'], ['nat66']
@@ -202,4 +363,4 @@ def config_sync(secondary_address: str,
         else:
             list_sections.append([section])
 
-    config_sync(secondary_address, secondary_key, list_sections, mode, secondary_port)
+    config_sync(secondaries, list_sections, mode)
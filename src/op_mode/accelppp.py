@@ -15,13 +15,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import re
+import socket
 import sys
+import typing
 
 import vyos.accel_ppp
 import vyos.opmode
 
 from vyos.configquery import ConfigTreeQuery
-from vyos.utils.process import rc_cmd
 
 
 accel_dict = {
@@ -74,14 +76,47 @@ def _get_raw_statistics(accel_output, pattern, protocol):
     }
 
 
-def _get_raw_sessions(port):
-    cmd_options = 'show sessions ifname,username,ip,ip6,ip6-dp,type,rate-limit,' \
-                  'state,uptime-raw,calling-sid,called-sid,sid,comp,rx-bytes-raw,' \
-                  'tx-bytes-raw,rx-pkts,tx-pkts'
-    output = vyos.accel_ppp.accel_cmd(port, cmd_options)
-    parsed_data: list[dict[str, str]] = vyos.accel_ppp.accel_out_parse(
-        output.splitlines())
-    return parsed_data
+raw_columns = ['ifname', 'username', 'ip', 'ip6', 'ip6-dp', 'type', 'rate-limit',
+               'state', 'uptime-raw', 'calling-sid', 'called-sid', 'sid', 'comp',
+               'rx-bytes-raw', 'tx-bytes-raw', 'rx-pkts', 'tx-pkts']
+text_columns = ['ifname', 'username', 'ip', 'ip6', 'ip6-dp', 'calling-sid',
+                'rate-limit', 'state', 'uptime', 'rx-bytes', 'tx-bytes']
+# the raw column holding the numeric value of a column
+raw_column = {'uptime': 'uptime-raw', 'rx-bytes': 'rx-bytes-raw',
+              'tx-bytes': 'tx-bytes-raw'}
+numeric_columns = ['uptime-raw', 'rx-bytes-raw', 'tx-bytes-raw', 'rx-pkts', 'tx-pkts']
+
+ArgSort = typing.Literal['ifname', 'username', 'ip', 'calling-sid', 'state',
+                         'uptime', 'rx-bytes', 'tx-bytes']
+
+
+def _session_sort_key(column):
+    if column in numeric_columns:
+        return lambda session: int(session.get(column) or 0)
+    if column == 'ip':
+        def ip_key(session):
+            try:
+                return socket.inet_pton(socket.AF_INET, session.get('ip'))
+            except (OSError, TypeError):
+                return b'\xff' * 5
+        return ip_key
+    return lambda session: session.get(column, '')
+
+
+def _get_match(username):
+    # the regexp is matched by accel-ppp
+    return ('username', f'^{re.escape(username)}$') if username else None
+
+
+def _get_raw_sessions(port, sort=None, username=None):
+    # sessions are converted as they are read from the CLI connection
+    records = vyos.accel_ppp.accel_iter_sessions(port, raw_columns,
+                                                 match=_get_match(username))
+    sessions = [dict(zip(raw_columns, record)) for record in records]
+    if sort:
+        column = raw_column.get(sort, sort)
+        sessions.sort(key=_session_sort_key(column))
+    return sessions
 
 
 def _verify(func):
@@ -122,7 +157,10 @@ def show_statistics(raw: bool, protocol: str):
     """
     pattern = f'{protocol}:'
     port = accel_dict[protocol]['port']
-    rc, output = rc_cmd(f'/usr/bin/accel-cmd -p {port} show stat')
+    try:
+        output = vyos.accel_ppp.accel_cmd(port, 'show stat')
+    except OSError as e:
+        raise vyos.opmode.DataUnavailable(f'{protocol} server is not running: {e}')
 
     if raw:
         return _get_raw_statistics(output, pattern, protocol)
@@ -131,18 +169,26 @@ def show_statistics(raw: bool, protocol: str):
 
 
 @_verify
-def show_sessions(raw: bool, protocol: str):
+def show_sessions(raw: bool, protocol: str,
+                  sort: typing.Optional[ArgSort] = None,
+                  username: typing.Optional[str] = None):
     """show accel-cmd sessions
 
     protocol: ipoe/pppoe/ppptp/l2tp/sstp
+    sort: column to sort the sessions by
+    username: show only the sessions of this user
     """
     port = accel_dict[protocol]['port']
-    if raw:
-        return _get_raw_sessions(port)
-
-    return vyos.accel_ppp.accel_cmd(port,
-                                    'show sessions ifname,username,ip,ip6,ip6-dp,'
-                                    'calling-sid,rate-limit,state,uptime,rx-bytes,tx-bytes')
+    try:
+        if raw:
+            return _get_raw_sessions(port, sort=sort, username=username)
+
+        command = vyos.accel_ppp.accel_sessions_command(text_columns,
+                                                        match=_get_match(username),
+                                                        order=sort)
+        return vyos.accel_ppp.accel_cmd(port, command)
+    except OSError as e:
+        raise vyos.opmode.DataUnavailable(f'{protocol} server is not running: {e}')
 
 
 if __name__ == '__main__':
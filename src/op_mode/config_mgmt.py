@@ -19,6 +19,7 @@
 
 import vyos.opmode
 from vyos.config_mgmt import ConfigMgmt
+from vyos.config_mgmt import ConfigMgmtError
 
 def show_commit_diff(raw: bool, rev: int, rev2: typing.Optional[int],
                      commands: bool):
@@ -62,6 +63,22 @@ def show_commit_log(raw: bool):
 
     return out
 
+def show_commit_history(raw: bool, path: typing.Optional[str]):
+    config_mgmt = ConfigMgmt()
+
+    path = path.split() if path else []
+    try:
+        data = config_mgmt.get_raw_history_data(path)
+    except ConfigMgmtError as e:
+        raise vyos.opmode.DataUnavailable(str(e))
+    if raw:
+        return data
+
+    if not data:
+        return f"No commits changing '{' '.join(path)}' found"
+
+    return config_mgmt.format_history_data(data)
+
 def show_commit_log_brief(raw: bool):
     # used internally for completion help for 'rollback'
     # option 'raw' will return same as 'show_commit_log'
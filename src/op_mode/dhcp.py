@@ -18,9 +18,13 @@
 import sys
 import typing
 
+from collections import Counter
 from datetime import datetime
 from glob import glob
 from ipaddress import ip_address
+from socket import AF_INET
+from socket import AF_INET6
+from socket import inet_pton
 from tabulate import tabulate
 
 import vyos.opmode
@@ -29,8 +33,9 @@
 from vyos.configquery import ConfigTreeQuery
 
 from vyos.kea import kea_get_active_config
-from vyos.kea import kea_get_leases
-from vyos.kea import kea_get_pool_from_subnet_id
+from vyos.kea import kea_get_lease
+from vyos.kea import kea_iter_leases
+from vyos.kea import kea_get_pool_map
 from vyos.kea import kea_delete_lease
 from vyos.utils.process import is_systemd_service_running
 from vyos.utils.process import call
@@ -43,6 +48,8 @@
 sort_valid_inet6 = ['end', 'duid', 'ip', 'last_communication', 'pool', 'remaining', 'state', 'type']
 mapping_sort_valid = ['mac', 'ip', 'pool', 'duid']
 
+lease_state_long = {0: 'active', 1: 'rejected', 2: 'expired'}
+
 ArgFamily = typing.Literal['inet', 'inet6']
 ArgState = typing.Literal['all', 'active', 'free', 'expired', 'released', 'abandoned', 'reset', 'backup']
 ArgOrigin = typing.Literal['local', 'remote']
@@ -62,16 +69,28 @@ def _format_hex_string(in_str):
     return out_str
 
 
-def _find_list_of_dict_index(lst, key='ip', value='') -> int:
-    """
-    Find the index entry of list of dict matching the dict value
-    Exampe:
-        % lst = [{'ip': '192.0.2.1'}, {'ip': '192.0.2.2'}]
-        % _find_list_of_dict_index(lst, key='ip', value='192.0.2.2')
-        % 1
-    """
-    idx = next((index for (index, d) in enumerate(lst) if d[key] == value), None)
-    return idx
+def _iter_server_leases(inet):
+    try:
+        yield from kea_iter_leases(inet)
+    except (OSError, ValueError):
+        raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server lease information')
+
+
+def _ip_sort_key(lease):
+    # packed addresses compare like their integer values; delegated
+    # prefixes sort by their address
+    ip, _, prefix_len = lease['ip'].partition('/')
+    family = AF_INET6 if ':' in ip else AF_INET
+    return (family == AF_INET6, inet_pton(family, ip), int(prefix_len or 0))
+
+
+def _lease_sort_key(sorted):
+    if sorted == 'ip':
+        return _ip_sort_key
+    if sorted in ('end', 'remaining'):
+        # leases without expiry last
+        return lambda x: (x['end'] is None, x['end'] or 0)
+    return lambda x: (x[sorted] is None, x[sorted] or '')
 
 
 def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], origin=None) -> list:
@@ -80,44 +99,53 @@ def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], orig
     :return list
     """
     inet_suffix = '6' if family == 'inet6' else '4'
-    try:
-        leases = kea_get_leases(inet_suffix)
-    except:
-        raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server lease information')
+    leases = _iter_server_leases(inet_suffix)
 
     if pool is None:
         pool = _get_dhcp_pools(family=family)
     else:
         pool = [pool]
+    pool = set(pool)
 
     try:
         active_config = kea_get_active_config(inet_suffix)
     except:
         raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server configuration')
 
-    data = []
+    pool_map = kea_get_pool_map(active_config, inet_suffix) if active_config else None
+    now = datetime.utcnow()
+
+    # keyed by address: of duplicate leases, the last one is kept
+    data = {}
     for lease in leases:
+        lease_state = lease_state_long[lease['state']]
+        if state and state != 'all' and lease_state not in state:
+            continue
+
+        lease_pool = pool_map.get(lease['subnet-id']) if pool_map is not None else '-'
+        if lease_pool not in pool:
+            continue
+
         lifetime = lease['valid-lft']
         expiry = (lease['cltt'] + lifetime)
 
-        lease['start_timestamp'] = datetime.utcfromtimestamp(expiry - lifetime)
-        lease['expire_timestamp'] = datetime.utcfromtimestamp(expiry) if expiry else None
+        start_timestamp = datetime.utcfromtimestamp(expiry - lifetime)
+        expire_timestamp = datetime.utcfromtimestamp(expiry) if expiry else None
 
         data_lease = {}
         data_lease['ip'] = lease['ip-address']
-        lease_state_long = {0: 'active', 1: 'rejected', 2: 'expired'}
-        data_lease['state'] = lease_state_long[lease['state']]
-        data_lease['pool'] = kea_get_pool_from_subnet_id(active_config, inet_suffix, lease['subnet-id']) if active_config else '-'
-        data_lease['end'] = lease['expire_timestamp'].timestamp() if lease['expire_timestamp'] else None
+        data_lease['state'] = lease_state
+        data_lease['pool'] = lease_pool
+        data_lease['end'] = expire_timestamp.timestamp() if expire_timestamp else None
         data_lease['origin'] = 'local' # TODO: Determine remote in HA
 
         if family == 'inet':
             data_lease['mac'] = lease['hw-address']
-            data_lease['start'] = lease['start_timestamp'].timestamp()
+            data_lease['start'] = start_timestamp.timestamp()
             data_lease['hostname'] = lease['hostname']
 
         if family == 'inet6':
-            data_lease['last_communication'] = lease['start_timestamp'].timestamp()
+            data_lease['last_communication'] = start_timestamp.timestamp()
             data_lease['duid'] = _format_hex_string(lease['duid'])
             data_lease['type'] = lease['type']
 
@@ -127,34 +155,20 @@ def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], orig
 
         data_lease['remaining'] = '-'
 
-        if lease['valid-lft'] > 0:
-            data_lease['remaining'] = lease['expire_timestamp'] - datetime.utcnow()
+        if lifetime > 0:
+            data_lease['remaining'] = expire_timestamp - now
 
             if data_lease['remaining'].days >= 0:
                 # substraction gives us a timedelta object which can't be formatted with strftime
                 # so we use str(), split gets rid of the microseconds
                 data_lease['remaining'] = str(data_lease["remaining"]).split('.')[0]
 
-        # Do not add old leases
-        if data_lease['remaining'] != '' and data_lease['pool'] in pool and data_lease['state'] != 'free':
-            if not state or state == 'all' or data_lease['state'] in state:
-                data.append(data_lease)
-
-        # deduplicate
-        checked = []
-        for entry in data:
-            addr = entry.get('ip')
-            if addr not in checked:
-                checked.append(addr)
-            else:
-                idx = _find_list_of_dict_index(data, key='ip', value=addr)
-                data.pop(idx)
+        data.pop(data_lease['ip'], None)
+        data[data_lease['ip']] = data_lease
 
+    data = list(data.values())
     if sorted:
-        if sorted == 'ip':
-            data.sort(key = lambda x:ip_address(x['ip']))
-        else:
-            data.sort(key = lambda x:x[sorted])
+        data.sort(key=_lease_sort_key(sorted))
     return data
 
 
@@ -225,6 +239,9 @@ def _get_pool_size(pool, family='inet'):
 
 
 def _get_raw_pool_statistics(family='inet', pool=None):
+    # count the leases of all pools at once
+    leases = Counter(l['pool'] for l in _get_raw_server_leases(family=family, pool=pool))
+
     if pool is None:
         pool = _get_dhcp_pools(family=family)
     else:
@@ -235,10 +252,9 @@ def _get_raw_pool_statistics(family='inet', pool=None):
     for p in pool:
         subnet = config.list_nodes(f'service dhcp{v}-server shared-network-name {p} subnet')
         size = _get_pool_size(family=family, pool=p)
-        leases = len(_get_raw_server_leases(family=family, pool=p))
-        use_percentage = round(leases / size * 100) if size != 0 else 0
-        pool_stats = {'pool': p, 'size': size, 'leases': leases,
-                      'available': (size - leases), 'use_percentage': use_percentage, 'subnet': subnet}
+        use_percentage = round(leases[p] / size * 100) if size != 0 else 0
+        pool_stats = {'pool': p, 'size': size, 'leases': leases[p],
+                      'available': (size - leases[p]), 'use_percentage': use_percentage, 'subnet': subnet}
         stats.append(pool_stats)
     return stats
 
@@ -388,11 +404,7 @@ def show_server_static_mappings(raw: bool, family: ArgFamily, pool: typing.Optio
         return _get_formatted_server_static_mappings(static_mappings, family=family)
 
 def _lease_valid(inet, address):
-    leases = kea_get_leases(inet)
-    for lease in leases:
-        if address == lease['ip-address']:
-            return True
-    return False
+    return kea_get_lease(inet, address) is not None
 
 @_verify
 def clear_dhcp_server_lease(family: ArgFamily, address: str):
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import sys
+
+from tabulate import tabulate
+
+import vyos.opmode
+from vyos.utils.process import is_systemd_service_active
+
+state_file = '/run/vyos-failover.state'
+
+def _get_raw_data():
+    if not is_systemd_service_active('vyos-failover.service'):
+        raise vyos.opmode.UnconfiguredSubsystem('Failover routes are not configured')
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        raise vyos.opmode.DataUnavailable('Failover state is not available yet')
+
+def _format_rtt(value):
+    return f'{value:.2f}' if value is not None else '-'
+
+def _get_formatted_output(data):
+    headers = ['Route', 'Next-hop', 'Interface', 'Metric', 'State', 'Target',
+               'Loss %', 'RTT ms', 'Avg ms']
+    entries = []
+    for next_hop in data:
+        for target, stats in next_hop['targets'].items():
+            entries.append([next_hop['route'], next_hop['next_hop'],
+                            next_hop['interface'], next_hop['metric'],
+                            next_hop['state'], target, stats['loss'],
+                            _format_rtt(stats['rtt']), _format_rtt(stats['rtt_avg'])])
+    return tabulate(entries, headers, numalign='left')
+
+def show(raw: bool):
+    data = _get_raw_data()
+    if raw:
+        return data
+    return _get_formatted_output(data)
+
+if __name__ == '__main__':
+    try:
+        res = vyos.opmode.run(sys.modules[__name__])
+        if res:
+            print(res)
+    except (ValueError, vyos.opmode.Error) as e:
+        print(e)
+        sys.exit(1)
@@ -21,7 +21,6 @@
 from re import split as re_split
 from tabulate import tabulate
 
-from vyos.utils.convert import convert_data
 from vyos.utils.convert import seconds_to_human
 from vyos.utils.process import cmd
 from vyos.configquery import ConfigTreeQuery
@@ -39,15 +38,49 @@ def _alphanum_key(key):
     return [_convert(c) for c in re_split('([0-9]+)', str(key))]
 
 
-def _get_raw_data_sas():
+def _get_vici_snapshot(cached: bool = False) -> vyos.ipsec.ViciSnapshot:
+    """
+    Open the VICI session shared by all lookups of one op-mode request.
+    With cached, the SA state of vyos-ipsec-state is used if it is running;
+    it has no traffic counters.
+    """
+    if cached:
+        state = vyos.ipsec.get_ipsec_state()
+        if state is not None:
+            return vyos.ipsec.ViciSnapshot(state=state)
     try:
-        get_sas = vyos.ipsec.get_vici_sas()
-        sas = convert_data(get_sas)
-        return sas
+        return vyos.ipsec.ViciSnapshot()
     except vyos.ipsec.ViciInitiateError as err:
         raise vyos.opmode.UnconfiguredSubsystem(err)
 
 
+def _get_raw_data_sas(snapshot: typing.Optional[vyos.ipsec.ViciSnapshot] = None):
+    if snapshot is None:
+        snapshot = _get_vici_snapshot()
+    return snapshot.sas
+
+
+def _split_swanctl_sas(swanctl_output: str) -> dict:
+    """
+    Split the output of 'swanctl --list-sas' into the blocks of the
+    IKE SAs, keyed by their unique id
+    :param swanctl_output: output of 'swanctl --list-sas'
+    :type swanctl_output: str
+    :return: IKE SA unique id to its output block
+    :rtype: dict
+    """
+    blocks = {}
+    lines = None
+    for line in swanctl_output.splitlines():
+        # IKE SA blocks start unindented: 'peer: #12, ESTABLISHED, IKEv2, ...'
+        match = re.match(r'^\S.*?: #(\d+),', line)
+        if match:
+            lines = blocks.setdefault(match.group(1), [])
+        if lines is not None:
+            lines.append(line)
+    return {uniqueid: '\n'.join(lines) for uniqueid, lines in blocks.items()}
+
+
 def _get_output_swanctl_sas_from_list(ra_output_list: list) -> str:
     """
     Template for output for VICI
@@ -57,10 +90,14 @@ def _get_output_swanctl_sas_from_list(ra_output_list: list) -> str:
     :return: formatted string
     :rtype: str
     """
+    if not ra_output_list:
+        return ''
+    # one swanctl call for all SAs instead of one per SA
+    blocks = _split_swanctl_sas(cmd('sudo swanctl --list-sas'))
     output = ''
     for sa_val in ra_output_list:
         for sa in sa_val.values():
-            swanctl_output: str = cmd(f'sudo swanctl -l --ike-id {sa["uniqueid"]}')
+            swanctl_output: str = blocks.get(str(sa['uniqueid']), '')
         output = f'{output}{swanctl_output}\n\n'
     return output
 
@@ -161,15 +198,6 @@ def _get_formatted_output_sas(sas):
 # Connections block
 
 
-def _get_convert_data_connections():
-    try:
-        get_connections = vyos.ipsec.get_vici_connections()
-        connections = convert_data(get_connections)
-        return connections
-    except vyos.ipsec.ViciInitiateError as err:
-        raise vyos.opmode.UnconfiguredSubsystem(err)
-
-
 def _get_parent_sa_proposal(connection_name: str, data: list) -> dict:
     """Get parent SA proposals by connection name
     if connections not in the 'down' state
@@ -304,20 +332,21 @@ def _get_child_sa_proposal(child_sa_data: dict) -> dict:
     return {}
 
 
-def _get_raw_data_connections(list_connections: list, list_sas: list) -> list:
+def _get_raw_data_connections(snapshot: vyos.ipsec.ViciSnapshot) -> list:
     """Get configured VPN IKE connections and IPsec states
 
     Args:
-        list_connections (list): List of configured connections from vici
-        list_sas (list): List of current SAs from vici
+        snapshot (ViciSnapshot): Configured connections and current SAs from vici
 
     Returns:
         list: List and status of IKE/IPsec connections/tunnels
     """
     base_dict = []
-    for connections in list_connections:
+    for connections in snapshot.connections:
         base_list = {}
         for connection, conn_conf in connections.items():
+            # only the SAs of this connection are looked at below
+            list_sas = snapshot.ike_sas(connection)
             base_list['ike_connection_name'] = connection
             base_list['ike_connection_state'] = _get_parent_sa_state(
                 connection, list_sas
@@ -353,10 +382,10 @@ def _get_raw_data_connections(list_connections: list, list_sas: list) -> list:
     return base_dict
 
 
-def _get_raw_connections_summary(list_conn, list_sas):
+def _get_raw_connections_summary(snapshot: vyos.ipsec.ViciSnapshot):
     import jmespath
 
-    data = _get_raw_data_connections(list_conn, list_sas)
+    data = _get_raw_data_connections(snapshot)
     match = '[*].children[]'
     child = jmespath.search(match, data)
     tunnels_down = len([k for k in child if k['state'] == 'down'])
@@ -450,23 +479,6 @@ def _get_formatted_output_conections(data):
 # Connections block end
 
 
-def _get_childsa_id_list(ike_sas: list) -> list:
-    """
-    Generate list of CHILD SA ids based on list of OrderingDict
-    wich is returned by vici
-    :param ike_sas: list of IKE SAs generated by vici
-    :type ike_sas: list
-    :return: list of IKE SAs ids
-    :rtype: list
-    """
-    list_childsa_id: list = []
-    for ike in ike_sas:
-        for ike_sa in ike.values():
-            for child_sa in ike_sa['child-sas'].values():
-                list_childsa_id.append(child_sa['uniqueid'].decode('ascii'))
-    return list_childsa_id
-
-
 def _get_con_childsa_name_list(
     ike_sas: list, filter_dict: typing.Optional[dict] = None
 ) -> list:
@@ -492,11 +504,11 @@ def _get_con_childsa_name_list(
     return list_childsa_name
 
 
-def _get_all_sitetosite_peers_name_list() -> list:
+def _get_all_sitetosite_peers_config() -> dict:
     """
     Return site-to-site peers configuration
-    :return: site-to-site peers configuration
-    :rtype: list
+    :return: site-to-site peers configuration by peer name
+    :rtype: dict
     """
     conf: ConfigTreeQuery = ConfigTreeQuery()
     config_path = ['vpn', 'ipsec', 'site-to-site', 'peer']
@@ -506,10 +518,16 @@ def _get_all_sitetosite_peers_name_list() -> list:
         get_first_key=True,
         no_tag_node_value_mangle=True,
     )
-    peers_list: list = []
-    for name in peers_config:
-        peers_list.append(name)
-    return peers_list
+    return peers_config
+
+
+def _get_all_sitetosite_peers_name_list() -> list:
+    """
+    Return site-to-site peers names
+    :return: site-to-site peers names
+    :rtype: list
+    """
+    return list(_get_all_sitetosite_peers_config())
 
 
 def _get_tunnel_sw_format(peer: str, tunnel: str) -> str:
@@ -532,11 +550,13 @@ def _get_tunnel_sw_format(peer: str, tunnel: str) -> str:
 
 
 def _initiate_peer_with_childsas(
-    peer: str, tunnel: typing.Optional[str] = None
+    snapshot: vyos.ipsec.ViciSnapshot, peer: str, tunnel: typing.Optional[str] = None
 ) -> None:
     """
     Initiate IPSEC peer SAs by vici.
     If tunnel is None it initiates all peers tunnels
+    :param snapshot: VICI snapshot of the request
+    :type snapshot: ViciSnapshot
     :param peer: Peer name (IKE_SA)
     :type peer: str
     :param tunnel: tunnel number (CHILD_SA)
@@ -544,7 +564,7 @@ def _initiate_peer_with_childsas(
     """
     tunnel_sw = _get_tunnel_sw_format(peer, tunnel)
     try:
-        con_list: list = vyos.ipsec.get_vici_connection_by_name(peer)
+        con_list: list = snapshot.connection(peer)
         if not con_list:
             raise vyos.opmode.IncorrectValue(
                 f"Peer's {peer} SA(s) not loaded. Initiation was failed"
@@ -552,12 +572,16 @@ def _initiate_peer_with_childsas(
         childsa_name_list: list = _get_con_childsa_name_list(con_list)
 
         if not tunnel_sw:
-            vyos.ipsec.vici_initiate_all_child_sa_by_ike(peer, childsa_name_list)
+            vyos.ipsec.vici_initiate_all_child_sa_by_ike(
+                peer, childsa_name_list, session=snapshot.session
+            )
             print(f'Peer {peer} initiate result: success')
             return
 
         if tunnel_sw in childsa_name_list:
-            vyos.ipsec.vici_initiate_all_child_sa_by_ike(peer, [tunnel_sw])
+            vyos.ipsec.vici_initiate_all_child_sa_by_ike(
+                peer, [tunnel_sw], session=snapshot.session
+            )
             print(f'Peer {peer} tunnel {tunnel} initiate result: success')
             return
 
@@ -569,10 +593,14 @@ def _initiate_peer_with_childsas(
         raise vyos.opmode.IncorrectValue(err)
 
 
-def _terminate_peer(peer: str, tunnel: typing.Optional[str] = None) -> None:
+def _terminate_peer(
+    snapshot: vyos.ipsec.ViciSnapshot, peer: str, tunnel: typing.Optional[str] = None
+) -> None:
     """
     Terminate IPSEC peer SAs by vici.
     If tunnel is None it terminates all peers tunnels
+    :param snapshot: VICI snapshot of the request
+    :type snapshot: ViciSnapshot
     :param peer: Peer name (IKE_SA)
     :type peer: str
     :param tunnel: tunnel number (CHILD_SA)
@@ -581,19 +609,22 @@ def _terminate_peer(peer: str, tunnel: typing.Optional[str] = None) -> None:
     # Convert tunnel to Strongwan format of CHILD_SA
     tunnel_sw = _get_tunnel_sw_format(peer, tunnel)
     try:
-        sa_list: list = vyos.ipsec.get_vici_sas_by_name(peer, tunnel_sw)
+        sa_list: list = snapshot.ike_sas(peer)
         if sa_list:
             if tunnel:
-                childsa_id_list: list = _get_childsa_id_list(sa_list)
-                if childsa_id_list:
-                    vyos.ipsec.terminate_vici_by_name(peer, tunnel_sw)
+                if snapshot.child_sas(peer, tunnel_sw):
+                    vyos.ipsec.terminate_vici_by_name(
+                        peer, tunnel_sw, session=snapshot.session
+                    )
                     print(f'Peer {peer} tunnel {tunnel} terminate result: success')
                 else:
                     Warning(
                         f'Peer {peer} tunnel {tunnel} SA is not initiated. Nothing to terminate'
                     )
             else:
-                vyos.ipsec.terminate_vici_by_name(peer, tunnel_sw)
+                vyos.ipsec.terminate_vici_by_name(
+                    peer, tunnel_sw, session=snapshot.session
+                )
                 print(f'Peer {peer} terminate result: success')
         else:
             Warning(f"Peer's {peer} SAs are not initiated. Nothing to terminate")
@@ -613,41 +644,124 @@ def reset_peer(peer: str, tunnel: typing.Optional[str] = None) -> None:
     :param tunnel: tunnel number (CHILD_SA)
     :type tunnel: str
     """
-    _terminate_peer(peer, tunnel)
     peer_config = _get_sitetosite_peer_config(peer)
+    _reset_peer(_get_vici_snapshot(), peer, peer_config, tunnel)
+
+
+def _reset_peer(
+    snapshot: vyos.ipsec.ViciSnapshot,
+    peer: str,
+    peer_config: dict,
+    tunnel: typing.Optional[str] = None,
+) -> None:
+    _terminate_peer(snapshot, peer, tunnel)
     # initiate SAs only if 'connection-type=initiate'
     if (
         'connection_type' in peer_config
         and peer_config['connection_type'] == 'initiate'
     ):
-        _initiate_peer_with_childsas(peer, tunnel)
-
-
-def reset_all_peers() -> None:
-    sitetosite_list = _get_all_sitetosite_peers_name_list()
-    if sitetosite_list:
-        for peer_name in sitetosite_list:
-            try:
-                reset_peer(peer_name)
-            except vyos.opmode.IncorrectValue as err:
-                print(err)
-        print('Peers reset result: success')
+        _initiate_peer_with_childsas(snapshot, peer, tunnel)
+
+
+def _get_peer_reset_task(
+    snapshot: vyos.ipsec.ViciSnapshot, peer: str, peer_config: dict
+) -> typing.Callable:
+    """
+    Return the VICI commands resetting all SAs of a peer as a function of
+    the session to use, for vyos.ipsec.vici_run_parallel()
+    :param snapshot: VICI snapshot of the request
+    :type snapshot: ViciSnapshot
+    :param peer: Peer name (IKE_SA)
+    :type peer: str
+    :param peer_config: Peer configuration
+    :type peer_config: dict
+    :return: reset function
+    :rtype: Callable
+    """
+    # all lookups are done upfront, the task only sends commands
+    terminate = bool(snapshot.ike_sas(peer))
+    initiate = peer_config.get('connection_type') == 'initiate'
+    childsa_name_list = _get_con_childsa_name_list(snapshot.connection(peer))
+
+    def task(session) -> str:
+        result = []
+        if terminate:
+            vyos.ipsec.terminate_vici_by_name(peer, None, session=session)
+            result.append('terminated')
+        if initiate:
+            if not childsa_name_list:
+                raise vyos.ipsec.ViciCommandError(
+                    f"Peer's {peer} SA(s) not loaded. Initiation was failed"
+                )
+            vyos.ipsec.vici_initiate_all_child_sa_by_ike(
+                peer, childsa_name_list, session=session
+            )
+            result.append('initiated')
+        return ', '.join(result) if result else 'not initiated, nothing to do'
+
+    return task
+
+
+def _get_formatted_reset_report(report: dict) -> str:
+    data = [
+        [peer, 'success' if success else 'failed', message]
+        for peer, (success, message) in report.items()
+    ]
+    data = sorted(data, key=_alphanum_key)
+    return tabulate(data, ['Peer', 'Result', 'Details'])
+
+
+def reset_all_peers(
+    rate: typing.Optional[int] = None, concurrency: typing.Optional[int] = None
+) -> None:
+    """
+    Reset all site-to-site peers, in parallel over several VICI sessions.
+    :param rate: maximum number of peers reset per second
+    :type rate: int
+    :param concurrency: number of peers reset at the same time
+    :type concurrency: int
+    """
+    sitetosite_config = _get_all_sitetosite_peers_config()
+    if sitetosite_config:
+        snapshot = _get_vici_snapshot()
+        try:
+            tasks = {
+                peer_name: _get_peer_reset_task(snapshot, peer_name, peer_config)
+                for peer_name, peer_config in sitetosite_config.items()
+            }
+        except vyos.ipsec.ViciCommandError as err:
+            raise vyos.opmode.IncorrectValue(err)
+        report = vyos.ipsec.vici_run_parallel(
+            tasks,
+            concurrency=concurrency or vyos.ipsec.vici_concurrency,
+            rate=rate,
+        )
+        print(_get_formatted_reset_report(report))
+        failed = len([r for r in report.values() if not r[0]])
+        if failed:
+            print(f'Peers reset result: {failed} of {len(report)} peers failed')
+        else:
+            print('Peers reset result: success')
     else:
         raise vyos.opmode.UnconfiguredSubsystem(
             'VPN IPSec site-to-site is not configured, aborting'
         )
 
 
-def _get_ra_session_list_by_username(username: typing.Optional[str] = None):
+def _get_ra_session_list_by_username(
+    snapshot: vyos.ipsec.ViciSnapshot, username: typing.Optional[str] = None
+):
     """
     Return list of remote-access IKE_SAs uniqueids
+    :param snapshot: VICI snapshot of the request
+    :type snapshot: ViciSnapshot
     :param username:
     :type username:
     :return:
     :rtype:
     """
     list_sa_id = []
-    sa_list = _get_raw_data_sas()
+    sa_list = _get_raw_data_sas(snapshot)
     for sa_val in sa_list:
         for sa in sa_val.values():
             if 'remote-eap-id' in sa:
@@ -661,12 +775,13 @@ def _get_ra_session_list_by_username(username: typing.Optional[str] = None):
 
 def reset_ra(username: typing.Optional[str] = None):
     # Reset remote-access ipsec sessions
+    snapshot = _get_vici_snapshot()
     if username:
-        list_sa_id = _get_ra_session_list_by_username(username)
+        list_sa_id = _get_ra_session_list_by_username(snapshot, username)
     else:
-        list_sa_id = _get_ra_session_list_by_username()
+        list_sa_id = _get_ra_session_list_by_username(snapshot)
     if list_sa_id:
-        vyos.ipsec.terminate_vici_ikeid_list(list_sa_id)
+        vyos.ipsec.terminate_vici_ikeid_list(list_sa_id, session=snapshot.session)
 
 
 def reset_profile_dst(profile: str, tunnel: str, nbma_dst: str):
@@ -674,7 +789,8 @@ def reset_profile_dst(profile: str, tunnel: str, nbma_dst: str):
         ike_sa_name = f'dmvpn-{profile}-{tunnel}'
         try:
             # Get IKE SAs
-            sa_list = convert_data(vyos.ipsec.get_vici_sas_by_name(ike_sa_name, None))
+            snapshot = _get_vici_snapshot()
+            sa_list = snapshot.ike_sas(ike_sa_name)
             if not sa_list:
                 raise vyos.opmode.IncorrectValue(
                     f'SA(s) for profile {profile} tunnel {tunnel} not found, aborting'
@@ -698,7 +814,8 @@ def reset_profile_dst(profile: str, tunnel: str, nbma_dst: str):
                         for x in sa_nbma_list
                         if ike_sa_name in x
                     ]
-                )
+                ),
+                session=snapshot.session,
             )
             # initiate IKE SAs
             for ike in sa_nbma_list:
@@ -708,6 +825,7 @@ def reset_profile_dst(profile: str, tunnel: str, nbma_dst: str):
                         'dmvpn',
                         ike[ike_sa_name]['local-host'],
                         ike[ike_sa_name]['remote-host'],
+                        session=snapshot.session,
                     )
             print(
                 f'Profile {profile} tunnel {tunnel} remote-host {nbma_dst} reset result: success'
@@ -723,15 +841,16 @@ def reset_profile_all(profile: str, tunnel: str):
         ike_sa_name = f'dmvpn-{profile}-{tunnel}'
         try:
             # Get IKE SAs
-            sa_list: list = convert_data(
-                vyos.ipsec.get_vici_sas_by_name(ike_sa_name, None)
-            )
+            snapshot = _get_vici_snapshot()
+            sa_list: list = snapshot.ike_sas(ike_sa_name)
             if not sa_list:
                 raise vyos.opmode.IncorrectValue(
                     f'SA(s) for profile {profile} tunnel {tunnel} not found, aborting'
                 )
             # terminate IKE SAs
-            vyos.ipsec.terminate_vici_by_name(ike_sa_name, None)
+            vyos.ipsec.terminate_vici_by_name(
+                ike_sa_name, None, session=snapshot.session
+            )
             # initiate IKE SAs
             for ike in sa_list:
                 if ike_sa_name in ike:
@@ -740,6 +859,7 @@ def reset_profile_all(profile: str, tunnel: str):
                         'dmvpn',
                         ike[ike_sa_name]['local-host'],
                         ike[ike_sa_name]['remote-host'],
+                        session=snapshot.session,
                     )
                 print(
                     f'Profile {profile} tunnel {tunnel} remote-host {ike[ike_sa_name]["remote-host"]} reset result: success'
@@ -751,10 +871,13 @@ def reset_profile_all(profile: str, tunnel: str):
             raise vyos.opmode.IncorrectValue(err)
 
 
-def show_sa(raw: bool):
-    sa_data = _get_raw_data_sas()
+def show_sa(raw: bool, cached: bool = False):
+    # with cached, raw data comes from vyos-ipsec-state without querying
+    # charon; it has no traffic counters
     if raw:
-        return sa_data
+        return _get_raw_data_sas(_get_vici_snapshot(cached=cached))
+    # the table shows traffic counters, these come from charon only
+    sa_data = _get_raw_data_sas()
     return _get_formatted_output_sas(sa_data)
 
 
@@ -777,20 +900,18 @@ def show_sa_detail(raw: bool):
 
 
 def show_connections(raw: bool):
-    list_conns = _get_convert_data_connections()
-    list_sas = _get_raw_data_sas()
+    snapshot = _get_vici_snapshot(cached=True)
     if raw:
-        return _get_raw_data_connections(list_conns, list_sas)
+        return _get_raw_data_connections(snapshot)
 
-    connections = _get_raw_data_connections(list_conns, list_sas)
+    connections = _get_raw_data_connections(snapshot)
     return _get_formatted_output_conections(connections)
 
 
 def show_connections_summary(raw: bool):
-    list_conns = _get_convert_data_connections()
-    list_sas = _get_raw_data_sas()
+    snapshot = _get_vici_snapshot(cached=True)
     if raw:
-        return _get_raw_connections_summary(list_conns, list_sas)
+        return _get_raw_connections_summary(snapshot)
 
 
 def _get_ra_sessions(username: typing.Optional[str] = None) -> list:
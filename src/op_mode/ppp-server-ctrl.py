@@ -17,12 +17,10 @@
 import sys
 import argparse
 
+from vyos.accel_ppp import accel_cli_lines
 from vyos.config import Config
-from vyos.utils.process import popen
-from vyos.utils.process import DEVNULL
 
 cmd_dict = {
-    'cmd_base'  : '/usr/bin/accel-cmd -p {} ',
     'vpn_types' : {
         'pppoe' : 2001,
         'pptp'  : 2003,
@@ -58,13 +56,16 @@ def main():
         else:
             ses_pattern = ""
 
-        output, err = popen(cmd_dict['cmd_base'].format(cmd_dict['vpn_types'][args.proto]) + args.action + ses_pattern, stderr=DEVNULL, decode='utf-8')
-        if not err:
-            try:
-                print(f' {output}')
-            except:
-                sys.exit(0)
-        else:
+        port = cmd_dict['vpn_types'][args.proto]
+        try:
+            # print the output as it arrives, there may be many sessions
+            prefix = ' '
+            for line in accel_cli_lines(port, args.action + ses_pattern):
+                print(f'{prefix}{line}')
+                prefix = ''
+        except BrokenPipeError:
+            sys.exit(0)
+        except OSError:
             print("{} server is not running".format(args.proto))
 
     else:
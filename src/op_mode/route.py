@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 #
-# Copyright (C) 2022 VyOS maintainers and contributors
+# Copyright (C) 2022-2024 VyOS maintainers and contributors
 #
 # This program is free software; you can redistribute it and/or modify
 # it under the terms of the GNU General Public License version 2 or later as
@@ -38,13 +38,16 @@
 {% endif %}
 
 {% if vrf %}
-    vrf {{table}}
+    vrf {{vrf}}
 {% endif %}
 
 {% if tag %}
     tag {{tag}}
 {% elif net %}
     {{net}}
+{% if longer_prefixes %}
+    longer-prefixes
+{% endif %}
 {% elif protocol %}
     {{protocol}}
 {% endif %}
@@ -56,8 +59,28 @@
 
 ArgFamily = typing.Literal['inet', 'inet6']
 
+def _route_has_nexthop(route, nexthop):
+    for nh in route.get('nexthops', []):
+        if nexthop in (nh.get('ip'), nh.get('interfaceName')):
+            return True
+    return False
+
+def _get_raw_routes(frr_command: str, depth: int, nexthop: typing.Optional[str],
+                    offset: typing.Optional[int], limit: typing.Optional[int]):
+    """ Stream routes from FRR, apply next-hop filter and pagination without
+    holding the whole routing table in memory """
+    from itertools import islice
+    from vyos.frr import execute_json
+
+    routes = (route for _, route in execute_json(frr_command, depth=depth))
+    if nexthop:
+        routes = (route for route in routes if _route_has_nexthop(route, nexthop))
+
+    start = offset or 0
+    stop = start + limit if limit else None
+    return list(islice(routes, start, stop))
+
 def show_summary(raw: bool, family: ArgFamily, table: typing.Optional[int], vrf: typing.Optional[str]):
-    from vyos.utils.process import cmd
 
     if family == 'inet':
         family_cmd = 'ip'
@@ -80,20 +103,21 @@ def show_summary(raw: bool, family: ArgFamily, table: typing.Optional[int], vrf:
     else:
         vrf_cmd = ""
 
+    frr_command = re.sub(r'\s+', ' ', f'show {family_cmd} route {vrf_cmd} summary {table_cmd}').strip()
     if raw:
-        from json import loads
-
-        output = cmd(f"vtysh -c 'show {family_cmd} route {vrf_cmd} summary {table_cmd} json'").strip()
-
-        # If there are no routes in a table, its "JSON" output is an empty string,
-        # as of FRR 8.4.1
-        if output:
-            return loads(output)
-        else:
-            return {}
+        from vyos.frr import execute_json
+
+        # The summary is small, but is read through the same vtysh reader as
+        # the routes. If there are no routes in a table, its "JSON" output is
+        # an empty string, as of FRR 8.4.1. The reader is consumed completely,
+        # so a failing vtysh (e.g. unknown VRF) still raises
+        summary = {}
+        for _, summary in execute_json(f'{frr_command} json', depth=0):
+            pass
+        return summary
     else:
-        output = cmd(f"vtysh -c 'show {family_cmd} route {vrf_cmd} summary {table_cmd}'")
-        return output
+        from vyos.utils.process import cmd
+        return cmd(f"vtysh -c '{frr_command}'")
 
 def show(raw: bool,
          family: ArgFamily,
@@ -101,9 +125,19 @@ def show(raw: bool,
          table: typing.Optional[int],
          protocol: typing.Optional[str],
          vrf: typing.Optional[str],
-         tag: typing.Optional[str]):
+         tag: typing.Optional[str],
+         longer_prefixes: typing.Optional[bool],
+         nexthop: typing.Optional[str],
+         offset: typing.Optional[int],
+         limit: typing.Optional[int]):
     if net and protocol:
         raise ValueError("net and protocol are mutually exclusive")
+    elif longer_prefixes and not net:
+        raise ValueError("longer-prefixes requires a network")
+    elif (offset is not None and offset < 0) or (limit is not None and limit < 1):
+        raise ValueError("offset must not be negative and limit must be positive")
+    elif (nexthop or offset or limit) and not raw:
+        raise ValueError("nexthop, offset and limit are only supported for raw output")
     elif table and vrf:
         raise ValueError("table and vrf are mutually exclusive")
     elif (family == 'inet6') and (protocol == 'rip'):
@@ -119,19 +153,14 @@ def show(raw: bool,
         frr_command = frr_command_template.render(kwargs)
         frr_command = re.sub(r'\s+', ' ', frr_command)
 
-        from vyos.utils.process import cmd
-        output = cmd(f"vtysh -c '{frr_command}'")
-
+        frr_command = frr_command.strip()
         if raw:
-            from json import loads
-            d = loads(output)
-            collect = []
-            for k,_ in d.items():
-                for l in d[k]:
-                    collect.append(l)
-            return collect
-        else:
-            return output
+            # "vrf all" output is keyed by VRF name first
+            depth = 2 if vrf == 'all' else 1
+            return _get_raw_routes(frr_command, depth, nexthop, offset, limit)
+
+        from vyos.utils.process import cmd
+        return cmd(f"vtysh -c '{frr_command}'")
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,241 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+# Asynchronous commit queue of the HTTP API
+#
+# Configuration requests submitted in asynchronous mode are queued and
+# processed by a single worker thread; the client gets a job id and polls
+# (or long-polls) the job status. Consecutive queued jobs which allow it are
+# coalesced: their edits are applied in order and committed once. If the
+# coalesced edits or the commit fail, the jobs are retried one by one, so
+# each job reports its own error. A job changing the HTTP API configuration
+# itself is committed alone, after its status has been reported, as the
+# commit restarts the API server.
+
+import time
+import logging
+import traceback
+from uuid import uuid4
+from threading import Lock
+from threading import Thread
+from threading import Condition
+from collections import deque
+from collections import OrderedDict
+from typing import Callable
+
+from vyos.configsession import ConfigSessionError
+
+LOG = logging.getLogger('http_api.commit_queue')
+
+# backpressure: maximum number of jobs waiting for the worker
+MAX_PENDING = 64
+# number of finished jobs remembered for status requests
+MAX_FINISHED = 256
+# maximum time in seconds a status request may wait for a job to finish
+MAX_WAIT = 60
+
+
+class CommitQueueFull(Exception):
+    pass
+
+
+class CommitJob:
+    # pylint: disable=too-many-instance-attributes,too-few-public-methods
+
+    def __init__(self, commands, key_id=None, coalesce=False):
+        self.id = uuid4().hex
+        self.commands = commands
+        self.key_id = key_id
+        self.coalesce = coalesce
+        self.status = 'queued'
+        self.message = None
+        self.error = None
+        self.coalesced_with = []
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('success', 'failed')
+
+    def to_dict(self) -> dict:
+        return {
+            'job': self.id,
+            'status': self.status,
+            'message': self.message,
+            'error': self.error,
+            'coalesced_with': self.coalesced_with,
+            'queued': self.queued,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class CommitQueue:
+    """
+    Singleton queue of commit jobs; 'apply' applies the commands of a job to
+    the shared config session and raises ConfigSessionError on failure,
+    'commit' and 'discard' act on the session. 'lock' is the lock shared with
+    the synchronous configuration requests. 'self_ref', if set, is called
+    after the commands are applied and returns a message if the commit
+    would restart the API server, None otherwise.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CommitQueue, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.apply = None
+        self.commit = None
+        self.discard = None
+        self.lock = None
+        self.self_ref = None
+        self.max_pending = MAX_PENDING
+        self._pending = deque()
+        self._jobs = OrderedDict()
+        self._cond = Condition(Lock())
+        self._worker = None
+
+    def setup(self, apply: Callable, commit: Callable, discard: Callable,
+              lock: Lock, self_ref: Callable = None):
+        self.apply = apply
+        self.commit = commit
+        self.discard = discard
+        self.lock = lock
+        self.self_ref = self_ref
+
+    def submit(self, commands, key_id=None, coalesce=False) -> CommitJob:
+        job = CommitJob(commands, key_id=key_id, coalesce=coalesce)
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                raise CommitQueueFull(f'Commit queue is full ({self.max_pending} '
+                                      'pending jobs), retry later')
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = Thread(target=self._run, name='commit-queue',
+                                      daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+        return job
+
+    def job(self, job_id: str, wait: float = 0) -> dict:
+        """Return the status of a job, waiting up to 'wait' seconds for it
+        to finish; raises KeyError for unknown (or expired) jobs"""
+        deadline = time.monotonic() + min(wait, MAX_WAIT)
+        with self._cond:
+            job = self._jobs[job_id]
+            while not job.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job.to_dict()
+
+    def jobs(self, key_id=None) -> list:
+        with self._cond:
+            return [j.to_dict() for j in self._jobs.values()
+                    if key_id is None or j.key_id == key_id]
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            batch = [self._pending.popleft()]
+            while (batch[0].coalesce and self._pending and
+                   self._pending[0].coalesce):
+                batch.append(self._pending.popleft())
+            now = time.time()
+            for job in batch:
+                job.status = 'running'
+                job.started = now
+            return batch
+
+    def _finish(self, jobs: list, message=None, error=None):
+        with self._cond:
+            now = time.time()
+            for job in jobs:
+                job.status = 'failed' if error else 'success'
+                job.message = message
+                job.error = error
+                job.finished = now
+                if len(jobs) > 1:
+                    job.coalesced_with = [j.id for j in jobs if j is not job]
+                job.commands = None
+            finished = [k for k, j in self._jobs.items() if j.done]
+            for k in finished[:max(0, len(finished) - MAX_FINISHED)]:
+                del self._jobs[k]
+            self._cond.notify_all()
+
+    def _process(self, jobs: list) -> bool:
+        """Apply and commit the jobs as one commit; returns False if a
+        coalesced batch failed and has to be retried job by job"""
+        with self.lock:
+            try:
+                for job in jobs:
+                    self.apply(job.commands)
+                msg = self.self_ref() if self.self_ref is not None else None
+                if msg is not None:
+                    if len(jobs) > 1:
+                        self.discard()
+                        return False
+                    self._finish(jobs, message=msg)
+                    self._commit_self_ref()
+                    return True
+                out = self.commit()
+            except ConfigSessionError as e:
+                self.discard()
+                if len(jobs) > 1:
+                    return False
+                self._finish(jobs, error=str(e))
+                return True
+            except Exception:
+                self.discard()
+                LOG.critical(traceback.format_exc())
+                self._finish(jobs, error='An internal error occured. '
+                                         'Check the logs for details.')
+                return True
+        self._finish(jobs, message=out if out else None)
+        return True
+
+    def _commit_self_ref(self):
+        """Commit a job which has already been reported; the API server is
+        restarted by it, so failures can only be logged"""
+        try:
+            self.commit()
+        except ConfigSessionError as e:
+            self.discard()
+            LOG.warning(f'ConfigSessionError: {e}')
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if len(batch) > 1:
+                LOG.info(f'Coalescing {len(batch)} queued commit jobs')
+            if not self._process(batch):
+                for job in batch:
+                    self._process([job])
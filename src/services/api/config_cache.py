@@ -0,0 +1,121 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+# Per-revision cache of configuration retrieval results
+#
+# The revision of the running configuration is the modification time of a
+# file touched by a commit post-hook, combined with a local generation
+# counter the API bumps whenever it changes or discards its own session.
+# Determining the revision only needs a stat(), so clients which already
+# hold the current result (ETag) are answered without reading the config.
+# If the hook can not touch the file, nothing is cached.
+
+import os
+import re
+import grp
+import json
+import stat
+from hashlib import sha1
+from threading import Lock
+from typing import Callable
+from typing import Optional
+
+from vyos.defaults import config_revision
+
+# cached results per revision; bounds memory for clients iterating paths
+MAX_ENTRIES = 1024
+# group of the users committing, who run the hook touching config_revision
+CONFIG_GROUP = 'vyattacfg'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Return True if an If-None-Match header value matches etag, comparing
+    entity tags exactly but ignoring weakness (RFC 9110, 13.1.2)"""
+    if if_none_match.strip() == '*':
+        return True
+    return etag.removeprefix('W/') in re.findall(r'(?:W/)?("[^"]*")', if_none_match)
+
+
+class ConfigCache:
+    """
+    Singleton cache of results keyed by a hashable key, valid for a single
+    revision of the configuration.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ConfigCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.busy = lambda: False
+        self._generation = 0
+        self._revision = None
+        self._entries = {}
+        self._lock = Lock()
+        try:
+            self._gid = grp.getgrnam(CONFIG_GROUP).gr_gid
+        except KeyError:
+            self._gid = None
+
+    def revision(self) -> Optional[str]:
+        """Return the current revision, None if unknown in which case
+        nothing is cached: the revision file is missing, or not writable
+        by CONFIG_GROUP so commits may not update it"""
+        try:
+            st = os.stat(config_revision)
+        except OSError:
+            return None
+        if st.st_gid != self._gid or not st.st_mode & stat.S_IWGRP:
+            return None
+        return f'{st.st_mtime_ns:x}-{self._generation}'
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries = {}
+
+    def etag(self, revision: str, key: tuple) -> str:
+        digest = sha1(json.dumps([revision, key]).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def get(self, key: tuple, producer: Callable):
+        """Return (result, revision) for key, calling producer only if the
+        result is not cached for the current revision
+
+        Results are not stored while the session is modified (busy), as the
+        working config then has uncommitted changes.
+        """
+        revision = self.revision()
+        if revision is None:
+            return producer(), None
+
+        with self._lock:
+            if revision != self._revision:
+                self._revision = revision
+                self._entries = {}
+            elif key in self._entries:
+                return self._entries[key], revision
+
+        result = producer()
+
+        with self._lock:
+            if (not self.busy() and revision == self._revision and
+                    len(self._entries) < MAX_ENTRIES):
+                self._entries[key] = result
+        return result, revision
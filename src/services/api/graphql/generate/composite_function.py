@@ -3,5 +3,9 @@
 def system_status():
     pass
 
-queries = {'system_status': system_status}
+def commit_job_status(job: str):
+    pass
+
+queries = {'system_status': system_status,
+           'commit_job_status': commit_job_status}
 mutations = {}
@@ -20,7 +20,6 @@
 
 import os
 import sys
-import json
 from inspect import signature, getmembers, isfunction, isclass, getmro
 from jinja2 import Template
 
@@ -32,9 +31,11 @@
     sys.path.append(os.path.join(directories['services'], 'api'))
     from graphql.libs.op_mode import is_show_function_name
     from graphql.libs.op_mode import snake_to_pascal_case, map_type_name
+    from graphql.libs.op_mode import load_op_mode_list
 else:
     from .. libs.op_mode import is_show_function_name
     from .. libs.op_mode import snake_to_pascal_case, map_type_name
+    from .. libs.op_mode import load_op_mode_list
 
 OP_MODE_PATH = directories['op_mode']
 SCHEMA_PATH = directories['api_schema']
@@ -265,8 +266,7 @@ def generate_op_mode_definitions():
     with open(f'{SCHEMA_PATH}/{op_mode_error_schema}', 'w') as f:
         f.write(out)
 
-    with open(op_mode_include_file) as f:
-        op_mode_files = json.load(f)
+    op_mode_files, _ = load_op_mode_list(op_mode_include_file)
 
     for file in op_mode_files:
         basename = os.path.splitext(file)[0].replace('-', '_')
@@ -13,7 +13,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
 
 # used below by func_sig
 from typing import Any, Dict, Optional  # pylint: disable=W0611 # noqa: F401
@@ -25,12 +27,23 @@
 from vyos.opmode import Error as OpModeError
 
 from ...session import SessionState
+from ...session import lock
 from ..libs import key_auth
 from ..session.session import Session
 from ..session.errors.op_mode_errors import op_mode_err_msg, op_mode_err_code
 
 mutation = ObjectType('Mutation')
 
+# mutations change the shared session: they run one at a time, under the lock
+# shared with the REST API, in their own worker so waiting for the lock does
+# not hold up the op-mode query workers
+mutation_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mutation')
+
+
+def run_locked(func):
+    with lock:
+        return func()
+
 
 def make_mutation_resolver(mutation_name, class_name, session_func):
     """Dynamically generate a resolver for the mutation named in the
@@ -97,7 +110,10 @@ async def func_impl(*args, **kwargs):
                 klass = type(class_name, (Session,), {})
             k = klass(session, data)
             method = getattr(k, session_func)
-            result = method()
+            # blocking session functions run in the mutation worker, not on
+            # the event loop
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(mutation_pool, run_locked, method)
             data['result'] = result
 
             return {'success': True, 'data': data}
@@ -25,6 +25,8 @@
 from vyos.opmode import Error as OpModeError
 
 from ...session import SessionState
+from ...op_executor import OpModeExecutor
+from ...op_executor import OP_MODE_TIMEOUT
 from ..libs import key_auth
 from ..session.session import Session
 from ..session.errors.op_mode_errors import op_mode_err_msg, op_mode_err_code
@@ -97,7 +99,11 @@ async def func_impl(*args, **kwargs):
                 klass = type(class_name, (Session,), {})
             k = klass(session, data)
             method = getattr(k, session_func)
-            result = method()
+            # blocking session functions run in the worker pool, not on the
+            # event loop; op-mode queries are bounded in time
+            timeout = OP_MODE_TIMEOUT if session_func == 'gen_op_query' else None
+            result = await OpModeExecutor().call(method, key=class_name,
+                                                 timeout=timeout)
             data['result'] = result
 
             return {'success': True, 'data': data}
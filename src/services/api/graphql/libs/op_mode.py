@@ -15,8 +15,10 @@
 
 import os
 import re
+import json
 import typing
 
+from threading import Lock
 from typing import Union
 from typing import Optional
 from humps import decamelize
@@ -26,10 +28,48 @@
 from vyos.opmode import _normalize_field_names
 from vyos.opmode import _is_literal_type, _get_literal_values
 
+op_mode_include_file = os.path.join(directories['data'], 'op-mode-standardized.json')
+
+def load_op_mode_list(path: str = op_mode_include_file) -> tuple:
+    """ Return the list of standardized op-mode script names and the result
+    cache policies declared for their functions, as a dict
+    {(script, function): {'ttl': seconds, 'stale': seconds}}
+
+    Entries of the include file are either a script name or a dict
+    {"file": name, "cache": {function: {"ttl": .., "stale": ..}}}
+    """
+    with open(path) as f:
+        entries = json.load(f)
+
+    files = []
+    policies = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            files.append(entry)
+            continue
+        files.append(entry['file'])
+        for func, policy in entry.get('cache', {}).items():
+            policies[(entry['file'], func)] = policy
+
+    return files, policies
+
+# path: (modification time, module)
+_op_mode_modules = {}
+_op_mode_modules_lock = Lock()
+
 def load_op_mode_as_module(name: str):
+    """ Load an op-mode script as module; modules are kept and only loaded
+    again when the script changed """
     path = os.path.join(directories['op_mode'], name)
     name = os.path.splitext(name)[0].replace('-', '_')
-    return load_as_module(name, path)
+    mtime = os.stat(path).st_mtime_ns
+    with _op_mode_modules_lock:
+        cached = _op_mode_modules.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        mod = load_as_module(name, path)
+        _op_mode_modules[path] = (mtime, mod)
+    return mod
 
 def is_show_function_name(name):
     if re.match(r"^show", name):
@@ -13,20 +13,19 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
-import os
 import json
 
 from ariadne import convert_camel_case_to_snake
 
 from vyos.config import Config
 from vyos.configtree import ConfigTree
-from vyos.defaults import directories
 from vyos.opmode import Error as OpModeError
 
 from api.graphql.libs.op_mode import load_op_mode_as_module, split_compound_op_mode_name
 from api.graphql.libs.op_mode import normalize_output
-
-op_mode_include_file = os.path.join(directories['data'], 'op-mode-standardized.json')
+from api.graphql.libs.op_mode import load_op_mode_list
+from api.graphql.libs.op_mode import op_mode_include_file
+from api.result_cache import ResultCache
 
 
 def get_config_dict(
@@ -73,21 +72,30 @@ def __init__(self, session, data):
         self._name = convert_camel_case_to_snake(type(self).__name__)
 
         try:
-            with open(op_mode_include_file) as f:
-                self._op_mode_list = json.loads(f.read())
+            self._op_mode_list, self._op_mode_cache = load_op_mode_list()
         except Exception:
-            self._op_mode_list = None
+            self._op_mode_list, self._op_mode_cache = None, {}
 
     def show_config(self):
+        from api.config_cache import ConfigCache
+
         session = self._session
         data = self._data
         out = ''
 
-        try:
+        config_format = 'json' if data.get('config_format', '') == 'json' else 'raw'
+
+        def show_config():
             out = session.show_config(data['path'])
-            if data.get('config_format', '') == 'json':
+            if config_format == 'json':
                 config_tree = ConfigTree(out)
                 out = json.loads(config_tree.to_json())
+            return out
+
+        try:
+            # shares the per-revision results of REST /retrieve
+            key = ('showConfig', tuple(data['path']), config_format)
+            out, _ = ConfigCache().get(key, show_config)
         except Exception as error:
             raise error
 
@@ -105,6 +113,8 @@ def save_config_file(self):
             raise error
 
     def load_config_file(self):
+        from api.config_cache import ConfigCache
+
         session = self._session
         data = self._data
 
@@ -113,6 +123,8 @@ def load_config_file(self):
             session.commit()
         except Exception as error:
             raise error
+        finally:
+            ConfigCache().invalidate()
 
     def show(self):
         session = self._session
@@ -173,6 +185,18 @@ def system_status(self):
 
         return status
 
+    def commit_job_status(self):
+        from api.commit_queue import CommitQueue
+
+        data = self._data
+
+        try:
+            res = CommitQueue().job(data['job'])
+        except KeyError:
+            raise ValueError(f"Commit job '{data['job']}' does not exist or has expired")
+
+        return res
+
     def gen_op_query(self):
         data = self._data
         name = self._name
@@ -185,18 +209,25 @@ def gen_op_query(self):
         if scriptname == '':
             raise FileNotFoundError(f"No op-mode file named in string '{name}'")
 
-        mod = load_op_mode_as_module(f'{scriptname}')
-        func = getattr(mod, func_name)
+        def run():
+            mod = load_op_mode_as_module(f'{scriptname}')
+            func = getattr(mod, func_name)
+            return normalize_output(func(True, **data))
+
+        # identical queries share one execution, and the cached result
+        # within the TTL declared in op-mode-standardized.json
+        key = (scriptname, func_name, json.dumps(data, sort_keys=True))
+        policy = self._op_mode_cache.get((scriptname, func_name))
         try:
-            res = func(True, **data)
+            res = ResultCache().get(key, run, policy)
         except OpModeError as e:
             raise e
 
-        res = normalize_output(res)
-
         return res
 
     def gen_op_mutation(self):
+        from api.config_cache import ConfigCache
+
         data = self._data
         name = self._name
         op_mode_list = self._op_mode_list
@@ -214,5 +245,8 @@ def gen_op_mutation(self):
             res = func(**data)
         except OpModeError as e:
             raise e
+        finally:
+            # op-mode mutations may commit, e.g. a configuration rollback
+            ConfigCache().invalidate()
 
         return res
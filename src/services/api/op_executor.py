@@ -0,0 +1,112 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+# Bounded worker pool for the blocking op-mode and session calls of the
+# HTTP API, keeping them off the event loop
+#
+# Calls with a key (the command) are limited to MAX_PER_COMMAND concurrent
+# executions of that command, so a single slow command can not occupy all
+# workers: the command slot is taken before the call is queued, a call
+# finding all slots of its command in use fails right away with
+# DataUnavailable instead of waiting in a worker. A call with a timeout fails with DataUnavailable if it does not
+# complete in time; Python threads can not be interrupted, so the call
+# itself keeps its worker (and command slot) until it returns.
+
+import asyncio
+from threading import Lock
+from threading import BoundedSemaphore
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable
+from typing import Optional
+
+from vyos.opmode import DataUnavailable
+
+MAX_WORKERS = 8
+MAX_PER_COMMAND = 2
+# default timeout for op-mode show functions
+OP_MODE_TIMEOUT = 60
+
+
+class OpModeExecutor:
+    """
+    Singleton worker pool for blocking calls
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(OpModeExecutor, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                        thread_name_prefix='op-mode')
+        self._limits = {}
+        self._lock = Lock()
+
+    def _limit(self, key) -> BoundedSemaphore:
+        with self._lock:
+            if key not in self._limits:
+                self._limits[key] = BoundedSemaphore(MAX_PER_COMMAND)
+            return self._limits[key]
+
+    def _submit(self, func: Callable, key) -> Future:
+        if key is None:
+            return self._pool.submit(func)
+
+        limit = self._limit(key)
+        if not limit.acquire(blocking=False):
+            raise DataUnavailable(f"Too many concurrent requests for '{key}'")
+        def run():
+            # the slot is held until the call returns, even if the caller
+            # timed out
+            try:
+                return func()
+            finally:
+                limit.release()
+
+        try:
+            future = self._pool.submit(run)
+        except BaseException:
+            limit.release()
+            raise
+        # a call cancelled while still queued never runs
+        future.add_done_callback(lambda f: f.cancelled() and limit.release())
+        return future
+
+    @staticmethod
+    def _timeout_error(key, timeout) -> DataUnavailable:
+        name = f"'{key}'" if key is not None else 'Request'
+        return DataUnavailable(f'{name} did not complete within {timeout} seconds')
+
+    async def call(self, func: Callable, key=None, timeout: Optional[float] = None):
+        """Run func() in the worker pool and await its result"""
+        future = asyncio.wrap_future(self._submit(func, key))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise self._timeout_error(key, timeout)
+
+    def call_sync(self, func: Callable, key=None, timeout: Optional[float] = None):
+        """Run func() in the worker pool and wait for its result"""
+        future = self._submit(func, key)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise self._timeout_error(key, timeout)
@@ -66,22 +66,31 @@ def check_non_empty(cls, path: str) -> str:
         return path
 
 
+class AsyncCommitModel(BaseModel):
+    # queue the request and return a commit job id, see /commit-job
+    asynchronous: bool = False
+    # allow committing together with adjacent queued requests
+    coalesce: bool = False
+
+
 class BaseConfigureModel(BasePathModel):
     value: StrictStr = None
 
 
-class ConfigureModel(ApiModel, BaseConfigureModel):
+class ConfigureModel(ApiModel, AsyncCommitModel, BaseConfigureModel):
     class Config:
         json_schema_extra = {
             'example': {
                 'key': 'id_key',
                 'op': 'set | delete | comment',
                 'path': ['config', 'mode', 'path'],
+                'asynchronous': 'false (default) | true',
+                'coalesce': 'false (default) | true',
             }
         }
 
 
-class ConfigureListModel(ApiModel):
+class ConfigureListModel(ApiModel, AsyncCommitModel):
     commands: List[BaseConfigureModel]
 
     class Config:
@@ -89,6 +98,8 @@ class Config:
             'example': {
                 'key': 'id_key',
                 'commands': 'list of commands',
+                'asynchronous': 'false (default) | true',
+                'coalesce': 'false (default) | true',
             }
         }
 
@@ -97,11 +108,11 @@ class BaseConfigSectionModel(BasePathModel):
     section: Dict
 
 
-class ConfigSectionModel(ApiModel, BaseConfigSectionModel):
+class ConfigSectionModel(ApiModel, AsyncCommitModel, BaseConfigSectionModel):
     pass
 
 
-class ConfigSectionListModel(ApiModel):
+class ConfigSectionListModel(ApiModel, AsyncCommitModel):
     commands: List[BaseConfigSectionModel]
 
 
@@ -111,7 +122,7 @@ class BaseConfigSectionTreeModel(BaseModel):
     config: Dict
 
 
-class ConfigSectionTreeModel(ApiModel, BaseConfigSectionTreeModel):
+class ConfigSectionTreeModel(ApiModel, AsyncCommitModel, BaseConfigSectionTreeModel):
     pass
 
 
@@ -131,6 +142,42 @@ class Config:
         }
 
 
+class CommitJobModel(ApiModel):
+    op: StrictStr
+    job: StrictStr = None
+    wait: float = None
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'key': 'id_key',
+                'op': 'status | list',
+                'job': 'job id',
+                'wait': 'seconds to wait for the job to finish',
+            }
+        }
+
+
+class ConfigSyncModel(ApiModel):
+    op: StrictStr
+    mask: Dict
+    base: StrictStr = None
+    target: StrictStr = None
+    commands: List[BaseConfigureModel] = []
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'key': 'id_key',
+                'op': 'digest | delta',
+                'mask': {'section': {}},
+                'base': 'digest of the sections the commands apply to',
+                'target': 'digest of the sections after the commands',
+                'commands': 'list of commands',
+            }
+        }
+
+
 class ConfigFileModel(ApiModel):
     op: StrictStr
     file: StrictStr = None
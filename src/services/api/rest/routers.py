@@ -18,13 +18,16 @@
 # pylint: disable=wildcard-import,unused-wildcard-import
 # pylint: disable=broad-exception-caught
 
+import re
+import zlib
 import json
 import copy
 import logging
 import traceback
-from threading import Lock
+from functools import lru_cache
 from typing import Union
 from typing import Callable
+from typing import Optional
 from typing import TYPE_CHECKING
 
 from fastapi import Depends
@@ -42,10 +45,25 @@
 
 from vyos.config import Config
 from vyos.configtree import ConfigTree
+from vyos.configtree import ConfigTreeError
+from vyos.config_sync import config_digest
+from vyos.config_sync import mask_from_dict
+from vyos.config_sync import masked_config
 from vyos.configdiff import get_config_diff
 from vyos.configsession import ConfigSessionError
+from vyos.xml_ref import load_op_reference
+from vyos.opmode import DataUnavailable
 
 from ..session import SessionState
+from ..session import lock
+from ..commit_queue import CommitQueue
+from ..commit_queue import CommitQueueFull
+from ..config_cache import ConfigCache
+from ..config_cache import etag_matches
+from ..result_cache import ResultCache
+from ..op_executor import OpModeExecutor
+from ..op_executor import OP_MODE_TIMEOUT
+from ..graphql.libs.op_mode import load_op_mode_list
 from .models import success
 from .models import error
 from .models import responses
@@ -59,6 +77,8 @@
 from .models import BaseConfigureModel
 from .models import BaseConfigSectionModel
 from .models import RetrieveModel
+from .models import CommitJobModel
+from .models import ConfigSyncModel
 from .models import ConfigFileModel
 from .models import ImageModel
 from .models import ContainerImageModel
@@ -76,7 +96,11 @@
 
 LOG = logging.getLogger('http_api.routers')
 
-lock = Lock()
+# limit for the decompressed size of compressed (config-sync) requests
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+# retrieve results are not cached while the shared session is being modified
+ConfigCache().busy = lock.locked
 
 
 def check_auth(key_list, key):
@@ -159,11 +183,38 @@ async def _get_form(
                 self._form = FormData()
         return self._form
 
+    def decompress(self, body: bytes) -> bytes:
+        # Only config-sync sends compressed requests. The key inside the body
+        # is also sent as header, so that only authenticated requests are
+        # decompressed, and only up to MAX_DECOMPRESSED_SIZE
+        if self.url.path != '/config-sync':
+            self.form_err = (415, 'Compressed requests are only accepted by /config-sync')
+            return b''
+        if not check_auth(SessionState().keys, self.orig_headers.get('x-api-key')):
+            self.form_err = (401, 'Valid API key is required')
+            return b''
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+        except zlib.error as e:
+            self.form_err = (400, f'Failed to decompress request: {e}')
+            return b''
+        if decompressor.unconsumed_tail:
+            self.form_err = (413, 'Decompressed request too large')
+            return b''
+        if not decompressor.eof:
+            self.form_err = (400, 'Failed to decompress request: truncated data')
+            return b''
+        return data
+
     async def body(self) -> bytes:
         if not hasattr(self, '_body'):
             forms = {}
             merge = {}
             body = await super().body()
+            if self.orig_headers.get('content-encoding') == 'gzip':
+                body = self.decompress(body)
             self._body = body
 
             form_data = await self.form()
@@ -209,6 +260,8 @@ async def body(self) -> bytes:
                         '/container-image',
                         '/image',
                         '/configure-section',
+                        '/commit-job',
+                        '/config-sync',
                     ):
                         if 'path' not in c:
                             self.form_err = (
@@ -297,6 +350,104 @@ def call_commit(s: SessionState):
             LOG.warning(f'ConfigSessionError:\n {traceback.format_exc()}')
         else:
             LOG.warning(f'ConfigSessionError: {e}')
+    finally:
+        ConfigCache().invalidate()
+
+
+def _https_changed(s: SessionState) -> bool:
+    config = Config(session_env=s.session.get_session_env())
+    return get_config_diff(config).is_node_changed(['service', 'https'])
+
+
+def _queued_commit(s: SessionState):
+    try:
+        return s.session.commit()
+    finally:
+        ConfigCache().invalidate()
+
+
+def _queued_discard(s: SessionState):
+    s.session.discard()
+    ConfigCache().invalidate()
+
+
+def _apply_commands(state: SessionState, commands: list):
+    """Apply configure/configure-section commands to the shared session
+
+    :raise ConfigSessionError:
+        invalid operation or path; the session is left for the caller to
+        discard
+    """
+    # pylint: disable=too-many-branches
+    session = state.session
+    env = session.get_session_env()
+
+    config = Config(session_env=env)
+
+    for c in commands:
+        op = c.op
+        if not isinstance(c, BaseConfigSectionTreeModel):
+            path = c.path
+
+        if isinstance(c, BaseConfigureModel):
+            if c.value:
+                value = c.value
+            else:
+                value = ''
+            # For vyos.configsession calls that have no separate value arguments,
+            # and for type checking too
+            cfg_path = ' '.join(path + [value]).strip()
+
+        elif isinstance(c, BaseConfigSectionModel):
+            section = c.section
+
+        elif isinstance(c, BaseConfigSectionTreeModel):
+            mask = c.mask
+            config = c.config
+
+        if isinstance(c, BaseConfigureModel):
+            if op == 'set':
+                session.set(path, value=value)
+            elif op == 'delete':
+                if state.strict and not config.exists(cfg_path):
+                    raise ConfigSessionError(
+                        f'Cannot delete [{cfg_path}]: path/value does not exist'
+                    )
+                session.delete(path, value=value)
+            elif op == 'comment':
+                session.comment(path, value=value)
+            else:
+                raise ConfigSessionError(f"'{op}' is not a valid operation")
+
+        elif isinstance(c, BaseConfigSectionModel):
+            if op == 'set':
+                session.set_section(path, section)
+            elif op == 'load':
+                session.load_section(path, section)
+            else:
+                raise ConfigSessionError(f"'{op}' is not a valid operation")
+
+        elif isinstance(c, BaseConfigSectionTreeModel):
+            if op == 'set':
+                session.set_section_tree(config)
+            elif op == 'load':
+                session.load_section_tree(mask, config)
+            else:
+                raise ConfigSessionError(f"'{op}' is not a valid operation")
+
+
+def _commit_queue() -> CommitQueue:
+    queue = CommitQueue()
+    if queue.apply is None:
+        state = SessionState()
+        queue.setup(
+            apply=lambda commands: _apply_commands(state, commands),
+            commit=lambda: _queued_commit(state),
+            discard=lambda: _queued_discard(state),
+            lock=lock,
+            self_ref=lambda: self_ref_msg if _https_changed(state) else None,
+        )
+    return queue
 
 
 def _configure_op(
@@ -310,12 +461,11 @@ def _configure_op(
     _request: Request,
     background_tasks: BackgroundTasks,
 ):
-    # pylint: disable=too-many-branches,too-many-locals,too-many-nested-blocks,too-many-statements
     # pylint: disable=consider-using-with
 
     state = SessionState()
-    session = state.session
-    env = session.get_session_env()
+    asynchronous = data.asynchronous
+    coalesce = data.coalesce
 
     # Allow users to pass just one command
     if not isinstance(data, (ConfigureListModel, ConfigSectionListModel)):
@@ -323,72 +473,45 @@ def _configure_op(
     else:
         data = data.commands
 
+    # Queue the request and return the job id; the commit queue worker
+    # applies and commits it under the same lock
+    if asynchronous:
+        try:
+            job = _commit_queue().submit(data, key_id=state.id, coalesce=coalesce)
+        except CommitQueueFull as e:
+            return error(503, str(e))
+        LOG.info(f"Configuration commit job '{job.id}' queued via HTTP API using key '{state.id}'")
+        return success(job.to_dict())
+
     # We don't want multiple people/apps to be able to commit at once,
     # or modify the shared session while someone else is doing the same,
     # so the lock is really global
     lock.acquire()
+    try:
+        status, msg, error_msg = _commit_commands(state, data, background_tasks)
+    finally:
+        lock.release()
 
-    config = Config(session_env=env)
+    if status != 200:
+        return error(status, error_msg)
+
+    return success(msg)
+
+
+def _commit_commands(state: SessionState, data: list, background_tasks: BackgroundTasks):
+    """Apply and commit the commands; call with the lock held
+
+    Returns (status, msg, error_msg)
+    """
+    session = state.session
 
     status = 200
     msg = None
     error_msg = None
     try:
-        for c in data:
-            op = c.op
-            if not isinstance(c, BaseConfigSectionTreeModel):
-                path = c.path
-
-            if isinstance(c, BaseConfigureModel):
-                if c.value:
-                    value = c.value
-                else:
-                    value = ''
-                # For vyos.configsession calls that have no separate value arguments,
-                # and for type checking too
-                cfg_path = ' '.join(path + [value]).strip()
-
-            elif isinstance(c, BaseConfigSectionModel):
-                section = c.section
-
-            elif isinstance(c, BaseConfigSectionTreeModel):
-                mask = c.mask
-                config = c.config
-
-            if isinstance(c, BaseConfigureModel):
-                if op == 'set':
-                    session.set(path, value=value)
-                elif op == 'delete':
-                    if state.strict and not config.exists(cfg_path):
-                        raise ConfigSessionError(
-                            f'Cannot delete [{cfg_path}]: path/value does not exist'
-                        )
-                    session.delete(path, value=value)
-                elif op == 'comment':
-                    session.comment(path, value=value)
-                else:
-                    raise ConfigSessionError(f"'{op}' is not a valid operation")
-
-            elif isinstance(c, BaseConfigSectionModel):
-                if op == 'set':
-                    session.set_section(path, section)
-                elif op == 'load':
-                    session.load_section(path, section)
-                else:
-                    raise ConfigSessionError(f"'{op}' is not a valid operation")
-
-            elif isinstance(c, BaseConfigSectionTreeModel):
-                if op == 'set':
-                    session.set_section_tree(config)
-                elif op == 'load':
-                    session.load_section_tree(mask, config)
-                else:
-                    raise ConfigSessionError(f"'{op}' is not a valid operation")
-        # end for
-        config = Config(session_env=env)
-        d = get_config_diff(config)
+        _apply_commands(state, data)
 
-        if d.is_node_changed(['service', 'https']):
+        if _https_changed(state):
             background_tasks.add_task(call_commit, state)
             msg = self_ref_msg
         else:
@@ -411,12 +534,9 @@ def _configure_op(
         # Don't give the details away to the outer world
         error_msg = 'An internal error occured. Check the logs for details.'
     finally:
-        lock.release()
+        ConfigCache().invalidate()
 
-    if status != 200:
-        return error(status, error_msg)
-
-    return success(msg)
+    return status, msg, error_msg
 
 
 def create_path_import_pki_no_prompt(path):
@@ -446,48 +566,148 @@ def configure_section_op(
     return _configure_op(data, request, background_tasks)
 
 
-@router.post('/retrieve')
-async def retrieve_op(data: RetrieveModel):
+@router.post('/config-sync')
+def config_sync_op(
+    data: ConfigSyncModel,
+    request: Request,
+    background_tasks: BackgroundTasks,
+):
     state = SessionState()
-    session = state.session
-    env = session.get_session_env()
-    config = Config(session_env=env)
+    env = state.session.get_session_env()
 
     op = data.op
-    path = ' '.join(data.path)
+    if op not in ('digest', 'delta'):
+        return error(400, f"'{op}' is not a valid operation")
 
+    lock.acquire()
     try:
-        if op == 'returnValue':
-            res = config.return_value(path)
-        elif op == 'returnValues':
-            res = config.return_values(path)
-        elif op == 'exists':
-            res = config.exists(path)
-        elif op == 'showConfig':
-            config_format = 'json'
-            if data.configFormat:
-                config_format = data.configFormat
-
-            res = session.show_config(path=data.path)
-            if config_format == 'json':
-                config_tree = ConfigTree(res)
-                res = json.loads(config_tree.to_json())
-            elif config_format == 'json_ast':
-                config_tree = ConfigTree(res)
-                res = json.loads(config_tree.to_json_ast())
-            elif config_format == 'raw':
-                pass
-            else:
-                return error(400, f"'{config_format}' is not a valid config format")
+        mask = mask_from_dict(data.mask)
+
+        def digest():
+            config = Config(session_env=env)
+            return config_digest(masked_config(config.get_config_tree(), mask))
+
+        current = digest()
+        if op == 'digest':
+            return success({'digest': current})
+
+        # the delta only applies to the sections it was computed from
+        if current != data.base:
+            return error(409, f'Configuration differs from base {data.base}')
+
+        status, msg, error_msg = _commit_commands(state, data.commands, background_tasks)
+        if status != 200:
+            return error(status, error_msg)
+
+        current = digest()
+        if current != data.target:
+            return error(409, f'Configuration differs from target {data.target}')
+    except (ValueError, ConfigTreeError) as e:
+        return error(400, str(e))
+    finally:
+        lock.release()
+
+    return success({'digest': current, 'message': msg})
+
+
+@router.post('/commit-job')
+def commit_job_op(data: CommitJobModel):
+    state = SessionState()
+    queue = _commit_queue()
+
+    op = data.op
+
+    try:
+        if op == 'status':
+            if not data.job:
+                return error(400, 'Missing required field "job"')
+            res = queue.job(data.job, wait=data.wait if data.wait else 0)
+        elif op == 'list':
+            res = queue.jobs(key_id=state.id)
         else:
             return error(400, f"'{op}' is not a valid operation")
+    except KeyError:
+        return error(404, f"Commit job '{data.job}' does not exist or has expired")
+    except Exception:
+        LOG.critical(traceback.format_exc())
+        return error(500, 'An internal error occured. Check the logs for details.')
+
+    return success(res)
+
+
+def _retrieve(state: SessionState, op: str, path: list, config_format: str):
+    """Run a retrieve operation against the per-revision config cache
+
+    :raise ValueError:
+        invalid operation or config format
+    """
+    cache = ConfigCache()
+    session = state.session
+
+    def config():
+        env = session.get_session_env()
+        return cache.get(('config',), lambda: Config(session_env=env))[0]
+
+    def show_config():
+        res = session.show_config(path=path)
+        if config_format == 'json':
+            config_tree = ConfigTree(res)
+            res = json.loads(config_tree.to_json())
+        elif config_format == 'json_ast':
+            config_tree = ConfigTree(res)
+            res = json.loads(config_tree.to_json_ast())
+        return res
+
+    str_path = ' '.join(path)
+
+    if op == 'returnValue':
+        producer = lambda: config().return_value(str_path)
+    elif op == 'returnValues':
+        producer = lambda: config().return_values(str_path)
+    elif op == 'exists':
+        producer = lambda: config().exists(str_path)
+    elif op == 'showConfig':
+        if config_format not in ('json', 'json_ast', 'raw'):
+            raise ValueError(f"'{config_format}' is not a valid config format")
+        producer = show_config
+    else:
+        raise ValueError(f"'{op}' is not a valid operation")
+
+    return cache.get((op, tuple(path), config_format), producer)
+
+
+@router.post('/retrieve')
+async def retrieve_op(data: RetrieveModel, request: Request):
+    state = SessionState()
+    cache = ConfigCache()
+
+    op = data.op
+    config_format = data.configFormat if data.configFormat else 'json'
+    if op != 'showConfig':
+        config_format = None
+    key = (op, data.path, config_format)
+
+    # Answer unchanged results without touching the config backend
+    revision = cache.revision()
+    if revision is not None:
+        etag = cache.etag(revision, key)
+        if etag_matches(request.headers.get('if-none-match', ''), etag):
+            return Response(status_code=304, headers={'ETag': etag})
+
+    try:
+        res, revision = _retrieve(state, op, data.path, config_format)
+    except ValueError as e:
+        return error(400, str(e))
     except ConfigSessionError as e:
         return error(400, str(e))
     except Exception:
         LOG.critical(traceback.format_exc())
         return error(500, 'An internal error occured. Check the logs for details.')
 
-    return success(res)
+    response = success(res)
+    if revision is not None:
+        response.headers['ETag'] = cache.etag(revision, key)
+    return response
 
 
 @router.post('/config-file')
@@ -511,16 +731,19 @@ def config_file_op(data: ConfigFileModel, background_tasks: BackgroundTasks):
             else:
                 return error(400, 'Missing required field "file"')
 
-            session.migrate_and_load_config(path)
+            try:
+                session.migrate_and_load_config(path)
 
-            config = Config(session_env=env)
-            d = get_config_diff(config)
+                config = Config(session_env=env)
+                d = get_config_diff(config)
 
-            if d.is_node_changed(['service', 'https']):
-                background_tasks.add_task(call_commit, state)
-                msg = self_ref_msg
-            else:
-                session.commit()
+                if d.is_node_changed(['service', 'https']):
+                    background_tasks.add_task(call_commit, state)
+                    msg = self_ref_msg
+                else:
+                    session.commit()
+            finally:
+                ConfigCache().invalidate()
         else:
             return error(400, f"'{op}' is not a valid operation")
     except ConfigSessionError as e:
@@ -612,6 +835,39 @@ def generate_op(data: GenerateModel):
     return success(res)
 
 
+@lru_cache(maxsize=1024)
+def _show_cache_policy(path: tuple) -> Optional[dict]:
+    """Return the result cache policy of the op-mode function run by
+    'show <path>', as declared in op-mode-standardized.json"""
+    try:
+        _, policies = load_op_mode_list()
+        nodes = load_op_reference().op_ref
+    except Exception:
+        return None
+
+    command = None
+    tag_value = False
+    for word in ('show',) + path:
+        if tag_value:
+            # value of the preceding tag node
+            tag_value = False
+            continue
+        for d in nodes:
+            if word in d:
+                nodes = d[word]
+                break
+        else:
+            return None
+        node_data = [n['node_data'] for n in nodes if 'node_data' in n]
+        command = next((n['command'] for n in node_data if n['command']), None)
+        tag_value = any(n['node_type'] == 'tagNode' for n in node_data)
+
+    m = re.search(r'/op_mode/([\w.-]+\.py)\s+(\w+)', command or '')
+    if not m:
+        return None
+    return policies.get((m.group(1), m.group(2)))
+
+
 @router.post('/show')
 def show_op(data: ShowModel):
     state = SessionState()
@@ -622,10 +878,18 @@ def show_op(data: ShowModel):
 
     try:
         if op == 'show':
-            res = session.show(path)
+            # identical requests share one execution, and the cached result
+            # within the TTL declared for the op-mode function; executions
+            # are bounded in time and concurrency per command
+            res = ResultCache().get(('show', tuple(path)),
+                                    lambda: OpModeExecutor().call_sync(
+                                        lambda: session.show(path),
+                                        key=' '.join(path),
+                                        timeout=OP_MODE_TIMEOUT),
+                                    _show_cache_policy(tuple(path)))
         else:
             return error(400, f"'{op}' is not a valid operation")
-    except ConfigSessionError as e:
+    except (ConfigSessionError, DataUnavailable) as e:
         return error(400, str(e))
     except Exception:
         LOG.critical(traceback.format_exc())
@@ -715,6 +979,7 @@ def import_pki(data: ImportPkiModel):
         LOG.critical(traceback.format_exc())
         return error(500, 'An internal error occured. Check the logs for details.')
     finally:
+        ConfigCache().invalidate()
         lock.release()
 
     return success(res)
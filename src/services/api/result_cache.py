@@ -0,0 +1,122 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+# Result cache for op-mode show requests of the HTTP API
+#
+# Identical requests which arrive while one is being executed wait for and
+# share its result. Results of commands with a cache policy are kept for
+# 'ttl' seconds; for a further 'stale' seconds the old result is returned
+# immediately while a single background execution refreshes it.
+#
+# Policies are declared per op-mode function in op-mode-standardized.json.
+
+import time
+import logging
+from threading import Lock
+from threading import Thread
+from concurrent.futures import Future
+from typing import Callable
+from typing import Optional
+
+LOG = logging.getLogger('http_api.result_cache')
+
+# maximum number of cached results
+MAX_ENTRIES = 512
+
+
+class ResultCache:
+    """
+    Singleton cache of op-mode results, keyed by a hashable request key
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResultCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        # key: (result, time of execution)
+        self._entries = {}
+        # key: Future of the execution in flight
+        self._inflight = {}
+        self._lock = Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def _execute(self, key, producer: Callable, future: Future, store: bool):
+        try:
+            result = producer()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        with self._lock:
+            del self._inflight[key]
+            if store and future.exception() is None:
+                if len(self._entries) >= MAX_ENTRIES:
+                    self._expire()
+                self._entries[key] = (future.result(), time.monotonic())
+
+    def _expire(self):
+        # drop the oldest half of the entries
+        entries = sorted(self._entries.items(), key=lambda e: e[1][1])
+        self._entries = dict(entries[len(entries) // 2:])
+
+    def _refresh(self, key, producer: Callable):
+        """Start a background execution unless one is in flight already;
+        call with the lock held"""
+        if key in self._inflight:
+            return
+        future = Future()
+        self._inflight[key] = future
+        Thread(target=self._execute, args=(key, producer, future, True),
+               daemon=True).start()
+
+    def get(self, key, producer: Callable, policy: Optional[dict] = None):
+        """Return the result of producer() for key
+
+        policy: {'ttl': seconds, 'stale': seconds}; without a policy, the
+        result is only shared with identical requests in flight
+        """
+        ttl = policy.get('ttl', 0) if policy else 0
+        stale = policy.get('stale', 0) if policy else 0
+
+        with self._lock:
+            if ttl and key in self._entries:
+                result, executed = self._entries[key]
+                age = time.monotonic() - executed
+                if age < ttl:
+                    return result
+                if age < ttl + stale:
+                    LOG.debug(f'Returning stale result for {key}, refreshing')
+                    self._refresh(key, producer)
+                    return result
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if owner:
+            self._execute(key, producer, future, bool(ttl))
+
+        return future.result()
@@ -0,0 +1,115 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import socket
+from threading import Thread
+from unittest import TestCase
+
+import vyos.accel_ppp
+
+SESSIONS = [{'ifname': f'ppp{i}', 'username': f'user{i}', 'ip': f'100.64.{i // 256}.{i % 256}',
+             'uptime-raw': str(i * 10)} for i in range(3000)]
+
+STATISTICS = """uptime: 0.00:25:18
+cpu: 3%
+memory:
+  rss/virt: 8416/246480 kB
+sessions:
+  starting: 7
+  active: 9
+  finishing: 0
+pppoe:
+  starting: 1
+  active: 2
+  delayed PADO: 0
+"""
+
+class AccelServer(Thread):
+    # reads commands line by line and closes the connection on 'exit',
+    # as the tcp interface of the accel-ppp cli module does
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.commands = []
+
+    def respond(self, command):
+        self.commands.append(command)
+        if command == 'show stat':
+            return STATISTICS
+        args = command.split()
+        if args[:2] != ['show', 'sessions']:
+            return 'invalid command\r\n'
+        columns = args[2].split(',')
+        sessions = SESSIONS
+        if 'match' in args:
+            column, regexp = args[args.index('match') + 1:][:2]
+            sessions = [s for s in sessions if re.search(regexp, s[column])]
+        lines = [' | '.join(columns),
+                 '+'.join('-' * len(c) for c in columns)]
+        lines += [' | '.join(s[c] for c in columns) for s in sessions]
+        return '\r\n'.join(lines) + '\r\n'
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn, conn.makefile('r') as f:
+                for line in f:
+                    if line.strip() == 'exit':
+                        break
+                    conn.sendall(self.respond(line.strip()).encode())
+
+class TestAccelPPP(TestCase):
+    def setUp(self):
+        self.server = AccelServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.sock.close()
+
+    def test_sessions(self):
+        columns = ['ifname', 'username', 'ip', 'uptime-raw']
+        sessions = vyos.accel_ppp.accel_get_sessions(self.server.port, columns)
+        self.assertEqual(sessions, SESSIONS)
+        self.assertEqual(self.server.commands,
+                         ['show sessions ifname,username,ip,uptime-raw'])
+
+        records = list(vyos.accel_ppp.accel_iter_sessions(
+            self.server.port, ['username', 'ip'], match=('username', '^user42$')))
+        self.assertEqual(records, [('user42', '100.64.0.42')])
+        self.assertEqual(self.server.commands[-1],
+                         'show sessions username,ip match username ^user42$')
+
+    def test_statistics(self):
+        output = vyos.accel_ppp.accel_cmd(self.server.port, 'show stat')
+        self.assertEqual(vyos.accel_ppp.get_server_statistics(output, 'pppoe:'),
+                         {'sessions': {'starting': '1', 'active': '2'},
+                          'cpu_load_percentage': 3})
+
+    def test_not_running(self):
+        self.server.sock.close()
+        with self.assertRaises(OSError):
+            vyos.accel_ppp.accel_cmd(self.server.port, 'show stat')
+
+    def test_out_parse(self):
+        output = 'ifname | username\n-------+---------\nppp0 | a\nppp1 | b\n'
+        self.assertEqual(vyos.accel_ppp.accel_out_parse(output.splitlines()),
+                         [{'ifname': 'ppp0', 'username': 'a'},
+                          {'ifname': 'ppp1', 'username': 'b'}])
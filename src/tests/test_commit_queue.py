@@ -0,0 +1,137 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import importlib
+from threading import Lock
+from threading import Event
+from unittest import TestCase
+
+from vyos.configsession import ConfigSessionError
+
+try:
+    commit_queue = importlib.import_module('src.services.api.commit_queue')
+except ModuleNotFoundError:  # for unittest.main()
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+    commit_queue = importlib.import_module('src.services.api.commit_queue')
+
+class FakeSession:
+    def __init__(self):
+        self.edits = []
+        self.commits = []
+        self.gate = Event()
+        self.gate.set()
+
+    def apply(self, commands):
+        self.gate.wait()
+        for c in commands:
+            if c == 'invalid':
+                raise ConfigSessionError(f'Set failed: {c}')
+            self.edits.append(c)
+
+    def commit(self):
+        self.commits.append(self.edits)
+        self.edits = []
+        return ''
+
+    def discard(self):
+        self.edits = []
+
+class TestCommitQueue(TestCase):
+    def setUp(self):
+        commit_queue.CommitQueue._instance = None
+        self.session = FakeSession()
+        self.queue = commit_queue.CommitQueue()
+        self.queue.setup(self.session.apply, self.session.commit,
+                         self.session.discard, Lock())
+
+    def test_job_status(self):
+        job = self.queue.submit(['a'])
+        status = self.queue.job(job.id, wait=5)
+        self.assertEqual(status['status'], 'success')
+        self.assertEqual(self.session.commits, [['a']])
+
+        job = self.queue.submit(['invalid'])
+        status = self.queue.job(job.id, wait=5)
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], 'Set failed: invalid')
+
+        with self.assertRaises(KeyError):
+            self.queue.job('unknown')
+
+    def test_coalesce(self):
+        # hold the worker in the first job, so the others pile up
+        self.session.gate.clear()
+        first = self.queue.submit(['a'])
+        jobs = [self.queue.submit([c], coalesce=True) for c in ('b', 'invalid', 'c', 'd')]
+        self.session.gate.set()
+
+        for job in [first] + jobs:
+            self.queue.job(job.id, wait=5)
+
+        # the coalesced batch fails because of 'invalid' and is retried job
+        # by job, so only the invalid job fails
+        self.assertEqual(self.session.commits, [['a'], ['b'], ['c'], ['d']])
+        self.assertEqual([j.status for j in jobs],
+                         ['success', 'failed', 'success', 'success'])
+
+        self.session.gate.clear()
+        first = self.queue.submit(['a'])
+        jobs = [self.queue.submit([c], coalesce=True) for c in ('b', 'c')]
+        self.session.gate.set()
+        for job in [first] + jobs:
+            self.queue.job(job.id, wait=5)
+        self.assertEqual(self.session.commits[-2:], [['a'], ['b', 'c']])
+        self.assertEqual(jobs[0].coalesced_with, [jobs[1].id])
+
+    def test_backpressure(self):
+        self.session.gate.clear()
+        self.queue.max_pending = 2
+        self.queue.submit(['a'])
+        # wait until the worker picked the first job
+        while self.queue.pending():
+            pass
+        self.queue.submit(['b'])
+        self.queue.submit(['c'])
+        with self.assertRaises(commit_queue.CommitQueueFull):
+            self.queue.submit(['d'])
+        self.session.gate.set()
+
+    def test_self_ref(self):
+        statuses = []
+        def self_ref():
+            if 'https' in self.session.edits:
+                return 'commit will be called in the background'
+            return None
+        def commit():
+            # the job is reported before the commit restarts the server
+            statuses.append(job.status if 'https' in self.session.edits else None)
+            return FakeSession.commit(self.session)
+        self.queue.self_ref = self_ref
+        self.queue.commit = commit
+
+        self.session.gate.clear()
+        first = self.queue.submit(['a'])
+        jobs = [self.queue.submit([c], coalesce=True) for c in ('b', 'https', 'c')]
+        job = jobs[1]
+        self.session.gate.set()
+        for j in [first] + jobs:
+            self.queue.job(j.id, wait=5)
+
+        # the self-referencing job is not coalesced with the others
+        self.assertEqual(self.session.commits, [['a'], ['b'], ['https'], ['c']])
+        self.assertEqual(statuses, [None, None, 'success', None])
+        self.assertEqual(job.message, 'commit will be called in the background')
+        self.assertEqual([j.status for j in jobs], ['success'] * 3)
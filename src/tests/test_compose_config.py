@@ -0,0 +1,70 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.compose_config
+from vyos.compose_config import ComposeConfig
+from vyos.compose_config import ComposeConfigError
+
+config = """
+system {
+    host-name "vyos"
+}
+"""
+
+def read_only(tree):
+    if not tree.exists(['service', 'ssh']):
+        return
+
+def rename_host(tree):
+    tree.set(['system', 'host-name'], value='r1')
+
+def rename_host_and_fail(tree):
+    tree.set(['system', 'host-name'], value='r2')
+    raise ValueError('broken')
+
+class TestComposeConfig(TestCase):
+    def test_checkpoint_on_write(self):
+        compose = ComposeConfig(config, checkpoint_file='/dev/null')
+        with patch.object(vyos.compose_config, 'ct_deep_copy',
+                          wraps=vyos.compose_config.ct_deep_copy) as deep_copy:
+            compose.apply_func(read_only)
+            self.assertFalse(compose.modified)
+            deep_copy.assert_not_called()
+
+            compose.apply_func(rename_host)
+            self.assertTrue(compose.modified)
+            self.assertEqual(deep_copy.call_count, 1)
+            self.assertEqual(compose.config_tree.return_value(['system', 'host-name']), 'r1')
+
+            with self.assertRaises(ComposeConfigError):
+                compose.apply_func(rename_host_and_fail)
+            self.assertEqual(deep_copy.call_count, 2)
+
+        # the failed function is rolled back
+        self.assertEqual(compose.config_tree.return_value(['system', 'host-name']), 'r1')
+
+    def test_no_checkpoint(self):
+        compose = ComposeConfig(config)
+        tree = compose.config_tree
+        with self.assertRaises(ComposeConfigError):
+            compose.apply_func(rename_host_and_fail)
+        self.assertTrue(compose.modified)
+        self.assertIs(compose.config_tree, tree)
+        self.assertEqual(tree.return_value(['system', 'host-name']), 'r2')
+        # the tree methods are no longer shadowed
+        for name in ComposeConfig.tree_writers:
+            self.assertNotIn(name, vars(tree))
@@ -0,0 +1,194 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.config_mgmt
+
+from vyos.config_archive import CommitIndex
+from vyos.config_archive import RevisionStore
+from vyos.config_archive import ConfigArchiveError
+from vyos.config_archive import changed_paths
+from vyos.config_archive import split_sections
+
+def make_config(rules: int, hostname: str = 'vyos') -> str:
+    rule = ''.join(f'                rule {i} {{\n'
+                   f'                    action "accept"\n'
+                   f'                    destination {{\n'
+                   f'                        port "{i}"\n'
+                   f'                    }}\n'
+                   f'                }}\n' for i in range(rules))
+    return ('firewall {\n'
+            '    ipv4 {\n'
+            '        name WAN {\n'
+            f'{rule}'
+            '        }\n'
+            '    }\n'
+            '}\n'
+            '/* system settings */\n'
+            'system {\n'
+            f'    host-name "{hostname}"\n'
+            '}\n'
+            '// vyos-config-version: "system@27"\n')
+
+class DictTree:
+    # the subset of the ConfigTree interface used by changed_paths; leaf
+    # nodes are lists of values
+    def __init__(self, tree: dict):
+        self.tree = tree
+
+    def _node(self, path):
+        node = self.tree
+        for p in path:
+            node = node[p]
+        return node
+
+    def list_nodes(self, path, path_must_exist=True):
+        return list(self._node(path))
+
+    def is_leaf(self, path):
+        return isinstance(self._node(path), list)
+
+class TestConfigArchive(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = RevisionStore(os.path.join(self.tmp.name, 'store'))
+        self.store.initialize()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def objects(self) -> int:
+        return sum(len(files) for _, _, files in
+                   os.walk(os.path.join(self.store.path, 'objects')))
+
+    def test_split_sections(self):
+        config = make_config(500)
+        sections = split_sections(config)
+        self.assertEqual([name for name, _ in sections], ['firewall', 'system', ''])
+        self.assertEqual(''.join(c for _, chunks in sections for c in chunks), config)
+        # the large firewall section is split into several chunks
+        self.assertGreater(len(sections[0][1]), 1)
+        self.assertTrue(sections[1][1][0].startswith('/* system settings */'))
+
+    def test_store(self):
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.store.head_hash())
+        with self.assertRaises(ConfigArchiveError):
+            self.store.get(0)
+
+        configs = [make_config(500, hostname=f'vyos{i}') for i in range(3)]
+        for c in configs:
+            self.assertTrue(self.store.add(c))
+        self.assertFalse(self.store.add(configs[-1]))
+
+        self.assertEqual(len(self.store), 3)
+        for rev, c in enumerate(reversed(configs)):
+            self.assertEqual(self.store.get(rev), c)
+
+        # the firewall chunks are shared between the revisions
+        objects = self.objects()
+        self.store.add(make_config(500, hostname='vyos3'))
+        self.assertEqual(self.objects(), objects + 1)
+
+        self.assertEqual(self.store.changed_sections(0, 1), ['system'])
+        self.assertEqual(self.store.get_sections(0, ['system']),
+                         '/* system settings */\nsystem {\n    host-name "vyos3"\n}\n')
+
+    def test_prune(self):
+        for i in range(5):
+            self.store.add(make_config(10 * (i + 1)), max_revisions=3)
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.get(2), make_config(30))
+        with self.assertRaises(ConfigArchiveError):
+            self.store.get(3)
+
+        # chunks of dropped revisions are removed
+        self.store.prune(1)
+        self.assertEqual(self.store.get(0), make_config(50))
+        self.assertEqual(self.objects(),
+                         sum(len(chunks) for _, chunks in split_sections(make_config(50))))
+
+    def test_changed_paths(self):
+        add = DictTree({'system': {'host-name': ['vyos2']},
+                        'service': {'ssh': {'port': ['22']}, 'ntp': {}}})
+        sub = DictTree({'system': {'host-name': ['vyos1'], 'domain-name': ['a.b']}})
+        self.assertEqual(changed_paths(add, sub),
+                         {'system host-name': 'change',
+                          'system domain-name': 'delete',
+                          'service ssh port': 'add',
+                          'service ntp': 'add'})
+
+    def test_commit_index(self):
+        index = CommitIndex(os.path.join(self.tmp.name, 'commits.db'))
+        entry = {'timestamp': '1700000000', 'user': 'vyos',
+                 'commit_via': 'cli', 'commit_comment': 'commit'}
+        index.add(1, entry, {'firewall ipv4 name WAN rule 100 action': 'add',
+                             'system host-name': 'add'})
+        index.add(2, entry, {'firewall ipv4 name WAN rule 10 action': 'add'})
+        index.add(3, entry, {'firewall ipv4 name WAN rule 100 action': 'change'})
+        index.add(4, entry, {})
+
+        path = ['firewall', 'ipv4', 'name', 'WAN', 'rule', '100']
+        self.assertEqual([seq for seq, _, _ in index.history(path)], [3, 1])
+        self.assertEqual(index.history(path)[0],
+                         (3, entry, [('firewall ipv4 name WAN rule 100 action', 'change')]))
+        self.assertEqual([seq for seq, _, _ in index.history(['firewall'])], [3, 2, 1])
+        self.assertEqual([seq for seq, _, _ in index.history()], [3, 2, 1])
+
+        self.assertTrue(index.revised(3, ['firewall']))
+        self.assertFalse(index.revised(3, ['system']))
+        self.assertFalse(index.revised(4))
+        self.assertIsNone(index.revised(5))
+
+        index.prune(3)
+        self.assertEqual([seq for seq, _, _ in index.history(path)], [3])
+        self.assertIsNone(index.revised(1))
+
+    def test_archive_active_config(self):
+        archive = os.path.join(self.tmp.name, 'config.boot')
+        active = make_config(5)
+
+        def save_config(target, json_out=None):
+            with open(target, 'w') as f:
+                f.write(active)
+
+        def rc_cmd(cmd):
+            _, _, source, target = cmd.split()
+            os.replace(source, target)
+            return 0, ''
+
+        cm = vyos.config_mgmt.ConfigMgmt.__new__(vyos.config_mgmt.ConfigMgmt)
+        cm.store = self.store
+        with patch.object(vyos.config_mgmt, 'archive_config_file', archive), \
+             patch.object(vyos.config_mgmt, 'config_json', self.tmp.name), \
+             patch.object(vyos.config_mgmt, 'boot_configuration_complete',
+                          return_value=True), \
+             patch.object(vyos.config_mgmt, 'save_config', save_config), \
+             patch.object(vyos.config_mgmt, 'rc_cmd', rc_cmd):
+            self.assertTrue(cm._archive_active_config())
+            self.assertTrue(self.store.add(active))
+            self.assertFalse(cm._archive_active_config())
+
+            # the archived config is restored, but it is no new revision
+            os.unlink(archive)
+            self.assertFalse(cm._archive_active_config())
+            with open(archive) as f:
+                self.assertEqual(f.read(), active)
+
+            active = make_config(6)
+            self.assertTrue(cm._archive_active_config())
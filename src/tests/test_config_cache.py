@@ -0,0 +1,96 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import grp
+import tempfile
+import importlib
+from unittest import TestCase
+
+try:
+    config_cache = importlib.import_module('src.services.api.config_cache')
+except ModuleNotFoundError:  # for unittest.main()
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+    config_cache = importlib.import_module('src.services.api.config_cache')
+
+class TestConfigCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.revision_file = os.path.join(self.tmp.name, 'revision')
+        config_cache.config_revision = self.revision_file
+        config_cache.CONFIG_GROUP = grp.getgrgid(os.getegid()).gr_name
+        config_cache.ConfigCache._instance = None
+        self.cache = config_cache.ConfigCache()
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def producer(self):
+        self.calls += 1
+        return self.calls
+
+    def commit(self, mtime):
+        with open(self.revision_file, 'w'):
+            pass
+        os.chmod(self.revision_file, 0o664)
+        os.utime(self.revision_file, ns=(mtime, mtime))
+
+    def test_no_revision(self):
+        # no commit recorded: nothing is cached
+        self.assertEqual(self.cache.get(('a',), self.producer), (1, None))
+        self.assertEqual(self.cache.get(('a',), self.producer), (2, None))
+
+    def test_revision(self):
+        self.commit(1000)
+        res, rev = self.cache.get(('a',), self.producer)
+        self.assertEqual(self.cache.get(('a',), self.producer), (res, rev))
+        self.assertEqual(self.calls, 1)
+        etag = self.cache.etag(rev, ('a',))
+        self.assertNotEqual(etag, self.cache.etag(rev, ('b',)))
+
+        self.commit(2000)
+        res, new_rev = self.cache.get(('a',), self.producer)
+        self.assertEqual(res, 2)
+        self.assertNotEqual(etag, self.cache.etag(new_rev, ('a',)))
+
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get(('a',), self.producer)[0], 3)
+
+    def test_not_writable(self):
+        # commits can not update the revision: nothing is cached
+        self.commit(1000)
+        os.chmod(self.revision_file, 0o644)
+        self.assertEqual(self.cache.get(('a',), self.producer), (1, None))
+        self.assertEqual(self.cache.get(('a',), self.producer), (2, None))
+
+    def test_busy(self):
+        self.commit(1000)
+        self.cache.busy = lambda: True
+        self.cache.get(('a',), self.producer)
+        self.cache.get(('a',), self.producer)
+        self.assertEqual(self.calls, 2)
+
+    def test_etag_matches(self):
+        etag = self.cache.etag('1-0', ('a',))
+        other = self.cache.etag('1-0', ('b',))
+        self.assertTrue(config_cache.etag_matches(etag, etag))
+        self.assertTrue(config_cache.etag_matches(f'{other}, W/{etag}', etag))
+        self.assertTrue(config_cache.etag_matches(' * ', etag))
+        self.assertFalse(config_cache.etag_matches('', etag))
+        self.assertFalse(config_cache.etag_matches(other, etag))
+        # no substring matches
+        self.assertFalse(config_cache.etag_matches(f'"x{etag[1:-1]}x"', etag))
+        self.assertFalse(config_cache.etag_matches(etag[1:-1], etag))
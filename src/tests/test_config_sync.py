@@ -0,0 +1,102 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from vyos.configtree import ConfigTree
+from vyos.config_sync import config_digest
+from vyos.config_sync import delta_commands
+
+left = """
+system {
+    host-name "r1"
+    name-server "1.1.1.1"
+    name-server "8.8.8.8"
+}
+firewall {
+    ipv4 {
+        name WAN {
+            rule 10 {
+                action "accept"
+            }
+            rule 20 {
+                action "drop"
+            }
+        }
+    }
+}
+"""
+
+right = """
+firewall {
+    ipv4 {
+        name WAN {
+            rule 10 {
+                action "accept"
+            }
+            rule 30 {
+                action "reject"
+                disable
+            }
+        }
+    }
+}
+system {
+    host-name "r2"
+    name-server "1.1.1.1"
+    name-server "9.9.9.9"
+}
+"""
+
+def apply_commands(tree: ConfigTree, commands: list):
+    for c in commands:
+        if c['op'] == 'delete':
+            if 'value' in c:
+                tree.delete_value(c['path'], c['value'])
+            else:
+                tree.delete(c['path'])
+        else:
+            tree.set(c['path'], value=c.get('value'), replace=False)
+
+class TestConfigSync(TestCase):
+    def test_digest(self):
+        l = ConfigTree(left)
+        r = ConfigTree(right)
+        self.assertNotEqual(config_digest(l), config_digest(r))
+
+        # node order does not matter
+        firewall, system = right.split('system {')
+        reordered = ConfigTree('system {' + system + firewall)
+        self.assertEqual(config_digest(reordered), config_digest(r))
+
+    def test_delta(self):
+        l = ConfigTree(left)
+        r = ConfigTree(right)
+
+        commands = delta_commands(l, r)
+        self.assertIn({'op': 'delete',
+                       'path': ['firewall', 'ipv4', 'name', 'WAN', 'rule', '20']},
+                      commands)
+        self.assertIn({'op': 'delete', 'path': ['system', 'name-server'],
+                       'value': '8.8.8.8'}, commands)
+        self.assertIn({'op': 'set',
+                       'path': ['firewall', 'ipv4', 'name', 'WAN', 'rule', '30', 'disable']},
+                      commands)
+        self.assertEqual([c['op'] for c in commands],
+                         sorted(c['op'] for c in commands))
+
+        apply_commands(l, commands)
+        self.assertEqual(config_digest(l), config_digest(r))
+
+        self.assertEqual(delta_commands(r, r), [])
@@ -0,0 +1,174 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from vyos.configsession import ConfigSession
+from vyos.configsession import ConfigSessionError
+from vyos.configsession import LOAD_CONFIG
+from vyos.configsession import SET
+from vyos.configsession import SHOW_WORKING_CONFIG
+from vyos.configtree import ConfigTree
+from vyos.xml_ref import definition
+
+def _node(node_type, children=None, constraints=None, valueless=False):
+    node_data = {'node_type': node_type, 'multi': False,
+                 'valueless': valueless, 'default_value': None,
+                 'owner': None, 'priority': None}
+    if constraints is not None:
+        node_data['constraints'] = constraints
+        node_data['constraint_error_message'] = ''
+    return dict(children or {}, node_data=node_data)
+
+reference = {
+    'service': _node('node', {
+        'test': _node('node', {
+            'port': _node('leaf', constraints=[['Regex', '[0-9]+']]),
+            'name': _node('leaf', constraints=[['External', 'alnum', '']]),
+            'legacy': _node('leaf'),
+            'user': _node('tag', {
+                'level': _node('leaf', constraints=[['Regex', 'admin|operator']]),
+            }, constraints=[['Regex', '[a-z]+']]),
+        }),
+    }),
+}
+
+original = 'service {\n    test {\n        port 80\n    }\n}\n'
+
+class Session(ConfigSession):
+    """ConfigSession on top of an in-memory working config"""
+    def __init__(self, config, failed_loads=0):
+        self.config = config
+        self.failed_loads = failed_loads
+        self.loads = 0
+        self.commands = []
+        self._ConfigSession__run_command = self.run_command
+
+    def __del__(self):
+        pass
+
+    def run_command(self, cmd):
+        if cmd == SHOW_WORKING_CONFIG:
+            return self.config
+        if cmd[:-1] == LOAD_CONFIG:
+            self.loads += 1
+            with open(cmd[-1]) as f:
+                config = f.read()
+            if self.failed_loads:
+                # loadFile does not roll back what it applied so far
+                self.failed_loads -= 1
+                self.config = ''
+                raise ConfigSessionError('Load failed')
+            self.config = config
+            return ''
+        self.commands.append(cmd)
+        return ''
+
+class TestConfigSession(TestCase):
+    def setUp(self):
+        xml = definition.Xml()
+        xml.define(reference)
+        patcher = patch('vyos.xml_ref.load_reference', return_value=xml)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        validator = patch('vyos.configsession._validator_accepts',
+                          side_effect=lambda validator, value: value.isalnum())
+        self.validator = validator.start()
+        self.addCleanup(validator.stop)
+
+        self.session = Session(original)
+
+    def set_section(self, d):
+        self.session.set_section(['service', 'test'], d)
+
+    def assertUnchanged(self):
+        self.assertEqual(ConfigTree(self.session.config).to_string(),
+                         ConfigTree(original).to_string())
+
+    def test_accept(self):
+        self.set_section({'port': '22', 'name': 'vyos',
+                          'user': {'alice': {'level': 'admin'},
+                                   'bob': {'level': 'operator'}}})
+
+        self.assertEqual(self.session.commands, [])
+        self.assertEqual(self.session.loads, 1)
+        tree = ConfigTree(self.session.config)
+        self.assertEqual(tree.return_value(['service', 'test', 'port']), '22')
+        self.assertEqual(tree.return_value(['service', 'test', 'name']), 'vyos')
+        self.assertEqual(tree.list_nodes(['service', 'test', 'user']),
+                         ['alice', 'bob'])
+        self.assertEqual(tree.return_value(['service', 'test', 'user', 'bob', 'level']),
+                         'operator')
+        self.validator.assert_called_with('alnum', 'vyos')
+
+    def test_reject_regex(self):
+        d = {'port': 'http', 'name': 'vyos',
+             'user': {'alice': {'level': 'admin'}, 'bob': {'level': 'admin'}}}
+        self.set_section(d)
+
+        self.assertEqual(self.session.loads, 0)
+        self.assertUnchanged()
+        self.assertIn([SET, 'service', 'test', 'port', 'http'],
+                      self.session.commands)
+
+    def test_reject_validator(self):
+        self.set_section({'port': '22', 'name': 'vy os',
+                          'user': {'alice': {'level': 'admin'},
+                                   'bob': {'level': 'admin'}}})
+
+        self.assertEqual(self.session.loads, 0)
+        self.assertUnchanged()
+        self.assertIn([SET, 'service', 'test', 'name', 'vy os'],
+                      self.session.commands)
+
+    def test_reject_tag_value(self):
+        self.set_section({'port': '22', 'name': 'vyos',
+                          'user': {'alice': {'level': 'admin'},
+                                   'Bob': {'level': 'admin'}}})
+
+        self.assertEqual(self.session.loads, 0)
+        self.assertUnchanged()
+        self.assertIn([SET, 'service', 'test', 'user', 'Bob', 'level', 'admin'],
+                      self.session.commands)
+
+    def test_reject_tag_child_value(self):
+        self.set_section({'port': '22', 'name': 'vyos',
+                          'user': {'alice': {'level': 'admin'},
+                                   'bob': {'level': 'root'}}})
+
+        self.assertEqual(self.session.loads, 0)
+        self.assertUnchanged()
+
+    def test_restore_on_failure(self):
+        self.session.failed_loads = 1
+        self.set_section({'port': '22', 'name': 'vyos',
+                          'user': {'alice': {'level': 'admin'},
+                                   'bob': {'level': 'admin'}}})
+
+        # failed load, then the original working config is loaded back
+        self.assertEqual(self.session.loads, 2)
+        self.assertUnchanged()
+        self.assertEqual(len(self.session.commands), 4)
+        self.assertTrue(all(c[0] == SET for c in self.session.commands))
+
+    def test_no_constraint_data(self):
+        self.set_section({'port': '22', 'name': 'vyos', 'legacy': 'any',
+                          'user': {'alice': {'level': 'admin'}}})
+
+        self.assertEqual(self.session.loads, 0)
+        self.assertUnchanged()
+        self.assertIn([SET, 'service', 'test', 'legacy', 'any'],
+                      self.session.commands)
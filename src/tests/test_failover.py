@@ -0,0 +1,150 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import importlib.util
+from unittest import TestCase
+from unittest.mock import patch
+from unittest.mock import MagicMock
+
+def import_failover():
+    path = os.path.join(os.path.dirname(__file__), '../helpers/vyos-failover.py')
+    spec = importlib.util.spec_from_file_location('vyos_failover', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+failover = import_failover()
+
+def next_hop_config(interface='eth0', metric='1', rise='1', fall='1'):
+    return {'interface': interface, 'metric': metric,
+            'check': {'type': 'icmp', 'policy': 'any-available',
+                      'timeout': '10', 'rise': rise, 'fall': fall,
+                      'target': {'192.0.2.254': {}}}}
+
+class RouteMessage(dict):
+    """ Kernel route as returned by IPRoute.get_routes() """
+    def __init__(self, dst, dst_len, gateway, oif, priority):
+        super().__init__(dst_len=dst_len)
+        self.attrs = {'RTA_DST': dst, 'RTA_GATEWAY': gateway,
+                      'RTA_OIF': oif, 'RTA_PRIORITY': priority}
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+class TestNextHop(TestCase):
+    def test_initial_state(self):
+        nh = failover.NextHop('0.0.0.0/0', '192.0.2.1', next_hop_config())
+        self.assertIsNone(nh.alive)
+        self.assertEqual(nh.to_dict()['state'], 'unknown')
+        # the first result is taken over right away
+        self.assertTrue(nh.update(False))
+        self.assertFalse(nh.alive)
+        self.assertEqual(nh.to_dict()['state'], 'down')
+
+    def test_rise_fall(self):
+        nh = failover.NextHop('0.0.0.0/0', '192.0.2.1',
+                              next_hop_config(rise='2', fall='3'))
+        nh.update(True)
+
+        # up -> down after 'fall' consecutive failed checks
+        self.assertEqual([nh.update(False) for _ in range(3)],
+                         [False, False, True])
+        self.assertFalse(nh.alive)
+        self.assertFalse(nh.update(False))
+
+        # down -> up after 'rise' consecutive successful checks
+        self.assertEqual([nh.update(True) for _ in range(2)], [False, True])
+        self.assertTrue(nh.alive)
+
+    def test_flapping(self):
+        nh = failover.NextHop('0.0.0.0/0', '192.0.2.1',
+                              next_hop_config(rise='2', fall='2'))
+        nh.update(True)
+
+        # a successful check resets the count of failed ones
+        for result in [False, True, False, True, False]:
+            self.assertFalse(nh.update(result))
+        self.assertTrue(nh.alive)
+        self.assertTrue(nh.update(False))
+        self.assertFalse(nh.alive)
+
+class TestRouteProgrammer(TestCase):
+    def setUp(self):
+        self.ipr = MagicMock()
+        self.ipr.link_lookup.side_effect = \
+            lambda ifname: [2] if ifname == 'eth0' else []
+        self.ipr.get_routes.return_value = []
+        for name, value in [('IPRoute', MagicMock(return_value=self.ipr)),
+                            ('journal', MagicMock())]:
+            patcher = patch.object(failover, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def next_hop(self, route, next_hop, alive, **kwargs):
+        nh = failover.NextHop(route, next_hop, next_hop_config(**kwargs))
+        nh.alive = alive
+        return nh
+
+    def routes(self, op):
+        return [c.kwargs for c in self.ipr.route.call_args_list if c.args == (op,)]
+
+    def test_sync(self):
+        next_hops = [
+            self.next_hop('0.0.0.0/0', '192.0.2.1', True, metric='1'),
+            self.next_hop('0.0.0.0/0', '192.0.2.2', False, metric='2'),
+            self.next_hop('203.0.113.0/24', '192.0.2.3', True, metric='1'),
+            self.next_hop('198.51.100.1/24', '192.0.2.4', True, metric='1'),
+            # interface does not exist (yet)
+            self.next_hop('198.51.100.0/24', '192.0.2.5', True, interface='eth9'),
+        ]
+        self.ipr.get_routes.return_value = [
+            RouteMessage(None, 0, '192.0.2.1', 2, 1),
+            RouteMessage(None, 0, '192.0.2.2', 2, 2),
+            RouteMessage('203.0.113.0', 24, '192.0.2.3', 2, 5),
+        ]
+        failover.RouteProgrammer(next_hops).sync()
+
+        self.ipr.get_routes.assert_called_once_with(
+            family=failover.socket.AF_INET, proto=failover.rt_proto_failover)
+        proto = failover.rt_proto_failover
+        self.assertCountEqual(self.routes('del'), [
+            {'dst': '0.0.0.0/0', 'gateway': '192.0.2.2', 'oif': 2,
+             'priority': 2, 'proto': proto},
+            {'dst': '203.0.113.0/24', 'gateway': '192.0.2.3', 'oif': 2,
+             'priority': 5, 'proto': proto},
+        ])
+        self.assertCountEqual(self.routes('add'), [
+            {'dst': '203.0.113.0/24', 'gateway': '192.0.2.3', 'oif': 2,
+             'priority': 1, 'proto': proto, 'flags': 0},
+            {'dst': '198.51.100.0/24', 'gateway': '192.0.2.4', 'oif': 2,
+             'priority': 1, 'proto': proto, 'flags': 0},
+        ])
+        self.assertEqual(failover.journal.send.call_count, 4)
+
+    def test_sync_in_place(self):
+        next_hops = [self.next_hop('0.0.0.0/0', '192.0.2.1', True)]
+        self.ipr.get_routes.return_value = [RouteMessage(None, 0, '192.0.2.1', 2, 1)]
+        failover.RouteProgrammer(next_hops).sync()
+        self.ipr.route.assert_not_called()
+
+    def test_sync_error(self):
+        next_hops = [self.next_hop('0.0.0.0/0', '192.0.2.1', True),
+                     self.next_hop('0.0.0.0/0', '192.0.2.2', True, metric='2')]
+        self.ipr.route.side_effect = [failover.NetlinkError(22), None]
+        failover.RouteProgrammer(next_hops).sync()
+
+        # a failed route does not keep the others from being added
+        self.assertEqual(len(self.routes('add')), 2)
+        failover.journal.send.assert_called_once()
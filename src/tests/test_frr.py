@@ -0,0 +1,176 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from io import StringIO
+from json import dumps
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.frr
+from vyos.frr import FRRConfig
+from vyos.frr import parse_configuration
+from vyos.frr import diff_configuration
+from vyos.frr import render_configuration
+from vyos.frr import _JSONObjectStream
+
+running_config = """frr version 9.1
+frr defaults traditional
+hostname vyos
+!
+ip prefix-list foo seq 5 permit 10.0.0.0/8
+!
+interface eth0
+ ip ospf cost 10
+exit
+!
+router bgp 65000
+ bgp router-id 192.0.2.254
+ neighbor 192.0.2.1 remote-as 100
+ !
+ address-family ipv4 unicast
+  network 10.0.0.0/8
+  network 11.0.0.0/8
+ exit-address-family
+ !
+ address-family l2vpn evpn
+  vni 100
+   rd 65000:100
+  exit-vni
+ exit-address-family
+exit
+!
+route-map foo permit 10
+ match ip address prefix-list foo
+exit
+!
+end"""
+
+class TestFRR(TestCase):
+    def test_parse_configuration(self):
+        sections = parse_configuration(running_config)
+        self.assertEqual(list(sections), ['frr version 9.1', 'frr defaults traditional',
+                                          'hostname vyos', 'ip prefix-list foo seq 5 permit 10.0.0.0/8',
+                                          'interface eth0', 'router bgp 65000', 'route-map foo permit 10'])
+        self.assertEqual(sections['hostname vyos'], [])
+        self.assertEqual(sections['interface eth0'], [((), 'ip ospf cost 10')])
+        self.assertIn((('address-family ipv4 unicast',), 'network 11.0.0.0/8'),
+                      sections['router bgp 65000'])
+        self.assertIn((('address-family l2vpn evpn', 'vni 100'), 'rd 65000:100'),
+                      sections['router bgp 65000'])
+
+    def test_diff_unchanged(self):
+        sections = parse_configuration(running_config)
+        self.assertEqual(diff_configuration(sections, parse_configuration(running_config)), ([], []))
+
+    def test_diff_toplevel(self):
+        new_config = running_config.replace('seq 5', 'seq 10')
+        new_config = new_config.replace('route-map foo permit 10\n match ip address prefix-list foo\nexit\n', '')
+        commands, changed = diff_configuration(parse_configuration(running_config),
+                                               parse_configuration(new_config))
+        self.assertEqual(commands, ['no route-map foo permit 10',
+                                    'no ip prefix-list foo seq 5 permit 10.0.0.0/8',
+                                    'ip prefix-list foo seq 10 permit 10.0.0.0/8'])
+        self.assertNotIn('router bgp 65000', changed)
+
+    def test_diff_section(self):
+        new_config = running_config.replace('remote-as 100', 'remote-as 200')
+        new_config = new_config.replace('network 11.0.0.0/8', 'network 12.0.0.0/8')
+        new_config = new_config.replace('  vni 100\n   rd 65000:100\n  exit-vni\n', '')
+        commands, changed = diff_configuration(parse_configuration(running_config),
+                                               parse_configuration(new_config))
+        self.assertEqual(changed, ['router bgp 65000'])
+        self.assertEqual(commands, ['router bgp 65000',
+                                    ' address-family l2vpn evpn',
+                                    '  no vni 100',
+                                    ' exit-address-family',
+                                    ' address-family ipv4 unicast',
+                                    '  no network 11.0.0.0/8',
+                                    ' exit-address-family',
+                                    ' neighbor 192.0.2.1 remote-as 200',
+                                    ' address-family ipv4 unicast',
+                                    '  network 12.0.0.0/8',
+                                    ' exit-address-family',
+                                    'exit'])
+
+    def test_diff_persistent_section(self):
+        new_config = running_config.replace('interface eth0\n ip ospf cost 10\nexit\n', '')
+        commands, changed = diff_configuration(parse_configuration(running_config),
+                                               parse_configuration(new_config))
+        self.assertEqual(changed, ['interface eth0'])
+        self.assertEqual(commands, ['interface eth0', ' no ip ospf cost 10', 'exit'])
+
+    def test_render_configuration(self):
+        sections = parse_configuration(running_config)
+        self.assertEqual(parse_configuration(render_configuration(sections)), sections)
+
+    def test_commit_batch_staging(self):
+        vyos.frr.begin_commit_batch()
+        try:
+            vyos.frr.set_commit_owner('protocols bgp')
+            frr_cfg = FRRConfig(running_config)
+            frr_cfg.modify_section(r'^router bgp \d+', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.add_before(r'route-map .*', 'router bgp 65001\n neighbor 192.0.2.2 remote-as 100\nexit')
+            frr_cfg.commit_configuration('bgpd')
+            self.assertTrue(vyos.frr.commit_batch_pending())
+
+            # A second script must see the staged and not the running configuration
+            vyos.frr.set_commit_owner('policy')
+            frr_cfg = FRRConfig()
+            frr_cfg.load_configuration('bgpd')
+            self.assertIn('router bgp 65001', frr_cfg.config)
+            frr_cfg.modify_section(r'^route-map .*', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.commit_configuration('bgpd')
+
+            owners = vyos.frr._commit_batch['bgpd']['owners']
+            self.assertEqual(owners['router bgp 65001'], ['protocols bgp'])
+            self.assertEqual(owners['router bgp 65000'], ['protocols bgp'])
+            self.assertEqual(owners['route-map foo permit 10'], ['policy'])
+        finally:
+            vyos.frr._commit_batch = None
+
+    def test_json_object_stream(self):
+        routes = {'192.0.2.0/24': [{'prefix': '192.0.2.0/24', 'protocol': 'static', 'distance': 1},
+                                   {'prefix': '192.0.2.0/24', 'protocol': 'bgp', 'distance': 20}],
+                  '198.51.100.0/24': [{'prefix': '198.51.100.0/24', 'metric': 123456789}],
+                  '203.0.113.0/24': []}
+        expected = [(('192.0.2.0/24',), routes['192.0.2.0/24'][0]),
+                    (('192.0.2.0/24',), routes['192.0.2.0/24'][1]),
+                    (('198.51.100.0/24',), routes['198.51.100.0/24'][0])]
+        # Small chunk sizes force values to be split across reads
+        for chunk_size in [1, 7, 65536]:
+            stream = _JSONObjectStream(StringIO(dumps(routes, indent=2)), chunk_size=chunk_size)
+            self.assertEqual(list(stream.items()), expected)
+
+        vrfs = {'red': routes, 'blue': {}}
+        stream = _JSONObjectStream(StringIO(dumps(vrfs)), chunk_size=5)
+        self.assertEqual([keys for keys, _ in stream.items(depth=2)],
+                         [('red', '192.0.2.0/24'), ('red', '192.0.2.0/24'), ('red', '198.51.100.0/24')])
+
+        # the whole object at once, e.g. for route summaries
+        stream = _JSONObjectStream(StringIO(dumps(vrfs)), chunk_size=5)
+        self.assertEqual(list(stream.items(depth=0)), [((), vrfs)])
+
+        # FRR returns no output at all for empty tables
+        self.assertEqual(list(_JSONObjectStream(StringIO('')).items()), [])
+        with self.assertRaises(ValueError):
+            list(_JSONObjectStream(StringIO('{"foo": [1, 2}')).items())
+
+    def test_execute_json_failure(self):
+        # the output is decoded, the exit status is only known at its end
+        with patch.object(vyos.frr, 'path_vtysh', '/bin/sh'):
+            with self.assertRaises(OSError):
+                for _ in vyos.frr.execute_json('echo \'{"routes": []}\'; exit 1', depth=0):
+                    pass
+            self.assertEqual(list(vyos.frr.execute_json('echo \'{"routes": []}\'', depth=0)),
+                             [((), {'routes': []})])
@@ -0,0 +1,238 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import copy
+import json
+import asyncio
+import logging
+import tempfile
+import threading
+import importlib.util
+import importlib.machinery
+from unittest import TestCase
+from unittest.mock import patch
+from unittest.mock import MagicMock
+
+import zmq
+import zmq.asyncio
+
+def import_hostsd():
+    path = os.path.join(os.path.dirname(__file__), '../services/vyos-hostsd')
+    loader = importlib.machinery.SourceFileLoader('vyos_hostsd', path)
+    spec = importlib.util.spec_from_loader('vyos_hostsd', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+hostsd = import_hostsd()
+hostsd.logger.setLevel(logging.CRITICAL)
+
+def add_name_server(tag, address):
+    return {'type': 'name_servers', 'op': 'add',
+            'data': {tag: [address]}}
+
+class TestHostsd(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        state_file = os.path.join(tmp.name, 'vyos-hostsd.state')
+        for name, value in [('STATE_FILE', state_file),
+                            ('JOURNAL_FILE', state_file + '.journal'),
+                            ('STATE', copy.deepcopy(hostsd.STATE)),
+                            ('journal_entries', 0)]:
+            patcher = patch.object(hostsd, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.initial = copy.deepcopy(hostsd.STATE)
+
+    def change(self, msg):
+        hostsd.update_state(hostsd.STATE, msg)
+        hostsd.journal(msg)
+
+    def reload(self):
+        hostsd.STATE = copy.deepcopy(self.initial)
+        hostsd.load_state()
+        return hostsd.STATE
+
+    def test_replay(self):
+        self.change(add_name_server('dhcp-eth0', '192.0.2.1'))
+        hostsd.save_state()
+        self.assertEqual(os.path.getsize(hostsd.JOURNAL_FILE), 0)
+
+        self.change(add_name_server('dhcp-eth1', '192.0.2.2'))
+        self.change({'type': 'name_servers', 'op': 'delete',
+                     'data': ['dhcp-eth0']})
+        expected = copy.deepcopy(hostsd.STATE)
+
+        state = self.reload()
+        self.assertEqual(state, expected)
+        self.assertEqual(list(state['name_servers']), ['dhcp-eth1'])
+        self.assertEqual(state['changes'], 3)
+
+        # changes applied before the crash are not pending after it
+        hostsd.journal({'op': 'apply'})
+        self.change(add_name_server('dhcp-eth2', '192.0.2.3'))
+        self.assertEqual(self.reload()['changes'], 1)
+
+    def test_truncated_entry(self):
+        self.change(add_name_server('dhcp-eth0', '192.0.2.1'))
+        expected = copy.deepcopy(hostsd.STATE)
+
+        line = json.dumps(add_name_server('dhcp-eth1', '192.0.2.2'))
+        with open(hostsd.JOURNAL_FILE, 'a') as f:
+            f.write(line[:len(line) // 2])
+
+        self.assertEqual(self.reload(), expected)
+
+    def test_compaction(self):
+        with patch.object(hostsd, 'JOURNAL_COMPACT', 3):
+            self.change(add_name_server('dhcp-eth0', '192.0.2.1'))
+            self.change(add_name_server('dhcp-eth1', '192.0.2.2'))
+            self.assertEqual(hostsd.journal_entries, 2)
+            self.change(add_name_server('dhcp-eth2', '192.0.2.3'))
+
+        self.assertEqual(hostsd.journal_entries, 0)
+        self.assertEqual(os.path.getsize(hostsd.JOURNAL_FILE), 0)
+        with open(hostsd.STATE_FILE) as f:
+            self.assertEqual(json.load(f), hostsd.STATE)
+        self.assertEqual(len(self.reload()['name_servers']), 3)
+
+    def test_apply_delay(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            applier = hostsd.Applier()
+            with patch.object(loop, 'time', lambda: now):
+                applier.defer()
+                self.assertEqual(applier._deferred,
+                                 (now, now + hostsd.APPLY_DELAY))
+
+                # every message postpones the apply...
+                now += hostsd.APPLY_DELAY / 2
+                hostsd.handle_message(add_name_server('dhcp-eth0', '192.0.2.1'),
+                                      applier)
+                start = applier._deferred[0]
+                self.assertEqual(applier._deferred,
+                                 (start, now + hostsd.APPLY_DELAY))
+
+                # ...up to APPLY_MAX_DELAY after the first deferred apply
+                now = start + hostsd.APPLY_MAX_DELAY - hostsd.APPLY_DELAY / 2
+                hostsd.handle_message(add_name_server('dhcp-eth1', '192.0.2.2'),
+                                      applier)
+                self.assertEqual(applier._deferred,
+                                 (start, start + hostsd.APPLY_MAX_DELAY))
+            applier._timer.cancel()
+
+            # a synchronous apply takes over the deferred one
+            applied = applier.request()
+            self.assertIsNone(applier._deferred)
+            return await applied
+
+        render = MagicMock()
+        with patch.object(hostsd, 'render_state', render):
+            resp = asyncio.run(run())
+        self.assertEqual(resp, {'data': {'message': 'Applied 2 changes'}})
+        render.assert_called_once()
+        self.assertEqual(hostsd.STATE['changes'], 0)
+
+    def test_deferred_apply(self):
+        async def run():
+            applier = hostsd.Applier()
+            hostsd.handle_message(add_name_server('dhcp-eth0', '192.0.2.1'),
+                                  applier)
+            hostsd.handle_message({'op': 'apply', 'deferred': True}, applier)
+            self.assertIsNone(applier._task)
+            while render.call_count == 0 or applier._task:
+                await asyncio.sleep(0.01)
+
+        render = MagicMock()
+        with patch.object(hostsd, 'APPLY_DELAY', 0.01), \
+             patch.object(hostsd, 'render_state', render):
+            asyncio.run(asyncio.wait_for(run(), 5))
+        render.assert_called_once()
+        self.assertEqual(list(render.call_args[0][0]['name_servers']),
+                         ['dhcp-eth0'])
+        self.assertEqual(hostsd.STATE['changes'], 0)
+
+    def test_serve(self):
+        started = threading.Event()
+        release = threading.Event()
+        rendered = []
+
+        def render_state(state):
+            started.set()
+            release.wait(5)
+            rendered.append(state)
+
+        async def request(socket, msg):
+            await socket.send(json.dumps(msg).encode())
+            return json.loads(await asyncio.wait_for(socket.recv(), 5))
+
+        async def run(socket_path):
+            server = asyncio.create_task(hostsd.serve())
+            context = zmq.asyncio.Context()
+            clients = []
+            for _ in range(4):
+                client = context.socket(zmq.REQ)
+                client.setsockopt(zmq.LINGER, 0)
+                client.connect(socket_path)
+                clients.append(client)
+            try:
+                resp = await request(clients[0],
+                                     add_name_server('dhcp-eth0', '192.0.2.1'))
+                self.assertEqual(resp, {'data': None})
+
+                first = asyncio.create_task(request(clients[0], {'op': 'apply'}))
+                loop = asyncio.get_running_loop()
+                self.assertTrue(await loop.run_in_executor(None, started.wait, 5))
+
+                # the server keeps answering while the apply runs
+                resp = await request(clients[1], {'type': 'name_servers',
+                                                  'op': 'get', 'tag_regex': '.*'})
+                self.assertEqual(resp, {'data': {'dhcp-eth0': {'192.0.2.1': None}}})
+                resp = await request(clients[1],
+                                     add_name_server('dhcp-eth1', '192.0.2.2'))
+                self.assertEqual(resp, {'data': None})
+
+                # applies requested meanwhile are coalesced into one
+                applies = [asyncio.create_task(request(c, {'op': 'apply'}))
+                           for c in clients[2:]]
+                await asyncio.sleep(0.1)
+                self.assertFalse(any(a.done() for a in [first] + applies))
+                release.set()
+
+                self.assertEqual(await first,
+                                 {'data': {'message': 'Applied 1 changes'}})
+                for apply in applies:
+                    self.assertEqual(await apply,
+                                     {'data': {'message': 'Applied 1 changes'}})
+            finally:
+                release.set()
+                server.cancel()
+                await asyncio.gather(server, return_exceptions=True)
+                for client in clients:
+                    client.close()
+                context.term()
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch.object(hostsd, 'render_state', render_state):
+            socket_path = 'ipc://' + os.path.join(tmp, 'vyos-hostsd.sock')
+            with patch.object(hostsd, 'SOCKET_PATH', socket_path):
+                asyncio.run(run(socket_path))
+
+        self.assertEqual(len(rendered), 2)
+        self.assertEqual(list(rendered[1]['name_servers']),
+                         ['dhcp-eth0', 'dhcp-eth1'])
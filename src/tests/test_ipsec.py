@@ -0,0 +1,198 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import OrderedDict
+from unittest import TestCase
+
+from vyos.ipsec import IpsecStateTable
+from vyos.ipsec import ViciSnapshot
+from vyos.ipsec import ViciCommandError
+from vyos.ipsec import vici_run_parallel
+
+def child_sa(name: str, uniqueid: int, state: bytes = b'INSTALLED') -> OrderedDict:
+    return OrderedDict(name=name.encode(), uniqueid=str(uniqueid).encode(),
+                       state=state)
+
+class FakeSession:
+    # vici returns OrderedDicts with bytes values
+    def __init__(self, peers: int):
+        self.calls = []
+        self.sas = []
+        self.conns = []
+        for i in range(peers):
+            name = f'peer{i}'
+            children = OrderedDict()
+            children[f'{name}-tunnel-0-{i}'] = child_sa(f'{name}-tunnel-0', i)
+            children[f'{name}-tunnel-1-{i}'] = child_sa(f'{name}-tunnel-1', i,
+                                                        state=b'REKEYED')
+            self.sas.append(OrderedDict({name: OrderedDict(
+                uniqueid=str(i).encode(), state=b'ESTABLISHED',
+                **{'child-sas': children})}))
+            self.conns.append(OrderedDict({name: OrderedDict(
+                children=OrderedDict({f'{name}-tunnel-0': {},
+                                      f'{name}-tunnel-1': {}}))}))
+
+    def list_sas(self):
+        self.calls.append('list-sas')
+        return iter(self.sas)
+
+    def list_conns(self):
+        self.calls.append('list-conns')
+        return iter(self.conns)
+
+class BrokenSession:
+    def list_sas(self):
+        raise OSError('connection reset')
+
+class TestViciSnapshot(TestCase):
+    def test_snapshot(self):
+        session = FakeSession(1000)
+        snapshot = ViciSnapshot(session)
+
+        self.assertEqual(len(snapshot.sas), 1000)
+        ike_sas = snapshot.ike_sas('peer42')
+        self.assertEqual(len(ike_sas), 1)
+        self.assertEqual(ike_sas[0]['peer42']['state'], 'ESTABLISHED')
+        self.assertEqual(snapshot.ike_sas('peer1000'), [])
+
+        children = snapshot.child_sas('peer42', 'peer42-tunnel-1')
+        self.assertEqual([c['state'] for c in children], ['REKEYED'])
+        self.assertEqual(snapshot.child_sas('peer42', 'peer43-tunnel-0'), [])
+
+        self.assertEqual(list(snapshot.connection('peer7')[0]['peer7']['children']),
+                         ['peer7-tunnel-0', 'peer7-tunnel-1'])
+
+        # every list is fetched once over the same session
+        for i in range(1000):
+            snapshot.ike_sas(f'peer{i}')
+            snapshot.connection(f'peer{i}')
+        self.assertEqual(session.calls, ['list-sas', 'list-conns'])
+
+    def test_command_error(self):
+        with self.assertRaises(ViciCommandError):
+            ViciSnapshot(BrokenSession()).ike_sas('peer0')
+
+def ike_sa(uniqueid: int, *children: dict) -> dict:
+    return {'uniqueid': str(uniqueid), 'state': 'ESTABLISHED', 'established': '10',
+            'child-sas': {f'{c["name"]}-{c["uniqueid"]}': c for c in children}}
+
+def child(name: str, uniqueid: int, state: str = 'INSTALLED') -> dict:
+    return {'name': name, 'uniqueid': str(uniqueid), 'state': state,
+            'install-time': '5', 'life-time': '3600', 'bytes-in': '1000'}
+
+class TestIpsecStateTable(TestCase):
+    def setUp(self):
+        self.table = IpsecStateTable()
+        self.table.load([{'peer1': ike_sa(1, child('peer1-tunnel-0', 1))},
+                         {'peer2': dict(ike_sa(2), state='CONNECTING')}],
+                        [{'peer1': {}}, {'peer2': {}}])
+
+    def children(self, name: str) -> dict:
+        for sa in self.table.dump()['sas']:
+            if name in sa:
+                return sa[name]['child-sas']
+        return None
+
+    def test_load(self):
+        state = self.table.dump()
+        self.assertEqual(len(state['connections']), 2)
+        # SAs being established are not cached, counters are left out
+        self.assertEqual([list(sa) for sa in state['sas']], [['peer1']])
+        self.assertEqual(self.children('peer1')['peer1-tunnel-0-1'],
+                         {'name': 'peer1-tunnel-0', 'uniqueid': '1',
+                          'state': 'INSTALLED', 'install-time': '5',
+                          'life-time': '3600'})
+
+    def test_events(self):
+        table = self.table
+        self.assertTrue(table.apply('ike-updown', {'up': 'yes', 'peer2': ike_sa(2)}))
+        self.assertTrue(table.apply('child-updown',
+                                    {'up': 'yes', 'peer2': ike_sa(2, child('peer2-tunnel-0', 2))}))
+        self.assertEqual(list(self.children('peer2')), ['peer2-tunnel-0-2'])
+
+        rekey = dict(ike_sa(2), **{'child-sas': {'peer2-tunnel-0-2': {
+            'old': child('peer2-tunnel-0', 2), 'new': child('peer2-tunnel-0', 3)}}})
+        self.assertTrue(table.apply('child-rekey', {'peer2': rekey}))
+        self.assertEqual(list(self.children('peer2')), ['peer2-tunnel-0-3'])
+
+        self.assertTrue(table.apply('ike-rekey', {'peer1': {
+            'old': ike_sa(1), 'new': ike_sa(4, child('peer1-tunnel-0', 1))}}))
+        self.assertEqual([sa['peer1']['uniqueid'] for sa in table.dump()['sas']
+                          if 'peer1' in sa], ['4'])
+
+        self.assertTrue(table.apply('child-updown',
+                                    {'peer2': ike_sa(2, child('peer2-tunnel-0', 3))}))
+        self.assertEqual(self.children('peer2'), {})
+        self.assertTrue(table.apply('ike-updown', {'peer2': ike_sa(2)}))
+        self.assertIsNone(self.children('peer2'))
+
+    def test_gap(self):
+        # events for SAs the table does not know ask for a resync
+        self.assertFalse(self.table.apply('ike-updown', {'peer3': ike_sa(9)}))
+        self.assertFalse(self.table.apply('child-updown',
+                                          {'peer3': ike_sa(9, child('peer3-tunnel-0', 9))}))
+        self.assertFalse(self.table.apply('child-updown',
+                                          {'peer1': ike_sa(1, child('peer1-tunnel-0', 7))}))
+
+    def test_snapshot(self):
+        snapshot = ViciSnapshot(state=self.table.dump())
+        self.assertIsNone(snapshot.session)
+        self.assertEqual(len(snapshot.child_sas('peer1', 'peer1-tunnel-0')), 1)
+        self.assertEqual(len(snapshot.connection('peer2')), 1)
+
+class TestViciRunParallel(TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.running = 0
+        self.max_running = 0
+
+    def session_factory(self):
+        with self.lock:
+            self.sessions += 1
+        return object()
+
+    def task(self, fail=False):
+        def run(session):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(0.01)
+            with self.lock:
+                self.running -= 1
+            if fail:
+                raise ViciCommandError('Failed to initiate SA')
+            return 'initiated'
+        return run
+
+    def test_parallel(self):
+        tasks = {f'peer{i}': self.task(fail=(i == 3)) for i in range(40)}
+        report = vici_run_parallel(tasks, concurrency=4,
+                                   session_factory=self.session_factory)
+        self.assertEqual(list(report), list(tasks))
+        self.assertEqual(report['peer0'], (True, 'initiated'))
+        self.assertEqual(report['peer3'], (False, 'Failed to initiate SA'))
+        self.assertEqual(self.max_running, 4)
+        # one session per worker, plus the one replacing the failed session
+        self.assertEqual(self.sessions, 5)
+
+    def test_rate(self):
+        tasks = {f'peer{i}': self.task() for i in range(10)}
+        start = time.monotonic()
+        report = vici_run_parallel(tasks, concurrency=10, rate=50,
+                                   session_factory=self.session_factory)
+        self.assertTrue(all(success for success, _ in report.values()))
+        self.assertGreaterEqual(time.monotonic() - start, 9 / 50)
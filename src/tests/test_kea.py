@@ -0,0 +1,102 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import socket
+import tempfile
+from ipaddress import ip_address
+from threading import Thread
+from unittest import TestCase
+
+import vyos.kea
+
+LEASES = [{'ip-address': str(ip_address('192.0.2.0') + i), 'subnet-id': 1,
+           'hostname': 'x' * 100} for i in range(1, 251)]
+
+class KeaServer(Thread):
+    # answers one command per connection in small writes, as Kea does
+    def __init__(self, path):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen()
+        self.commands = []
+
+    def respond(self, request):
+        self.commands.append(request)
+        command = request['command']
+        args = request.get('arguments', {})
+        if command == 'lease4-get-page':
+            start = 0
+            if args['from'] != 'start':
+                start = [l['ip-address'] for l in LEASES].index(args['from']) + 1
+            page = LEASES[start:start + args['limit']]
+            if not page:
+                return {'result': 3, 'text': '0 IPv4 lease(s) found.'}
+            return {'result': 0, 'arguments': {'leases': page, 'count': len(page)}}
+        if command == 'lease4-get':
+            for l in LEASES:
+                if l['ip-address'] == args['ip-address']:
+                    return {'result': 0, 'arguments': l}
+            return {'result': 3, 'text': 'Lease not found.'}
+        return {'result': 2, 'text': f"'{command}' command not supported."}
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                request = json.loads(conn.recv(65536))
+                response = json.dumps(self.respond(request)).encode()
+                for i in range(0, len(response), 1000):
+                    conn.sendall(response[i:i + 1000])
+
+class TestKea(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'dhcp{inet}-ctrl-socket')
+        self.socket_path = vyos.kea.kea_ctrl_socket
+        vyos.kea.kea_ctrl_socket = path
+        vyos.kea._ctrl_socket_checked.add(path.format(inet='4'))
+        self.server = KeaServer(path.format(inet='4'))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.sock.close()
+        vyos.kea.kea_ctrl_socket = self.socket_path
+        self.tmp.cleanup()
+
+    def test_iter_leases(self):
+        leases = list(vyos.kea.kea_iter_leases('4', page_size=100))
+        self.assertEqual(leases, LEASES)
+        self.assertEqual([c['arguments']['from'] for c in self.server.commands],
+                         ['start', '192.0.2.100', '192.0.2.200'])
+
+        self.assertEqual(len(vyos.kea.kea_get_leases('4')), 250)
+
+        # last page full: the next one is empty
+        self.server.commands = []
+        self.assertEqual(len(list(vyos.kea.kea_iter_leases('4', page_size=125))), 250)
+        self.assertEqual(len(self.server.commands), 3)
+
+    def test_get_lease(self):
+        self.assertEqual(vyos.kea.kea_get_lease('4', '192.0.2.7'), LEASES[6])
+        self.assertIsNone(vyos.kea.kea_get_lease('4', '192.0.2.255'))
+
+    def test_no_socket(self):
+        self.assertEqual(vyos.kea.kea_get_leases('6'), [])
+        self.assertIsNone(vyos.kea.kea_get_lease('6', '2001:db8::1'))
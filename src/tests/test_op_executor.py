@@ -0,0 +1,78 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import asyncio
+import importlib
+from threading import Event
+from unittest import TestCase
+
+from vyos.opmode import DataUnavailable
+
+try:
+    op_executor = importlib.import_module('src.services.api.op_executor')
+except ModuleNotFoundError:  # for unittest.main()
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+    op_executor = importlib.import_module('src.services.api.op_executor')
+
+class TestOpModeExecutor(TestCase):
+    def setUp(self):
+        op_executor.OpModeExecutor._instance = None
+        self.executor = op_executor.OpModeExecutor()
+        self.gate = Event()
+
+    def tearDown(self):
+        self.gate.set()
+
+    def test_call(self):
+        async def main():
+            return await self.executor.call(lambda: 42, key='a', timeout=5)
+        self.assertEqual(asyncio.run(main()), 42)
+        self.assertEqual(self.executor.call_sync(lambda: 43), 43)
+
+    def test_timeout(self):
+        async def main():
+            return await self.executor.call(self.gate.wait, key='a', timeout=0.05)
+        with self.assertRaises(DataUnavailable):
+            asyncio.run(main())
+
+    def test_command_limit(self):
+        # occupy all slots of command 'a'
+        busy = [self.executor._submit(self.gate.wait, 'a')
+                for _ in range(op_executor.MAX_PER_COMMAND)]
+        with self.assertRaises(DataUnavailable):
+            self.executor.call_sync(lambda: 1, key='a', timeout=0.05)
+        # other commands are not affected
+        self.assertEqual(self.executor.call_sync(lambda: 2, key='b', timeout=5), 2)
+        # a slot is free again once a call returned
+        self.gate.set()
+        busy[0].result(5)
+        self.assertEqual(self.executor.call_sync(lambda: 3, key='a', timeout=5), 3)
+
+    def test_flood(self):
+        # more calls of a slow command than there are workers
+        async def main():
+            flood = [asyncio.ensure_future(self.executor.call(self.gate.wait, key='a', timeout=5))
+                     for _ in range(op_executor.MAX_WORKERS * 2)]
+            await asyncio.sleep(0)
+            other = await self.executor.call(lambda: 42, key='b', timeout=1)
+            self.gate.set()
+            results = await asyncio.gather(*flood, return_exceptions=True)
+            return other, results
+
+        other, results = asyncio.run(main())
+        self.assertEqual(other, 42)
+        rejected = [r for r in results if isinstance(r, DataUnavailable)]
+        self.assertEqual(len(results) - len(rejected), op_executor.MAX_PER_COMMAND)
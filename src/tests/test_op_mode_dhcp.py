@@ -0,0 +1,115 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import importlib.util
+from unittest import TestCase
+from unittest.mock import patch
+
+def import_dhcp():
+    path = os.path.join(os.path.dirname(__file__), '../op_mode/dhcp.py')
+    spec = importlib.util.spec_from_file_location('dhcp', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+dhcp = import_dhcp()
+
+def active_config(inet, pools):
+    networks = [{'name': name, f'subnet{inet}': [{'id': subnet_id}]}
+                for subnet_id, name in pools.items()]
+    return {'arguments': {f'Dhcp{inet}': {'shared-networks': networks}}}
+
+def lease4(ip, mac='00:53:00:00:00:01', subnet_id=1, state=0,
+           cltt=1700000000, lifetime=3600):
+    return {'ip-address': ip, 'hw-address': mac, 'hostname': '',
+            'subnet-id': subnet_id, 'state': state, 'cltt': cltt,
+            'valid-lft': lifetime}
+
+def lease6(ip, prefix_len=128, lease_type='IA_NA', subnet_id=1):
+    return {'ip-address': ip, 'prefix-len': prefix_len, 'type': lease_type,
+            'duid': '000100012d', 'subnet-id': subnet_id, 'state': 0,
+            'cltt': 1700000000, 'valid-lft': 3600}
+
+class TestServerLeases(TestCase):
+    def leases(self, leases, family='inet', **kwargs):
+        inet = '6' if family == 'inet6' else '4'
+        pools = {1: 'LAN', 2: 'GUEST'}
+        with patch.object(dhcp, 'kea_iter_leases', return_value=iter(leases)) as kea_iter_leases, \
+             patch.object(dhcp, 'kea_get_active_config',
+                          return_value=active_config(inet, pools)), \
+             patch.object(dhcp, '_get_dhcp_pools', return_value=list(pools.values())):
+            data = dhcp._get_raw_server_leases(family=family, **kwargs)
+        kea_iter_leases.assert_called_once_with(inet)
+        return data
+
+    def test_duplicates(self):
+        data = self.leases([lease4('192.0.2.10', mac='00:53:00:00:00:01'),
+                            lease4('192.0.2.11'),
+                            lease4('192.0.2.10', mac='00:53:00:00:00:02')])
+
+        # the last lease of an address wins, in its place
+        self.assertEqual([(l['ip'], l['mac']) for l in data],
+                         [('192.0.2.11', '00:53:00:00:00:01'),
+                          ('192.0.2.10', '00:53:00:00:00:02')])
+
+    def test_pool_filter(self):
+        leases = [lease4('192.0.2.10', subnet_id=1),
+                  lease4('198.51.100.10', subnet_id=2),
+                  lease4('203.0.113.10', subnet_id=3)]
+
+        data = self.leases(leases)
+        self.assertEqual([(l['ip'], l['pool']) for l in data],
+                         [('192.0.2.10', 'LAN'), ('198.51.100.10', 'GUEST')])
+        data = self.leases(leases, pool='GUEST')
+        self.assertEqual([l['ip'] for l in data], ['198.51.100.10'])
+
+    def test_state_filter(self):
+        leases = [lease4('192.0.2.10', state=0),
+                  lease4('192.0.2.11', state=2),
+                  lease4('192.0.2.12', state=1)]
+
+        data = self.leases(leases, state=['expired'])
+        self.assertEqual([(l['ip'], l['state']) for l in data],
+                         [('192.0.2.11', 'expired')])
+        data = self.leases(leases, state=['active', 'rejected'])
+        self.assertEqual([l['ip'] for l in data], ['192.0.2.10', '192.0.2.12'])
+        self.assertEqual(len(self.leases(leases, state='all')), 3)
+
+    def test_sort_ip(self):
+        data = self.leases([lease4('192.0.2.10'), lease4('192.0.2.9'),
+                            lease4('10.0.0.1')], sorted='ip')
+        self.assertEqual([l['ip'] for l in data],
+                         ['10.0.0.1', '192.0.2.9', '192.0.2.10'])
+
+        data = self.leases([lease6('2001:db8:1::', 56, 'IA_PD'),
+                            lease6('2001:db8::10'),
+                            lease6('2001:db8:1::', 48, 'IA_PD'),
+                            lease6('2001:db8::2')],
+                           family='inet6', sorted='ip')
+        self.assertEqual([l['ip'] for l in data],
+                         ['2001:db8::2', '2001:db8::10',
+                          '2001:db8:1::/48', '2001:db8:1::/56'])
+
+    def test_sort_end(self):
+        leases = [lease4('192.0.2.10', cltt=1700000000),
+                  lease4('192.0.2.11', cltt=0, lifetime=0),
+                  lease4('192.0.2.12', cltt=1600000000)]
+
+        for key in ('end', 'remaining'):
+            data = self.leases(leases, sorted=key)
+            # leases without expiry last
+            self.assertEqual([l['ip'] for l in data],
+                             ['192.0.2.12', '192.0.2.10', '192.0.2.11'])
+            self.assertIsNone(data[-1]['end'])
@@ -0,0 +1,85 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.qos.base
+from vyos.qos import TrafficShaper
+from vyos.qos import tc_batch
+
+def shaper_config(matches):
+    classes = {}
+    for cls, match in enumerate(matches, start=2):
+        classes[str(cls)] = {'bandwidth': '1mbit', 'burst': '15k', 'codel_quantum': '1514',
+                             'priority': '5', 'queue_type': 'fq-codel',
+                             'match': {'SUB': match}}
+    return {'bandwidth': '1gbit', 'class': classes}
+
+def src(address):
+    return {'ip': {'source': {'address': address}}}
+
+class TestQoS(TestCase):
+    def get_filters(self, config):
+        batch = []
+        TrafficShaper('eth0', batch=batch).update(config, 'egress')
+        return [c for c in batch if c.startswith('filter')]
+
+    def test_batch(self):
+        batch = []
+        TrafficShaper('eth0', batch=batch).update(shaper_config([src('192.0.2.1')]), 'egress')
+        self.assertTrue(batch)
+        self.assertTrue(all(c.split()[0] in ['qdisc', 'class', 'filter'] for c in batch))
+
+    def test_linear_filters(self):
+        filters = self.get_filters(shaper_config([src(f'192.0.2.{i}') for i in range(1, 5)]))
+        self.assertFalse(any('ht ' in f or 'divisor' in f for f in filters))
+
+    def test_hashed_filters(self):
+        matches = [src(f'192.0.2.{i}/32') for i in range(1, 21)]
+        # a network breaks the run, the following filters stay in order
+        matches += [src('198.51.100.0/24'), src('192.0.2.100')]
+        filters = self.get_filters(shaper_config(matches))
+
+        self.assertEqual(filters[0], 'filter add dev eth0 parent 1: prio 5 protocol all '
+                                     'handle 100: u32 divisor 256')
+        self.assertIn('link 100: hashkey mask 0x000000ff at 12', filters[1])
+        self.assertTrue(filters[2].startswith('filter add dev eth0 parent 1: prio 5 protocol all '
+                                              'u32 ht 100:1: match ip src 192.0.2.1/32 flowid 1:2'))
+        self.assertTrue(all(' ht 100:' in f for f in filters[2:42]))
+        self.assertIn('match ip src 198.51.100.0/24', filters[42])
+        self.assertIn('match ip src 192.0.2.100 ', filters[44])
+        self.assertFalse(any(' ht ' in f for f in filters[42:]))
+
+    def test_hash_key(self):
+        shaper = TrafficShaper('eth0')
+        self.assertEqual(shaper._get_hash_key(src('192.0.2.10')), ('src', 10))
+        self.assertEqual(shaper._get_hash_key({'ip': {'destination': {'port': '8080'}}}),
+                         ('dport', 8080 & 0xff))
+        self.assertIsNone(shaper._get_hash_key(src('192.0.2.0/24')))
+        self.assertIsNone(shaper._get_hash_key({'ip': {'source': {'port': '80-90'}}}))
+        self.assertIsNone(shaper._get_hash_key({'mark': '10', **src('192.0.2.10')}))
+
+    def test_batch_errors(self):
+        commands = ['qdisc add dev eth0 root handle 1: htb',
+                    'class add dev eth0 parent 1: classid 1:2 htb rate 0',
+                    'filter add dev eth0 parent 1: prio 5 u32 match u32 0 0 flowid 1:3']
+        output = ('Illegal "rate"\nCommand failed -:2\n'
+                  'Error: Specified class not found.\nCommand failed -:3\n')
+        with patch.object(vyos.qos.base, 'rc_cmd', return_value=(1, output)) as rc_cmd:
+            with self.assertRaises(OSError) as e:
+                tc_batch(commands)
+        self.assertEqual(rc_cmd.call_args.args[0], 'tc -force -batch -')
+        self.assertIn(f'tc {commands[1]}\ntc {commands[2]}\n', e.exception.strerror)
+        self.assertNotIn(f'tc {commands[0]}', e.exception.strerror)
@@ -0,0 +1,90 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import importlib
+from threading import Event
+from threading import Thread
+from unittest import TestCase
+
+try:
+    result_cache = importlib.import_module('src.services.api.result_cache')
+except ModuleNotFoundError:  # for unittest.main()
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+    result_cache = importlib.import_module('src.services.api.result_cache')
+
+class TestResultCache(TestCase):
+    def setUp(self):
+        result_cache.ResultCache._instance = None
+        self.cache = result_cache.ResultCache()
+        self.calls = 0
+        self.gate = Event()
+        self.gate.set()
+
+    def producer(self):
+        self.gate.wait()
+        self.calls += 1
+        return self.calls
+
+    def test_no_policy(self):
+        self.assertEqual(self.cache.get('a', self.producer), 1)
+        self.assertEqual(self.cache.get('a', self.producer), 2)
+
+    def test_ttl(self):
+        policy = {'ttl': 60}
+        self.assertEqual(self.cache.get('a', self.producer, policy), 1)
+        self.assertEqual(self.cache.get('a', self.producer, policy), 1)
+        self.assertEqual(self.cache.get('b', self.producer, policy), 2)
+
+        policy = {'ttl': 0.01}
+        self.assertEqual(self.cache.get('c', self.producer, policy), 3)
+        time.sleep(0.02)
+        self.assertEqual(self.cache.get('c', self.producer, policy), 4)
+
+    def test_stale_while_revalidate(self):
+        policy = {'ttl': 0.01, 'stale': 60}
+        self.assertEqual(self.cache.get('a', self.producer, policy), 1)
+        time.sleep(0.02)
+        self.gate.clear()
+        # stale result is returned while refreshing in the background
+        self.assertEqual(self.cache.get('a', self.producer, policy), 1)
+        self.gate.set()
+        deadline = time.monotonic() + 5
+        while 'a' in self.cache._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get('a', self.producer, {'ttl': 60}), 2)
+
+    def test_coalesce(self):
+        self.gate.clear()
+        results = []
+        threads = [Thread(target=lambda: results.append(self.cache.get('a', self.producer)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        self.gate.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_error(self):
+        def fail():
+            raise ValueError('failed')
+        with self.assertRaises(ValueError):
+            self.cache.get('a', fail, {'ttl': 60})
+        # errors are not cached
+        self.assertEqual(self.cache.get('a', self.producer, {'ttl': 60}), 1)
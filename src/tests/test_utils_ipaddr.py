@@ -0,0 +1,69 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ipaddress import collapse_addresses
+from ipaddress import ip_address
+from ipaddress import ip_network
+from ipaddress import summarize_address_range
+from ipaddress import IPv4Address
+from unittest import TestCase
+
+import vyos.utils.ipaddr
+
+class TestVyOSUtilsIPAddr(TestCase):
+    def test_parse(self):
+        self.assertEqual(vyos.utils.ipaddr.parse_address('192.0.2.1'), (4, 0xc0000201))
+        self.assertEqual(vyos.utils.ipaddr.parse_interface('192.0.2.1/24'), (4, 0xc0000201, 24))
+        self.assertEqual(vyos.utils.ipaddr.parse_interface('2001:db8::1'), (6, 0x20010db8 << 96 | 1, 128))
+        self.assertEqual(vyos.utils.ipaddr.parse_network('192.0.2.1/24', strict=False), (4, 0xc0000200, 24))
+        with self.assertRaises(ValueError):
+            vyos.utils.ipaddr.parse_network('192.0.2.1/24')
+        with self.assertRaises(ValueError):
+            vyos.utils.ipaddr.parse_address('VyOS')
+
+    def test_masks(self):
+        self.assertEqual(vyos.utils.ipaddr.to_address(4, vyos.utils.ipaddr.netmask(4, 25)), '255.255.255.128')
+        self.assertEqual(vyos.utils.ipaddr.to_address(6, vyos.utils.ipaddr.netmask(6, 48)), 'ffff:ffff:ffff::')
+        self.assertEqual(vyos.utils.ipaddr.to_address(4, vyos.utils.ipaddr.netmask(4, 0)), '0.0.0.0')
+        version, value, prefixlen = vyos.utils.ipaddr.parse_interface('10.0.0.10/24')
+        self.assertEqual(vyos.utils.ipaddr.broadcast_address(version, value, prefixlen), int(IPv4Address('10.0.0.255')))
+        self.assertEqual(vyos.utils.ipaddr.network_address(version, value, prefixlen), int(IPv4Address('10.0.0.0')))
+
+    def test_contains_many(self):
+        self.assertEqual(vyos.utils.ipaddr.contains_many('192.0.2.0/24', ['192.0.2.1', '192.0.3.1', '2001:db8::1']),
+                         [True, False, False])
+        self.assertEqual(vyos.utils.ipaddr.contains_many('fe80::/64', ['fe80::1%eth0']), [True])
+        self.assertTrue(vyos.utils.ipaddr.contains('2001:db8::/32', '2001:db8:1::1'))
+
+    def test_range_to_prefixes(self):
+        for first, last in [('192.0.2.1', '192.0.2.6'), ('0.0.0.0', '255.255.255.255'),
+                            ('10.0.0.0', '10.0.0.0'), ('2001:db8::1', '2001:db8::1:ffff')]:
+            expected = [str(n) for n in summarize_address_range(ip_address(first), ip_address(last))]
+            self.assertEqual(vyos.utils.ipaddr.range_to_prefixes(first, last), expected)
+        with self.assertRaises(ValueError):
+            vyos.utils.ipaddr.range_to_prefixes('192.0.2.10', '192.0.2.1')
+
+    def test_summarise(self):
+        prefixes = ['192.0.2.0/25', '192.0.2.128/25', '192.0.2.10', '10.0.0.0/8', '11.0.0.0/8', '2001:db8::/33', '2001:db8:8000::/33']
+        self.assertEqual(vyos.utils.ipaddr.summarise(prefixes),
+                         ['10.0.0.0/7', '192.0.2.0/24', '2001:db8::/32'])
+        v4 = [ip_network(p, strict=False) for p in prefixes if '.' in p]
+        self.assertEqual(vyos.utils.ipaddr.summarise(prefixes)[:2], [str(n) for n in collapse_addresses(v4)])
+
+    def test_range_prefix_length(self):
+        self.assertEqual(vyos.utils.ipaddr.range_prefix_length('2001:db8::', '2001:db8::ffff:ffff:ffff:ffff'), 64)
+        self.assertEqual(vyos.utils.ipaddr.range_prefix_length('2001:db8::', '2001:db8::ff'), 120)
+        self.assertEqual(vyos.utils.ipaddr.range_prefix_length('2001:db8::1', '2001:db8::1'), 128)
+        self.assertIsNone(vyos.utils.ipaddr.range_prefix_length('2001:db8::1', '2001:db8::ff'))
+        self.assertIsNone(vyos.utils.ipaddr.range_prefix_length('2001:db8::1', 'VyOS'))